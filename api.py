@@ -3,26 +3,51 @@ File containing API-related functionalities.
 
 Classes:
 OfficeListParser
+OfficeListScanner
+HTTPConnectionPool
+TokenBucket
 APIError
     APIConnectionError
     APIResponseError
+    APICircuitOpenError
+MatterRecord
+MatterBatch
 WSStoreAPI
+AsyncWSStoreAPI
 '''
+from html import unescape
 from html.parser import HTMLParser
-from urllib.request import urlopen
-from urllib.parse import urlencode
-from urllib.error import URLError
-import socket
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlencode, urljoin, urlsplit
+from urllib.error import HTTPError
+import asyncio
+import codecs
+import threading
+import select
+import ssl
+import time
 import json
-from typing import Union, Optional, Dict, List, Tuple, Any
+import re
+from collections import deque
+from operator import itemgetter
+from typing import Union, Optional, Dict, List, Tuple, Iterator, Deque, NamedTuple, Any
 
-from retrying import retry
+from retry_policy import RetryBudget, CircuitBreaker, RetryPolicy, retry
+from transport import Transport
 
 OfficeData = Dict[str, str]
 OfficeList = List[OfficeData]
 MatterSampleData = Dict[str, Union[str, Optional[int]]]
 MatterSampleList = List[MatterSampleData]
 
+# URLs of the city API used by the application
+# html: HTML-based reply (office list)
+# json: JSON reply (queue data of an office)
+API_URLS = {
+    'html': 'https://api.um.warszawa.pl/daneszcz.php?data=16c404ef084cfaffca59ef14b07dc516',
+    'json': 'https://api.um.warszawa.pl/api/action/wsstore_get/'
+}
+
 
 class OfficeListParser(HTMLParser):
     '''
@@ -31,7 +56,14 @@ class OfficeListParser(HTMLParser):
 
     :ivar _flags: Flags used throughout the parsing/search process
     :ivar _office_list: Result of parsing stored internally
+    :cvar sought_attrs: HTML tag attributes values of a tag containing office
+        ID key
     '''
+    sought_attrs = {
+        'class': 'show_example',
+        'role': 'wsstore_api_info#https://api.um.warszawa.pl/api/action'
+    }
+
     def __init__(self) -> None:
         '''
         Initialize and reset this instance.
@@ -52,23 +84,18 @@ class OfficeListParser(HTMLParser):
         :param tag: HTML starting tag name
         :param attrs: HTML starting tag attributes (key, value) pairs list
         '''
-        # HTML tag attributes values of a tag containing office ID key
-        sought_attrs = {
-            'class': 'show_example',
-            'role': 'wsstore_api_info#https://api.um.warszawa.pl/api/action'
-        }
         # Desired data resides inside <div> tag: check only them
         if tag == 'div':
             attrs = dict(attrs)
             # Prepare subdictionary for comparing with sought_attrs
             checked_attrs = {
                 key: attrs.get(key)
-                for key in sought_attrs
+                for key in self.sought_attrs
                 if attrs.get(key) is not None
             }
             # If attributes values match, increment parsing progress indicator
             # by modifying result and setting relevant flag
-            if sought_attrs == checked_attrs:
+            if self.sought_attrs == checked_attrs:
                 self._office_list.append({'name': None, 'key': attrs['id']})
                 self._flags['id_found'] = True
 
@@ -136,6 +163,147 @@ class OfficeListParser(HTMLParser):
         return self._office_list[:]
 
 
+class OfficeListScanner:
+    '''
+    Incremental, regular expression-based counterpart of OfficeListParser.
+
+    Only <div> tags (and comments, which are skipped) are tokenized instead
+    of running HTMLParser's callbacks on every tag, while text nodes are
+    examined only inside office entries. Data may be fed in arbitrary
+    chunks, so the page can be scanned while it downloads.
+
+    If no office is found this way, the whole document is handed over
+    to OfficeListParser.
+
+    :ivar _flags: Flags used throughout the scanning process (same as in
+        OfficeListParser)
+    :ivar _office_list: Result of scanning stored internally
+    :ivar _buffer: Fed data waiting for being scanned
+    :ivar _finished: Whether the scanning has been finished
+    :ivar _fallback: Fed data kept for OfficeListParser until the first
+        office entry is found
+    '''
+    sought_attrs = OfficeListParser.sought_attrs
+    _token_pattern = re.compile(r'<!--.*?-->|<(/?)div\b([^>]*)>', re.S | re.I)
+    _attribute_pattern = re.compile(
+        r'''([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+    _tag_pattern = re.compile(r'<[^>]*>')
+
+    def __init__(self) -> None:
+        self._flags: Dict[str, bool] = {
+            'id_found': False,
+            'awaiting_name': False
+        }
+        self._office_list: List[Dict[str, str]] = []
+        self._buffer: str = ''
+        self._finished: bool = False
+        self._fallback: Optional[List[str]] = []
+
+    def _handle_text(self, text: str) -> None:
+        '''
+        Process text between <div> tags (while inside an office entry).
+        (internal function)
+
+        :param text: Text possibly containing other tags
+        '''
+        for data in self._tag_pattern.split(text):
+            data = unescape(data).strip()
+            if data == '':
+                continue
+            if self._flags['awaiting_name']:
+                self._office_list[-1]['name'] = data
+                self._flags['id_found'] = False
+                self._flags['awaiting_name'] = False
+                return
+            if data == 'Opis danych':
+                self._flags['awaiting_name'] = True
+
+    def _handle_div(self, attrs_text: str) -> None:
+        '''
+        Process starting <div> tag.
+        (internal function)
+
+        :param attrs_text: Unparsed tag attributes
+        '''
+        if 'show_example' not in attrs_text:
+            return
+        attrs = {}
+        for name, *values in self._attribute_pattern.findall(attrs_text):
+            value = next((value for value in values if value), '')
+            attrs.setdefault(name.lower(), unescape(value))
+        checked_attrs = {
+            key: attrs.get(key)
+            for key in self.sought_attrs
+            if attrs.get(key) is not None
+        }
+        if checked_attrs == self.sought_attrs:
+            self._office_list.append({'name': None, 'key': attrs.get('id')})
+            self._flags['id_found'] = True
+            self._fallback = None
+
+    def _scan(self, final: bool = False) -> None:
+        '''
+        Scan buffered data up to the last tag opening character (as the tag
+        or the preceding text node might be incomplete) or till the end.
+        (internal function)
+
+        :param final: Whether no more data will be fed
+        '''
+        limit = len(self._buffer) if final else self._buffer.rfind('<')
+        if not final:
+            # Don't split unterminated comments
+            comment = self._buffer.rfind('<!--', 0, limit + 1)
+            if comment != -1 and self._buffer.find('-->', comment) == -1:
+                limit = comment
+        if limit <= 0:
+            return
+        position = 0
+        for token in self._token_pattern.finditer(self._buffer, 0, limit):
+            if self._flags['id_found']:
+                self._handle_text(self._buffer[position:token.start()])
+            position = token.end()
+            if token.group(0).startswith('<!--'):
+                continue
+            closing, attrs_text = token.group(1), token.group(2)
+            if not closing and not attrs_text.rstrip().endswith('/'):
+                # XHTML-style empty tags are ignored (like in OfficeListParser)
+                self._handle_div(attrs_text)
+        if self._flags['id_found']:
+            self._handle_text(self._buffer[position:limit])
+        self._buffer = self._buffer[limit:]
+
+    def feed(self, data: str) -> None:
+        '''
+        Feed the scanner with a piece of HTML document.
+
+        :param data: Next piece of the document
+        '''
+        if self._finished:
+            return
+        if self._fallback is not None:
+            self._fallback.append(data)
+        self._buffer += data
+        self._scan()
+
+    def get_result(self) -> OfficeList:
+        '''
+        Get the result of scanning.
+
+        It explicitly finishes the scanning process before fetching result.
+
+        :returns: Result office list
+        '''
+        if not self._finished:
+            self._scan(final=True)
+            self._finished = True
+        if not self._office_list and self._fallback:
+            parser = OfficeListParser()
+            parser.feed(''.join(self._fallback))
+            self._office_list = parser.get_result()
+        self._fallback = None
+        return self._office_list[:]
+
+
 def append_parameters(url: str, params: Dict[str, str]) -> str:
     '''
     Encode and append query parameters to an URL.
@@ -176,6 +344,377 @@ def append_parameters(url: str, params: Dict[str, str]) -> str:
         url_before_query + query_string + urlencode(params) + url_after_query)
 
 
+HostKey = Tuple[str, str, Optional[int]]
+
+
+class HTTPConnectionPool(Transport):
+    '''
+    Thread-safe pool of persistent (keep-alive) HTTP connections: the live
+    HTTP transport.
+
+    Idle connections are kept separately for every (scheme, host, port)
+    triple and reused by subsequent requests, saving a TCP (and TLS)
+    handshake per request. Before reuse, each connection undergoes a health
+    check and connections idle for too long are dropped.
+
+    :param max_size: Maximal count of idle connections kept per host
+    :param idle_timeout: Time in seconds after which an idle connection is
+        discarded instead of being reused
+    :ivar _max_size: Maximal idle connection count provided in constructor
+    :ivar _idle_timeout: Idle timeout provided in constructor
+    :ivar _idle: Idle connections (along with the time of their release)
+        grouped by host
+    :ivar _lock: Lock guarding access to idle connections
+    '''
+    # Maximal count of followed HTTP redirections
+    max_redirects = 5
+
+    def __init__(self, max_size: int = 4, idle_timeout: float = 30.0) -> None:
+        if max_size < 1:
+            raise ValueError('Pool size must be positive')
+        self._max_size: int = max_size
+        self._idle_timeout: float = idle_timeout
+        self._idle: Dict[HostKey, List[Tuple[HTTPConnection, float]]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    #
+    # Private methods used internally
+    #
+
+    @staticmethod
+    def _is_healthy(connection: HTTPConnection) -> bool:
+        '''
+        Check if an idle connection can be safely reused.
+        (internal function)
+
+        An idle keep-alive socket should never be readable: readability
+        means that the server has closed the connection (or sent unexpected
+        data).
+
+        :param connection: Checked connection
+        :returns: True if the connection is usable, False otherwise
+        '''
+        if connection.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _acquire(self, host_key: HostKey, timeout: float) -> Tuple[HTTPConnection, bool]:
+        '''
+        Get a connection to the given host: a healthy idle one if possible,
+        otherwise a new one.
+        (internal function)
+
+        :param host_key: Host identifier (scheme, host, port)
+        :param timeout: Socket timeout in seconds
+        :returns: Connection and a flag telling whether it has been reused
+        '''
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(host_key, [])
+            while idle:
+                # Most recently released connections are the least likely to
+                # be closed by the server
+                connection, released = idle.pop()
+                if now - released <= self._idle_timeout and self._is_healthy(connection):
+                    connection.timeout = timeout
+                    connection.sock.settimeout(timeout)
+                    return connection, True
+                connection.close()
+        scheme, host, port = host_key
+        if scheme == 'https':
+            return HTTPSConnection(host, port, timeout=timeout), False
+        return HTTPConnection(host, port, timeout=timeout), False
+
+    def _release(self, host_key: HostKey, connection: HTTPConnection) -> None:
+        '''
+        Return a connection to the pool (or close it if the pool is full).
+        (internal function)
+
+        :param host_key: Host identifier (scheme, host, port)
+        :param connection: Released connection
+        '''
+        with self._lock:
+            idle = self._idle.setdefault(host_key, [])
+            if len(idle) < self._max_size:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def _send(
+            self, host_key: HostKey, path: str,
+            timeout: float) -> Tuple[HTTPConnection, Any]:
+        '''
+        Send a GET request and receive response's status and headers.
+        (internal function)
+
+        A request failing on a reused connection is repeated once on a fresh
+        one, as the server might have closed the connection in the meantime.
+
+        :param host_key: Host identifier (scheme, host, port)
+        :param path: Request path (along with query string)
+        :param timeout: Socket timeout in seconds
+        :returns: Used connection and the received response
+        '''
+        while True:
+            connection, reused = self._acquire(host_key, timeout)
+            try:
+                connection.request('GET', path, headers={'Connection': 'keep-alive'})
+                return connection, connection.getresponse()
+            except (ConnectionError, HTTPException) as exc:
+                connection.close()
+                if not reused:
+                    raise exc
+            except Exception:
+                connection.close()
+                raise
+
+    def _finish(
+            self, host_key: HostKey, connection: HTTPConnection, response: Any,
+            completed: bool) -> None:
+        '''
+        Return connection to the pool if its response has been read
+        completely and the server allows reusing it, otherwise close it.
+        (internal function)
+
+        :param host_key: Host identifier (scheme, host, port)
+        :param connection: Used connection
+        :param response: Response received through the connection
+        :param completed: Whether the response has been read completely
+        '''
+        if completed and not response.will_close:
+            self._release(host_key, connection)
+        else:
+            connection.close()
+
+    def _open(self, url: str, timeout: float) -> Tuple[HostKey, HTTPConnection, Any]:
+        '''
+        Send a GET request following redirections and return the final
+        response, with its body still unread.
+        (internal function)
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :param timeout: Socket timeout in seconds
+        :returns: Host identifier, used connection and the final response
+        '''
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError(f'Unsupported URL: {url}')
+            host_key = (parts.scheme, parts.hostname, parts.port)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            connection, response = self._send(host_key, path, timeout)
+            location = response.getheader('Location')
+            redirected = response.status in (301, 302, 303, 307, 308) and location
+            if not redirected and response.status < 400:
+                return host_key, connection, response
+            # Drain the body of a redirection or an error response, so that
+            # the connection can be reused
+            try:
+                response.read()
+            except Exception:
+                connection.close()
+                raise
+            self._finish(host_key, connection, response, True)
+            if not redirected:
+                raise HTTPError(url, response.status, response.reason, response.headers, None)
+            url = urljoin(url, location)
+        raise HTTPError(url, response.status, 'Too many redirections', response.headers, None)
+
+    #
+    # Public methods
+    #
+
+    def request(self, url: str, timeout: float = 5) -> bytes:
+        '''
+        Fetch a resource using HTTP GET method.
+
+        Redirections are followed. Responses with status code indicating
+        an error result in an exception.
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :param timeout: Socket timeout in seconds
+        :returns: Body of the response
+        :raises:
+            :class:`ValueError`: Unsupported URL
+            :class:`HTTPError`: Error status code received
+            :class:`OSError`: Socket-level errors (including timeouts)
+            :class:`HTTPException`: Malformed response
+        '''
+        host_key, connection, response = self._open(url, timeout)
+        completed = False
+        try:
+            body = response.read()
+            completed = True
+        finally:
+            self._finish(host_key, connection, response, completed)
+        return body
+
+    def stream(
+            self, url: str, timeout: float = 5,
+            chunk_size: int = 16384) -> Iterator[bytes]:
+        '''
+        Fetch a resource using HTTP GET method, yielding parts of its body
+        as soon as they arrive.
+
+        Closing the returned generator before exhausting it abandons the
+        rest of the response (and the connection it has been using).
+        Exceptions are the same as in case of self.request.
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :param timeout: Socket timeout in seconds
+        :param chunk_size: Maximal size of a single yielded part
+        :returns: Generator of the response body's parts
+        '''
+        host_key, connection, response = self._open(url, timeout)
+        completed = False
+        try:
+            while True:
+                chunk = response.read1(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            # Make sure the response is marked as finished
+            response.read()
+            completed = True
+        finally:
+            self._finish(host_key, connection, response, completed)
+
+    def clear(self) -> None:
+        '''
+        Close all idle connections.
+        '''
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    #
+    # Properties
+    #
+
+    @property
+    def max_size(self) -> int:
+        '''
+        Maximal count of idle connections kept per host.
+        '''
+        return self._max_size
+
+    @property
+    def idle_timeout(self) -> float:
+        '''
+        Time in seconds after which an idle connection is discarded.
+        '''
+        return self._idle_timeout
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket limiting the rate of outgoing requests.
+
+    The bucket holds up to burst tokens and is refilled at rate tokens per
+    second. Every request takes one token; if there are none left,
+    the request has to wait for the bucket to be refilled. Tokens are
+    reserved in advance, so simultaneous callers are queued fairly.
+
+    :param rate: Count of tokens added every second
+    :param burst: Capacity of the bucket
+    :ivar _rate: Refill rate provided in constructor
+    :ivar _burst: Capacity provided in constructor
+    :ivar _tokens: Count of tokens currently available (negative when
+        tokens are reserved in advance)
+    :ivar _updated: Monotonic time of the last refill
+    :ivar _lock: Lock guarding the bucket's state
+    '''
+    def __init__(self, rate: float = 5.0, burst: int = 10) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError('Rate and burst must be positive')
+        self._rate: float = rate
+        self._burst: int = burst
+        self._tokens: float = burst
+        self._updated: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def _take(self) -> float:
+        '''
+        Refill the bucket and take one token from it.
+        (internal function)
+
+        :returns: Count of tokens left (negative if the token has been
+            reserved in advance)
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst, self._tokens + max(now - self._updated, 0) * self._rate) - 1
+            self._updated = now
+            return self._tokens
+
+    def reserve(self) -> float:
+        '''
+        Take a token, possibly in advance.
+
+        :returns: Time in seconds the caller has to wait before sending
+            the request
+        '''
+        return max(0.0, -self._take() / self._rate)
+
+    def acquire(self) -> float:
+        '''
+        Take a token, blocking until it becomes available.
+
+        :returns: Time in seconds spent waiting
+        '''
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def _reserve_async(self) -> float:
+        '''
+        Take a token, possibly in advance, without blocking the event loop.
+        (internal function)
+
+        Taking a token from the in-memory bucket is immediate, so it's done
+        directly.
+
+        :returns: Time in seconds the caller has to wait before sending
+            the request
+        '''
+        return self.reserve()
+
+    async def acquire_async(self) -> float:
+        '''
+        Take a token, suspending the coroutine until it becomes available.
+
+        :returns: Time in seconds spent waiting
+        '''
+        delay = await self._reserve_async()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    @property
+    def rate(self) -> float:
+        '''
+        Count of tokens added every second.
+        '''
+        return self._rate
+
+    @property
+    def burst(self) -> int:
+        '''
+        Capacity of the bucket.
+        '''
+        return self._burst
+
+
 class APIError(Exception):
     '''
     Exception indicating errors during fetching API data.
@@ -194,6 +733,13 @@ class APIResponseError(APIError):
     '''
 
 
+class APICircuitOpenError(APIError):
+    '''
+    Exception indicating that requests concerning an office are suspended
+    because of its repeated failures. Not worth retrying.
+    '''
+
+
 def is_connection_error(exception) -> bool:
     '''
     Check if provided exception is related to connecting to API.
@@ -204,6 +750,200 @@ def is_connection_error(exception) -> bool:
     return isinstance(exception, APIConnectionError)
 
 
+def parse_office_list(response: str) -> OfficeList:
+    '''
+    Extract office identifiers list from HTML API response.
+
+    :param response: Decoded HTML API response
+    :returns: Office identifiers list
+    '''
+    scanner = OfficeListScanner()
+    scanner.feed(response)
+    return scanner.get_result()
+
+
+def parse_json_response(response: Union[str, bytes]) -> Dict[str, Any]:
+    '''
+    Decode JSON API response and check it for reported errors.
+
+    :param response: JSON API response (raw or decoded)
+    :returns: Resulting dictionary
+    :raises: :class:`APIResponseError`: API returned error response
+        or malformed data
+    '''
+    try:
+        data = json.loads(response)
+    except ValueError as exc:
+        raise APIResponseError('Malformed JSON response') from exc
+    if not isinstance(data, dict) or 'result' not in data:
+        raise APIResponseError('Malformed JSON response')
+    # Raise an error if API returned error response
+    if isinstance(data['result'], str):
+        if data.get('error') is not None:
+            raise APIResponseError(data['error'])
+        else:
+            raise APIResponseError(data['result'])
+    return data
+
+
+# Patterns of JSON API response's header fields
+_RESPONSE_DATE_PATTERN = re.compile(rb'"date"\s*:\s*"([^"]*)"')
+_RESPONSE_TIME_PATTERN = re.compile(rb'"time"\s*:\s*"([^"]*)"')
+
+
+def read_response_timestamp(response: bytes) -> Optional[Tuple[str, str]]:
+    '''
+    Extract data timestamp (date and time fields) from raw JSON API response
+    without decoding the whole document.
+
+    :param response: Raw JSON API response
+    :returns: Pair of date and time strings (or None if any of them is
+        missing, e.g. in case of error responses)
+    '''
+    date = _RESPONSE_DATE_PATTERN.search(response)
+    time_match = _RESPONSE_TIME_PATTERN.search(response)
+    if date is None or time_match is None:
+        return None
+    return date.group(1).decode('utf-8'), time_match.group(1).decode('utf-8')
+
+
+class MatterRecord(NamedTuple):
+    '''
+    Compact description of an administrative matter along with the state
+    of its queue (see docs/api_data_format.md for meaning of the fields).
+    '''
+    name: str
+    ordinal: Optional[int]
+    group_id: int
+    queue_length: int
+    open_counters: int
+    current_number: str
+
+
+class MatterBatch(NamedTuple):
+    '''
+    Decoded JSON API response: states of queues of all matters available
+    in an office, sharing a single timestamp.
+
+    Groups not conforming to the data format are set aside in quarantined
+    list as (group, reason) pairs.
+    '''
+    time: str
+    records: List[MatterRecord]
+    quarantined: List[Tuple[Any, str]]
+
+    def to_matter_sample_list(self) -> MatterSampleList:
+        '''
+        Convert the batch to internal data format of
+        WSStoreAPI.get_matters_with_samples.
+
+        :returns: List of dictionaries describing each matter and its queue
+            state (sorted by matter name)
+        '''
+        # Records are sorted (stably) before conversion and unpacked, which
+        # is cheaper than accessing their fields by name
+        timestamp = self.time
+        return [{
+            'name': name,
+            'ordinal': ordinal,
+            'group_id': group_id,
+            'queue_length': queue_length,
+            'open_counters': open_counters,
+            'current_number': current_number,
+            'time': timestamp
+        } for name, ordinal, group_id, queue_length, open_counters, current_number
+            in sorted(self.records, key=itemgetter(0))]
+
+
+# Matchers of JSON API response's fields (see docs/api_data_format.md)
+_match_date = re.compile(r'\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])\Z').match
+_match_time = re.compile(r'(?:[01]\d|2[0-3]):[0-5]\d\Z').match
+_match_ordinal = re.compile(r'[1-9]\d?\Z').match
+_match_group_id = re.compile(r'[1-9]\d{0,6}\Z').match
+_match_current_number = re.compile(r'(?:[A-Z]\d{3}|0|[1-9]\d{0,2})?\Z').match
+
+
+def _decode_group(group: Any) -> MatterRecord:
+    '''
+    Validate a single group of JSON API response and convert it to a record.
+    (internal function)
+
+    Only the fields used by the application are validated. Names of
+    the groups may contain any non-empty text, as the actual API returns
+    letters not mentioned in the documented grammar.
+
+    :param group: Decoded group object
+    :returns: Resulting record
+    :raises: :class:`ValueError`: Group not conforming to the data format
+    '''
+    if type(group) is not dict:
+        raise ValueError('Group is not an object')
+    try:
+        name = group['nazwaGrupy']
+        ordinal = group['lp']
+        group_id = group['idGrupy']
+        queue_length = group['liczbaKlwKolejce']
+        open_counters = group['liczbaCzynnychStan']
+        current_number = group['aktualnyNumer']
+    except KeyError as exc:
+        raise ValueError(f'Missing {exc.args[0]}') from None
+    if type(name) is not str or not name:
+        raise ValueError('Invalid nazwaGrupy')
+    if ordinal is not None:
+        if type(ordinal) is not str or not _match_ordinal(ordinal):
+            raise ValueError('Invalid lp')
+        ordinal = int(ordinal)
+    if type(group_id) is not str or not _match_group_id(group_id):
+        raise ValueError('Invalid idGrupy')
+    # Type is compared exactly to reject booleans
+    if type(queue_length) is not int or not 0 <= queue_length <= 999:
+        raise ValueError('Invalid liczbaKlwKolejce')
+    if type(open_counters) is not int or not 0 <= open_counters <= 99:
+        raise ValueError('Invalid liczbaCzynnychStan')
+    if type(current_number) is not str or not _match_current_number(current_number):
+        raise ValueError('Invalid aktualnyNumer')
+    return MatterRecord(
+        name, ordinal, int(group_id), queue_length, open_counters, current_number)
+
+
+def decode_matter_batch(response: bytes) -> MatterBatch:
+    '''
+    Decode raw JSON API response and validate it against the data format.
+
+    The timestamp string is built once for the whole response. Malformed
+    groups are quarantined instead of invalidating the whole response.
+
+    :param response: Raw JSON API response
+    :returns: Decoded batch of matter records
+    :raises: :class:`APIResponseError`: API returned error response
+        or malformed data
+    '''
+    # Explicit decoding is faster than letting the parser detect the encoding
+    try:
+        text = response.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        raise APIResponseError('Malformed JSON response') from exc
+    result = parse_json_response(text)['result']
+    if not isinstance(result, dict):
+        raise APIResponseError('Malformed JSON response')
+    date, time_string, groups = result.get('date'), result.get('time'), result.get('grupy')
+    if type(date) is not str or not _match_date(date):
+        raise APIResponseError('Malformed response date')
+    if type(time_string) is not str or not _match_time(time_string):
+        raise APIResponseError('Malformed response time')
+    if type(groups) is not list:
+        raise APIResponseError('Malformed response group list')
+    records: List[MatterRecord] = []
+    quarantined: List[Tuple[Any, str]] = []
+    append = records.append
+    for group in groups:
+        try:
+            append(_decode_group(group))
+        except ValueError as exc:
+            quarantined.append((group, str(exc)))
+    return MatterBatch(date + ' ' + time_string, records, quarantined)
+
+
 class WSStoreAPI:
     '''
     Class used for fetching queue system data using API provided by the City
@@ -211,47 +951,106 @@ class WSStoreAPI:
 
     :param html_api_url: Base URL of API returning HTML encoded data
     :param json_api_url: Base URL of API returning JSON encoded data
+    :param transport: Transport used for requests, e.g. a recording or
+        replaying one (a private HTTPConnectionPool is created if not
+        provided)
+    :param rate_limiter: Token bucket limiting the rate of requests (may be
+        shared with other API objects; a private one is created if not
+        provided)
     :ivar _api_urls: Base URLs of APIs provided in constructor
     :ivar _office_key: Default office identifier (settable through
         self.office_key property)
+    :ivar _transport: Transport used for requests (accessible through
+        self.transport property)
+    :ivar _rate_limiter: Token bucket every request passes through
+        (accessible through self.rate_limiter property)
+    :ivar _retry_budget: Limit of retries shared by all retry policies
+        (accessible through self.retry_budget property)
+    :ivar _circuit_breaker: Per-office circuit breaker suspending requests
+        concerning repeatedly failing offices (accessible through
+        self.circuit_breaker property)
+    :ivar _connection_retry_policy: Retry policy of API requests (accessible
+        through self.connection_retry_policy property)
+    :ivar _quarantine: Recently received malformed groups (accessible
+        through self.quarantine property)
     '''
-    def __init__(self, html_api_url: str, json_api_url: str) -> None:
+    def __init__(
+            self, html_api_url: str, json_api_url: str,
+            transport: Optional[Transport] = None,
+            rate_limiter: Optional[TokenBucket] = None) -> None:
         self._api_urls: Dict[str, str] = {
             'html': html_api_url,
             'json': json_api_url
         }
         self._office_key: Optional[str] = None
+        if transport is None:
+            transport = HTTPConnectionPool()
+        self._transport: Transport = transport
+        if rate_limiter is None:
+            rate_limiter = TokenBucket()
+        self._rate_limiter: TokenBucket = rate_limiter
+        self._retry_budget: RetryBudget = RetryBudget(limit=20, period=60)
+        self._circuit_breaker: CircuitBreaker = CircuitBreaker(
+            failure_threshold=3, recovery_time=300)
+        self._connection_retry_policy: RetryPolicy = RetryPolicy(
+            is_connection_error, attempts=5, initial_wait=0.5, max_wait=4,
+            budget=self._retry_budget)
+        self._quarantine: Deque[Tuple[Optional[str], Any, str]] = deque(maxlen=100)
 
     #
     # Private methods used internally
     #
 
-    @retry(
-        retry_on_exception=is_connection_error,
-        wait_fixed=2000,
-        stop_max_attempt_number=5)
-    def _get_json_data(
-            self, office_key: Optional[str] = None) -> Dict[str, Any]:
+    def _get_raw_json_data(self, office_key: Optional[str] = None) -> bytes:
         '''
-        Retrieve unprocessed office data from JSON API as a dictionary.
+        Retrieve raw (undecoded) office data from JSON API.
         (internal function)
 
-        Function retries 5 times on connection errors, waiting 2 seconds
-        between retries.
+        Requests concerning offices, which failed repeatedly, are suspended
+        by the circuit breaker for some time.
 
         :param office_key: Requested office identifier
             (defaults to self.office_key)
-        :returns: Resulting dictionary
+        :returns: Body of the API response
         :raises:
             :class:`AssertionError`: Missing argument
             :class:`APIConnectionError`: Error connecting to the API
-            :class:`APIResponseError`: Unexpected response from the API
+            :class:`APICircuitOpenError`: Requests concerning the office
+                are suspended
         '''
         if office_key is None:
             office_key = self._office_key
         # Check argument's validity
         if office_key is None:
             raise AssertionError('Office key not provided')
+        if not self._circuit_breaker.allow(office_key):
+            raise APICircuitOpenError('Office temporarily not polled because of repeated failures')
+        try:
+            response = self._request_json_data(office_key)
+        except APIError:
+            # Local problems (e.g. a missing API key) aren't office's failures
+            self._circuit_breaker.record_failure(office_key)
+            raise
+        else:
+            self._circuit_breaker.record_success(office_key)
+        finally:
+            self._circuit_breaker.release(office_key)
+        return response
+
+    @retry('_connection_retry_policy')
+    def _request_json_data(self, office_key: str) -> bytes:
+        '''
+        Send JSON API request for office data.
+        (internal function)
+
+        Function retries up to 5 times on connection errors, waiting
+        an exponentially growing, randomized time between retries
+        (see self.connection_retry_policy).
+
+        :param office_key: Requested office identifier
+        :returns: Body of the API response
+        :raises: :class:`APIConnectionError`: Error connecting to the API
+        '''
         from apikey import apikey
         # Prepare HTTP request GET parameters
         parameters = {
@@ -259,53 +1058,68 @@ class WSStoreAPI:
             'apikey': apikey().strip()
         }
         # Make a HTTP request for fetching JSON data
+        self._rate_limiter.acquire()
         try:
-            request = urlopen(
+            return self._transport.request(
                 append_parameters(self._api_urls['json'], parameters),
                 timeout=5)
-            response = request.read().decode('utf-8').strip()
-        except (URLError, socket.timeout, socket.gaierror) as exc:
+        except (OSError, HTTPException) as exc:
             raise APIConnectionError('Cannot connect to the API') from exc
-        # Parse fetched data
-        data = json.loads(response)
-        # Raise an error if API returned error response
-        if isinstance(data['result'], str):
-            if data.get('error') is not None:
-                raise APIResponseError(data['error'])
-            else:
-                raise APIResponseError(data['result'])
-        return data
+
+    def _decode_matter_batch(
+            self, office_key: Optional[str], response: bytes) -> MatterBatch:
+        '''
+        Decode raw JSON API response, setting malformed groups aside
+        in self.quarantine.
+        (internal function)
+
+        :param office_key: Identifier of the office the response concerns
+            (defaults to self.office_key)
+        :param response: Raw JSON API response
+        :returns: Decoded batch of matter records
+        :raises: :class:`APIResponseError`: Unexpected response from the API
+        '''
+        if office_key is None:
+            office_key = self._office_key
+        batch = decode_matter_batch(response)
+        for group, reason in batch.quarantined:
+            self._quarantine.append((office_key, group, reason))
+        return batch
 
     #
     # Public methods
     #
 
-    @retry(
-        retry_on_exception=is_connection_error,
-        wait_fixed=2000,
-        stop_max_attempt_number=5)
+    @retry('_connection_retry_policy')
     def get_office_list(self) -> OfficeList:
         '''
         Retrieve office identifiers list from HTML API
 
         The list can be used to get office-specific data using the JSON API.
 
-        Function retries 5 times on connection errors, waiting 2 seconds
-        between retries.
+        Function retries up to 5 times on connection errors, waiting
+        an exponentially growing, randomized time between retries
+        (see self.connection_retry_policy).
 
         :returns: Office identifiers list
         :raises: :class:`APIConnectionError`: Error connecting to the API
         '''
-        # Make a HTTP request for fetching HTML data
+        # Make a HTTP request for fetching HTML data and parse it as it
+        # arrives
+        scanner = OfficeListScanner()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        self._rate_limiter.acquire()
         try:
-            request = urlopen(self._api_urls['html'], timeout=5)
-            response = request.read().decode('utf-8')
-        except (URLError, socket.timeout, socket.gaierror) as exc:
+            chunks = self._transport.stream(self._api_urls['html'], timeout=5)
+            try:
+                for chunk in chunks:
+                    scanner.feed(decoder.decode(chunk))
+                scanner.feed(decoder.decode(b'', final=True))
+            finally:
+                chunks.close()
+        except (OSError, HTTPException) as exc:
             raise APIConnectionError('Cannot connect to the API') from exc
-        # Parse fetched data
-        parser = OfficeListParser()
-        parser.feed(response)
-        return parser.get_result()
+        return scanner.get_result()
 
     def get_matters_with_samples(
             self, office_key: Optional[str] = None) -> MatterSampleList:
@@ -318,25 +1132,468 @@ class WSStoreAPI:
         :returns: List of dictionaries describing each matter and its queue
             state
         '''
-        # Fetch and parse JSON data
-        data = self._get_json_data(office_key)
-        # Parse and reorganize data according to internal data format
-        return sorted(
-            [{
-                'name': str(group['nazwaGrupy']),
-                'ordinal': int(group['lp']) if group['lp'] is not None else None,
-                'group_id': int(group['idGrupy']),
-                'queue_length': int(group['liczbaKlwKolejce']),
-                'open_counters': int(group['liczbaCzynnychStan']),
-                'current_number': str(group['aktualnyNumer']),
-                'time': str(data['result']['date'] + ' ' + data['result']['time'])
-            } for group in data['result']['grupy']],
-            key=lambda matter: matter['name'])
+        # Fetch and decode JSON data
+        response = self._get_raw_json_data(office_key)
+        # Reorganize data according to internal data format
+        return self._decode_matter_batch(office_key, response).to_matter_sample_list()
 
     #
     # Properties
     #
 
+    @property
+    def transport(self) -> Transport:
+        '''
+        Transport used for API requests.
+        '''
+        return self._transport
+
+    @property
+    def rate_limiter(self) -> TokenBucket:
+        '''
+        Token bucket limiting the rate of API requests.
+        '''
+        return self._rate_limiter
+
+    @property
+    def retry_budget(self) -> RetryBudget:
+        '''
+        Limit of retries shared by all retry policies.
+        '''
+        return self._retry_budget
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        '''
+        Per-office circuit breaker suspending requests concerning repeatedly
+        failing offices.
+        '''
+        return self._circuit_breaker
+
+    @property
+    def connection_retry_policy(self) -> RetryPolicy:
+        '''
+        Retry policy of API requests.
+        '''
+        return self._connection_retry_policy
+
+    @property
+    def quarantine(self) -> List[Tuple[Optional[str], Any, str]]:
+        '''
+        Recently received groups not conforming to the data format, as
+        (office key, group, reason) triples.
+        '''
+        return list(self._quarantine)
+
+    @property
+    def office_key(self) -> str:
+        '''
+        Default office identifier used when per-method optional office key
+        is not provided.
+
+        :raises: :class:`TypeError`: Trying to assign non-string value
+        '''
+        return self._office_key
+
+    @office_key.setter
+    def office_key(self, value: str) -> None:
+        if isinstance(value, str):
+            self._office_key = value
+        else:
+            raise TypeError('Office key must be a string')
+
+
+class AsyncWSStoreAPI:
+    '''
+    Asyncio-based counterpart of WSStoreAPI.
+
+    Requests are sent using non-blocking sockets, so a single thread running
+    an event loop is able to poll many offices at once. Keep-alive
+    connections are reused between requests to the same host. Results have
+    the same format as these returned by WSStoreAPI.
+
+    :param html_api_url: Base URL of API returning HTML encoded data
+    :param json_api_url: Base URL of API returning JSON encoded data
+    :param max_idle: Maximal count of idle connections kept per host
+    :param rate_limiter: Token bucket limiting the rate of requests (may be
+        shared with other API objects; a private one is created if not
+        provided)
+    :ivar _api_urls: Base URLs of APIs provided in constructor
+    :ivar _office_key: Default office identifier (settable through
+        self.office_key property)
+    :ivar _max_idle: Maximal idle connection count provided in constructor
+    :ivar _idle: Idle connections' streams grouped by host
+    :ivar _rate_limiter: Token bucket every request passes through
+        (accessible through self.rate_limiter property)
+    :ivar _retry_budget: Limit of retries (accessible through
+        self.retry_budget property)
+    :ivar _circuit_breaker: Per-office circuit breaker (accessible through
+        self.circuit_breaker property)
+    :ivar _connection_retry_policy: Retry policy of API requests (accessible
+        through self.connection_retry_policy property)
+    :ivar _quarantine: Recently received malformed groups (accessible
+        through self.quarantine property)
+    '''
+    # Socket timeout in seconds
+    timeout = 5
+    # Maximal count of followed HTTP redirections
+    max_redirects = 5
+
+    def __init__(
+            self, html_api_url: str, json_api_url: str, max_idle: int = 4,
+            rate_limiter: Optional[TokenBucket] = None) -> None:
+        self._api_urls: Dict[str, str] = {
+            'html': html_api_url,
+            'json': json_api_url
+        }
+        self._office_key: Optional[str] = None
+        self._max_idle: int = max_idle
+        self._idle: Dict[HostKey, List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        if rate_limiter is None:
+            rate_limiter = TokenBucket()
+        self._rate_limiter: TokenBucket = rate_limiter
+        self._retry_budget: RetryBudget = RetryBudget(limit=20, period=60)
+        self._circuit_breaker: CircuitBreaker = CircuitBreaker(
+            failure_threshold=3, recovery_time=300)
+        self._connection_retry_policy: RetryPolicy = RetryPolicy(
+            is_connection_error, attempts=5, initial_wait=0.5, max_wait=4,
+            budget=self._retry_budget)
+        self._quarantine: Deque[Tuple[Optional[str], Any, str]] = deque(maxlen=100)
+
+    #
+    # Private methods used internally
+    #
+
+    async def _open(
+            self, host_key: HostKey) -> Tuple[
+                asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        '''
+        Get streams of a connection to the given host: an idle one if
+        possible, otherwise a new one.
+        (internal function)
+
+        :param host_key: Host identifier (scheme, host, port)
+        :returns: Connection's streams and a flag telling whether they have
+            been reused
+        :raises:
+            :class:`OSError`: Error connecting to the host
+            :class:`asyncio.TimeoutError`: Connecting took longer than
+                self.timeout
+        '''
+        idle = self._idle.get(host_key, [])
+        while idle:
+            reader, writer = idle.pop()
+            # Skip connections closed by the server in the meantime
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = host_key
+        if port is None:
+            port = 443 if scheme == 'https' else 80
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port, ssl=ssl.create_default_context() if scheme == 'https' else None),
+            self.timeout)
+        return reader, writer, False
+
+    def _release(
+            self, host_key: HostKey, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        '''
+        Keep connection's streams for reuse (or close them if there are
+        enough idle connections).
+        (internal function)
+
+        :param host_key: Host identifier (scheme, host, port)
+        :param reader: Connection's reading stream
+        :param writer: Connection's writing stream
+        '''
+        idle = self._idle.setdefault(host_key, [])
+        if len(idle) < self._max_idle:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _read_response(
+            reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+        '''
+        Read HTTP response from a stream.
+        (internal function)
+
+        :param reader: Connection's reading stream
+        :returns: Status code, headers (with lowercase names) and body
+        :raises: :class:`ConnectionError`: Malformed or incomplete response
+        '''
+        status_line = await reader.readline()
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise ConnectionError('Malformed HTTP response')
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if line == b'':
+                raise ConnectionError('Incomplete HTTP response')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            return int(parts[1]), headers, await AsyncWSStoreAPI._read_body(reader, headers)
+        except ValueError as exc:
+            raise ConnectionError('Malformed HTTP response') from exc
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        '''
+        Read body of HTTP response from a stream.
+        (internal function)
+
+        :param reader: Connection's reading stream
+        :param headers: Headers of the response (with lowercase names)
+        :returns: Body of the response
+        :raises:
+            :class:`ValueError`: Malformed chunk size or content length
+            :class:`asyncio.IncompleteReadError`: Incomplete response
+        '''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Skip trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return body
+
+    async def _request(self, url: str) -> bytes:
+        '''
+        Fetch a resource using HTTP GET method.
+        (internal function)
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :returns: Body of the response
+        :raises:
+            :class:`ValueError`: Unsupported URL
+            :class:`APIConnectionError`: Error connecting to the API
+        '''
+        try:
+            for _ in range(self.max_redirects + 1):
+                parts = urlsplit(url)
+                if parts.scheme not in ('http', 'https') or not parts.hostname:
+                    raise ValueError(f'Unsupported URL: {url}')
+                host_key = (parts.scheme, parts.hostname, parts.port)
+                path = parts.path or '/'
+                if parts.query:
+                    path += '?' + parts.query
+                await self._rate_limiter.acquire_async()
+                request = (
+                    f'GET {path} HTTP/1.1\r\n'
+                    f'Host: {parts.netloc}\r\n'
+                    'Connection: keep-alive\r\n'
+                    'Accept-Encoding: identity\r\n\r\n').encode('latin-1')
+                while True:
+                    reader, writer, reused = await self._open(host_key)
+                    try:
+                        writer.write(request)
+                        status, headers, body = await asyncio.wait_for(
+                            self._read_response(reader), self.timeout)
+                        break
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        writer.close()
+                        # The server might have closed a reused connection
+                        # in the meantime: try once more on a new one
+                        if not reused:
+                            raise
+                    except BaseException:
+                        writer.close()
+                        raise
+                if headers.get('connection', '').lower() == 'close':
+                    writer.close()
+                else:
+                    self._release(host_key, reader, writer)
+                if status in (301, 302, 303, 307, 308) and 'location' in headers:
+                    url = urljoin(url, headers['location'])
+                    continue
+                if status >= 400:
+                    raise ConnectionError(f'HTTP error {status}')
+                return body
+            raise ConnectionError('Too many redirections')
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            raise APIConnectionError('Cannot connect to the API') from exc
+
+    async def _request_with_retries(self, url: str) -> bytes:
+        '''
+        Fetch a resource, retrying on connection errors according to
+        self.connection_retry_policy.
+        (internal function)
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :returns: Body of the response
+        :raises: :class:`APIConnectionError`: Error connecting to the API
+        '''
+        return await self._connection_retry_policy.call_async(self._request, url)
+
+    async def _get_raw_json_data(self, office_key: Optional[str] = None) -> bytes:
+        '''
+        Retrieve raw (undecoded) office data from JSON API.
+        (internal function)
+
+        :param office_key: Requested office identifier
+            (defaults to self.office_key)
+        :returns: Body of the API response
+        :raises:
+            :class:`AssertionError`: Missing argument
+            :class:`APIConnectionError`: Error connecting to the API
+            :class:`APICircuitOpenError`: Requests concerning the office
+                are suspended
+        '''
+        if office_key is None:
+            office_key = self._office_key
+        # Check argument's validity
+        if office_key is None:
+            raise AssertionError('Office key not provided')
+        if not self._circuit_breaker.allow(office_key):
+            raise APICircuitOpenError('Office temporarily not polled because of repeated failures')
+        try:
+            from apikey import apikey
+            # Prepare HTTP request GET parameters
+            parameters = {
+                'id': office_key,
+                'apikey': apikey().strip()
+            }
+            response = await self._request_with_retries(
+                append_parameters(self._api_urls['json'], parameters))
+        except APIError:
+            # Local problems (e.g. a missing API key) aren't office's failures
+            self._circuit_breaker.record_failure(office_key)
+            raise
+        else:
+            self._circuit_breaker.record_success(office_key)
+        finally:
+            self._circuit_breaker.release(office_key)
+        return response
+
+    #
+    # Public methods
+    #
+
+    async def get_office_list(self) -> OfficeList:
+        '''
+        Retrieve office identifiers list from HTML API.
+
+        Function retries on connection errors according to
+        self.connection_retry_policy.
+
+        :returns: Office identifiers list
+        :raises: :class:`APIConnectionError`: Error connecting to the API
+        '''
+        response = await self._request_with_retries(self._api_urls['html'])
+        return parse_office_list(response.decode('utf-8'))
+
+    async def get_matters_with_samples(
+            self, office_key: Optional[str] = None) -> MatterSampleList:
+        '''
+        Retrieve office-specific list of current states of queues for each
+        administrative matter available in the office using the JSON API.
+
+        :param office_key: Requested office identifier
+            (defaults to self._office_key)
+        :returns: List of dictionaries describing each matter and its queue
+            state
+        '''
+        if office_key is None:
+            office_key = self._office_key
+        batch = decode_matter_batch(await self._get_raw_json_data(office_key))
+        for group, reason in batch.quarantined:
+            self._quarantine.append((office_key, group, reason))
+        return batch.to_matter_sample_list()
+
+    async def get_many_matters_with_samples(
+            self, office_keys: List[str],
+            max_concurrency: int = 50) -> Dict[str, Union[MatterSampleList, Exception]]:
+        '''
+        Retrieve queue states of multiple offices concurrently.
+
+        :param office_keys: Requested offices' identifiers
+        :param max_concurrency: Maximal count of simultaneous requests
+        :returns: Dictionary mapping every office key to its matter list
+            or to the exception which caused the failure
+        '''
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(office_key: str) -> MatterSampleList:
+            async with semaphore:
+                return await self.get_matters_with_samples(office_key)
+
+        results = await asyncio.gather(
+            *(fetch(office_key) for office_key in office_keys),
+            return_exceptions=True)
+        return dict(zip(office_keys, results))
+
+    async def close(self) -> None:
+        '''
+        Close all idle connections.
+        '''
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    #
+    # Properties
+    #
+
+    @property
+    def rate_limiter(self) -> TokenBucket:
+        '''
+        Token bucket limiting the rate of API requests.
+        '''
+        return self._rate_limiter
+
+    @property
+    def retry_budget(self) -> RetryBudget:
+        '''
+        Limit of retries shared by all retry policies.
+        '''
+        return self._retry_budget
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        '''
+        Per-office circuit breaker suspending requests concerning repeatedly
+        failing offices.
+        '''
+        return self._circuit_breaker
+
+    @property
+    def connection_retry_policy(self) -> RetryPolicy:
+        '''
+        Retry policy of API requests.
+        '''
+        return self._connection_retry_policy
+
+    @property
+    def quarantine(self) -> List[Tuple[Optional[str], Any, str]]:
+        '''
+        Recently received groups not conforming to the data format, as
+        (office key, group, reason) triples.
+        '''
+        return list(self._quarantine)
+
     @property
     def office_key(self) -> str:
         '''
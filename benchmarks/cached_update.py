@@ -0,0 +1,101 @@
+'''
+Offline benchmark of CachedAPI.update_many, using ReplayTransport
+to imitate the API at various network latencies.
+
+Responses used: synthetic ones (see benchmarks.json_decode) or a recording
+made by RecordingTransport (directory given as the first argument).
+
+Run from the repository's root directory:
+    python -m benchmarks.cached_update [recording directory] [--profile]
+'''
+import cProfile
+import os
+import pstats
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.json_decode import synthetic_response
+from api import TokenBucket
+from database import CachedAPI
+from transport import ReplayTransport
+
+HTML_URL = 'http://replay/html'
+JSON_URL = 'http://replay/json'
+OFFICE_COUNT = 40
+
+# Latencies in seconds: none, typical and a heavy-tailed worst case
+LATENCIES = {
+    'no latency': 0.0,
+    '50 ms': 0.05,
+    'worst case': lambda url: min(4.0, random.expovariate(1 / 0.3)),
+}
+
+
+def synthetic_transport() -> ReplayTransport:
+    '''
+    Build a transport serving OFFICE_COUNT offices of 40 matters each.
+    '''
+    transport = ReplayTransport()
+    for index in range(OFFICE_COUNT):
+        transport.add_response(f'{JSON_URL}?id=office-{index}', synthetic_response(40))
+    return transport
+
+
+def run(transport: ReplayTransport, office_keys: List[str]) -> float:
+    '''
+    Update all the offices in a fresh cache.
+
+    :returns: Elapsed time in seconds
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        # The rate limiter is lifted to measure the cache and the network only
+        api = CachedAPI(
+            HTML_URL, JSON_URL, os.path.join(directory, 'cache.db'), transport,
+            TokenBucket(rate=1000, burst=1000))
+        api._store_office_list([{'name': key, 'key': key} for key in office_keys])
+        start = time.perf_counter()
+        results = api.update_many(office_keys)
+        elapsed = time.perf_counter() - start
+    failures = sum(exc is not None for exc in results.values())
+    assert failures == 0, f'{failures} offices failed'
+    return elapsed
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    arguments = [argument for argument in sys.argv[1:] if argument != '--profile']
+    try:
+        import apikey  # noqa: F401
+    except Exception:
+        # The key is irrelevant when replaying
+        sys.modules['apikey'] = SimpleNamespace(apikey=lambda: 'offline')
+    if arguments:
+        transport = ReplayTransport.load(arguments[0])
+        office_keys = sorted({
+            parse_qs(urlsplit(url).query)['id'][0] for url in transport.urls
+            if 'id=' in url})
+    else:
+        transport = synthetic_transport()
+        office_keys = [f'office-{index}' for index in range(OFFICE_COUNT)]
+    for name, latency in LATENCIES.items():
+        transport.latency = latency
+        transport.reset()
+        elapsed = run(transport, office_keys)
+        print(f'{name}: {len(office_keys)} offices in {elapsed:.3f} s')
+    if '--profile' in sys.argv:
+        transport.latency = 0.0
+        transport.reset()
+        profiler = cProfile.Profile()
+        profiler.runcall(run, transport, office_keys)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == '__main__':
+    main()
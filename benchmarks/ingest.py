@@ -0,0 +1,85 @@
+'''
+Benchmark comparing the former per-matter ingest of office data (a query
+and a transaction per helper call) with the single-transaction batched one
+of CachedAPI._store_update.
+
+Offices of 10, 50 and 200 matters are refreshed repeatedly with responses
+of consecutive timestamps, so that every refresh stores new samples.
+
+Run from the repository's root directory:
+    python -m benchmarks.ingest
+'''
+import os
+import tempfile
+import time
+from typing import Callable
+
+from api import MatterBatch, decode_matter_batch
+from benchmarks.json_decode import synthetic_response
+from database import CachedAPI
+
+REFRESH_COUNT = 20
+
+
+def legacy_store_update(api: CachedAPI, office_key: str, batch: MatterBatch) -> None:
+    '''
+    Store office data the way it was done before batched ingest.
+    '''
+    api._update_last_connection_time(office_key)
+    office_id = api._get_office_id(office_key)
+    for matter in batch.to_matter_sample_list():
+        matter_id = api._get_matter_id(matter['ordinal'], matter['group_id'], office_key)
+        if matter_id is None:
+            matter_id = api._store_matter(office_id, matter)
+        if not api._check_if_sample_exists(matter['time'], matter_id):
+            api._store_sample(matter_id, matter)
+    api._remove_old_samples()
+
+
+def batched_store_update(api: CachedAPI, office_key: str, batch: MatterBatch) -> None:
+    '''
+    Store office data using batched ingest.
+    '''
+    api._store_update(office_key, None, batch)
+
+
+def measure(store: Callable[[CachedAPI, str, MatterBatch], None], matter_count: int) -> float:
+    '''
+    Refresh an office REFRESH_COUNT times in a fresh cache file.
+
+    :returns: Mean time of a refresh in seconds (the first one, adding
+        the matters, excluded)
+    '''
+    batch = decode_matter_batch(synthetic_response(matter_count))
+    with tempfile.TemporaryDirectory() as directory:
+        api = CachedAPI('http://replay/html', 'http://replay/json',
+                        os.path.join(directory, 'cache.db'))
+        api._store_office_list([{'name': 'office', 'key': 'office'}])
+        store(api, 'office', batch)
+        start = time.perf_counter()
+        for minute in range(REFRESH_COUNT):
+            # Recent samples are not removed by the retention
+            timestamp = time.strftime(
+                '%Y-%m-%d %H:%M', time.localtime(time.time() - 60 * minute))
+            store(api, 'office', batch._replace(time=timestamp))
+        elapsed = time.perf_counter() - start
+        assert len(api.get_matter_list('office')) == matter_count
+        api.close()
+    return elapsed / REFRESH_COUNT
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    for matter_count in (10, 50, 200):
+        legacy_time = measure(legacy_store_update, matter_count)
+        batched_time = measure(batched_store_update, matter_count)
+        print(
+            f'{matter_count} matters: per-matter {legacy_time * 1000:.2f} ms, '
+            f'batched {batched_time * 1000:.2f} ms, '
+            f'speedup {legacy_time / batched_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Benchmark comparing the former decoding of JSON API responses (text
+decoding, stripping, parsing, per-matter conversion) with decode_matter_batch,
+i.e. measuring the cost of validating responses and quarantining malformed
+groups.
+
+Responses used: tests/test_response.json and synthetic responses consisting
+of many groups.
+
+Run from the repository's root directory:
+    python -m benchmarks.json_decode
+'''
+import json
+from timeit import timeit
+
+from api import MatterSampleList, decode_matter_batch
+
+ROUNDS = 7
+
+
+def synthetic_response(group_count: int) -> bytes:
+    '''
+    Build a raw response resembling the JSON API's one.
+
+    :param group_count: Count of groups (administrative matters)
+    :returns: Raw JSON API response
+    '''
+    groups = [{
+        'status': '1',
+        'czasObslugi': '10',
+        'lp': str(index % 99 + 1),
+        'idGrupy': str(600 + index),
+        'liczbaCzynnychStan': index % 5,
+        'nazwaGrupy': f'G{index}: Sprawa urzędowa numer {index}',
+        'literaGrupy': 'G',
+        'liczbaKlwKolejce': index % 30,
+        'aktualnyNumer': f'G{index % 1000:03}'
+    } for index in range(group_count)]
+    return json.dumps({
+        'result': {'date': '2019-12-27', 'grupy': groups, 'time': '15:41'}
+    }).encode('utf-8')
+
+
+def legacy_decode(response: bytes) -> MatterSampleList:
+    '''
+    Decode the response the way it was done before decode_matter_batch.
+
+    :returns: List of dictionaries describing each matter
+    '''
+    data = json.loads(response.decode('utf-8').strip())
+    if isinstance(data['result'], str):
+        raise ValueError(data['error'])
+    return sorted([{
+        'name': str(matter['nazwaGrupy']),
+        'ordinal': int(matter['lp']) if matter['lp'] is not None else None,
+        'group_id': int(matter['idGrupy']),
+        'queue_length': int(matter['liczbaKlwKolejce']),
+        'open_counters': int(matter['liczbaCzynnychStan']),
+        'current_number': str(matter['aktualnyNumer']),
+        'time': str(data['result']['date']) + ' ' + str(data['result']['time'])
+    } for matter in data['result']['grupy']], key=lambda matter: matter['name'])
+
+
+def batch_decode(response: bytes) -> MatterSampleList:
+    '''
+    Decode the response using decode_matter_batch.
+
+    :returns: List of dictionaries describing each matter
+    '''
+    return decode_matter_batch(response).to_matter_sample_list()
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    with open('tests/test_response.json', 'rb') as test_file:
+        responses = [('test_response.json', test_file.read())]
+    for group_count in (40, 200):
+        responses.append((f'{group_count} groups', synthetic_response(group_count)))
+    for name, response in responses:
+        repeats = max(20, 300000 // len(response))
+        assert legacy_decode(response) == batch_decode(response)
+        # The best of interleaved runs is the least disturbed by other load
+        legacy_times, batch_times, records_times = [], [], []
+        for _ in range(ROUNDS):
+            legacy_times.append(timeit(lambda: legacy_decode(response), number=repeats))
+            batch_times.append(timeit(lambda: batch_decode(response), number=repeats))
+            records_times.append(timeit(lambda: decode_matter_batch(response), number=repeats))
+        legacy_time = min(legacy_times) / repeats
+        batch_time = min(batch_times) / repeats
+        records_time = min(records_times) / repeats
+        print(
+            f'{name} ({len(response)} bytes): legacy {legacy_time * 1e6:.1f} us, '
+            f'validated {batch_time * 1e6:.1f} us ({legacy_time / batch_time:.2f}x), '
+            f'records only {records_time * 1e6:.1f} us ({legacy_time / records_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
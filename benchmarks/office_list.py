@@ -0,0 +1,82 @@
+'''
+Benchmark comparing OfficeListParser with the incremental OfficeListScanner.
+
+Pages used: tests/test_response.html and synthetic pages consisting
+of a header, a section of office entries and a long footer.
+
+Run from the repository's root directory:
+    python -m benchmarks.office_list
+'''
+from timeit import timeit
+from api import OfficeListParser, OfficeListScanner
+
+CHUNK_SIZE = 16384
+
+
+def synthetic_page(office_count: int, filler_count: int) -> str:
+    '''
+    Build an HTML page resembling the HTML API's one.
+
+    :param office_count: Count of office entries
+    :param filler_count: Count of unrelated blocks before and after
+        the office section
+    :returns: HTML page
+    '''
+    with open('tests/test_response.html', encoding='utf-8') as test_file:
+        entry = test_file.read()
+    filler = '<div class="menu"><a href="#">Odnośnik</a><span>Tekst</span></div>\n'
+    offices = ''.join(
+        entry.replace('7ef70889-4eb9-4301-a970-92287db23052', f'office-{index}')
+        for index in range(office_count))
+    return (
+        '<html><body>' + filler * filler_count
+        + '<div id="offices">' + offices + '</div>'
+        + filler * filler_count + '</body></html>')
+
+
+def parse(page: str) -> int:
+    '''
+    Parse the page with OfficeListParser.
+
+    :returns: Count of found offices
+    '''
+    parser = OfficeListParser()
+    parser.feed(page)
+    return len(parser.get_result())
+
+
+def scan(page: str) -> int:
+    '''
+    Scan the page with OfficeListScanner, feeding it chunk by chunk.
+
+    :returns: Count of found offices
+    '''
+    scanner = OfficeListScanner()
+    for start in range(0, len(page), CHUNK_SIZE):
+        scanner.feed(page[start:start + CHUNK_SIZE])
+    return len(scanner.get_result())
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    with open('tests/test_response.html', encoding='utf-8') as test_file:
+        pages = [('test_response.html', test_file.read())]
+    for office_count, filler_count in ((20, 500), (100, 2000), (500, 10000)):
+        pages.append((
+            f'{office_count} offices, {filler_count} filler blocks',
+            synthetic_page(office_count, filler_count)))
+    for name, page in pages:
+        repeats = max(1, 200000 // len(page))
+        assert parse(page) == scan(page)
+        parser_time = timeit(lambda: parse(page), number=repeats) / repeats
+        scanner_time = timeit(lambda: scan(page), number=repeats) / repeats
+        print(
+            f'{name} ({len(page)} characters): '
+            f'parser {parser_time * 1000:.3f} ms, scanner {scanner_time * 1000:.3f} ms, '
+            f'speedup {parser_time / scanner_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
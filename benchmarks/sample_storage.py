@@ -0,0 +1,142 @@
+'''
+Benchmark comparing the former storage of samples (local time text,
+no secondary indexes) with the current one (UNIX epoch, indexed by matter
+and time), including the migration between them.
+
+Both databases are filled with the same samples of 500 matters, one per
+minute, ending at the current time (2 million rows by default).
+
+Run from the repository's root directory:
+    python -m benchmarks.sample_storage [row count]
+'''
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Iterator, Tuple
+
+from database import CachedAPI, TIME_FORMAT
+
+MATTER_COUNT = 500
+
+
+def sample_rows(row_count: int, text_times: bool) -> Iterator[Tuple]:
+    '''
+    Generate sample rows (time, matter_id, open_counters, queue_length,
+    current_number).
+    '''
+    now = int(time.time()) // 60 * 60
+    for minute in range(row_count // MATTER_COUNT):
+        epoch = now - 60 * minute
+        sample_time = time.strftime(TIME_FORMAT, time.localtime(epoch)) if text_times else epoch
+        for matter_id in range(1, MATTER_COUNT + 1):
+            yield sample_time, matter_id, 1, minute % 20, f'A{minute % 1000:03}'
+
+
+def fill_legacy(filename: str, row_count: int) -> None:
+    '''
+    Create a cache of schema version 0 filled with samples.
+    '''
+    connection = sqlite3.connect(filename)
+    connection.execute('CREATE TABLE offices (id INTEGER PRIMARY KEY, name TEXT, key TEXT UNIQUE)')
+    connection.execute(
+        '''
+        CREATE TABLE matters (id INTEGER PRIMARY KEY, name TEXT, ordinal INT,
+        group_id INT, office_id INTEGER NOT NULL, UNIQUE (ordinal, group_id, office_id))
+        ''')
+    connection.execute(
+        '''
+        CREATE TABLE samples (time TEXT NOT NULL, matter_id INTEGER NOT NULL,
+        open_counters INTEGER, queue_length INTEGER, current_number TEXT,
+        PRIMARY KEY (time, matter_id))
+        ''')
+    connection.execute('CREATE TABLE last_connection (office_id INTEGER PRIMARY KEY, time TEXT)')
+    connection.executemany(
+        'INSERT INTO samples VALUES (?, ?, ?, ?, ?)', sample_rows(row_count, True))
+    connection.commit()
+    connection.close()
+
+
+def fill_current(filename: str, row_count: int) -> None:
+    '''
+    Create a cache of the current schema filled with samples.
+    '''
+    CachedAPI('http://replay/html', 'http://replay/json', filename).close()
+    connection = sqlite3.connect(filename)
+    connection.executemany(
+        'INSERT INTO samples VALUES (?, ?, ?, ?, ?)', sample_rows(row_count, False))
+    connection.commit()
+    connection.close()
+
+
+def timed(connection: sqlite3.Connection, query: str, parameters: Tuple,
+          repeats: int = 20) -> float:
+    '''
+    Run a query (rolling back its changes) and measure its mean time.
+
+    :returns: Mean time in milliseconds
+    '''
+    start = time.perf_counter()
+    for _ in range(repeats):
+        connection.execute(query, parameters).fetchall()
+        connection.rollback()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    minutes = row_count // MATTER_COUNT
+    now = int(time.time()) // 60 * 60
+    # Retention removes the oldest minute, reads concern the last hour
+    retention_cutoff = now - 60 * (minutes - 1) + 1
+    range_start = now - 3600
+
+    def local(epoch: int) -> str:
+        return time.strftime(TIME_FORMAT, time.localtime(epoch))
+
+    legacy_queries = {
+        'retention': (
+            "DELETE FROM samples WHERE DATETIME(time, 'utc') < DATETIME(?, 'unixepoch')",
+            (retention_cutoff,)),
+        'last hour of a matter': (
+            'SELECT * FROM samples WHERE matter_id = ? AND time >= ? ORDER BY time',
+            (250, local(range_start))),
+        'latest sample': (
+            'SELECT * FROM samples WHERE matter_id = ? ORDER BY time DESC LIMIT 1', (250,)),
+    }
+    current_queries = {
+        'retention': ('DELETE FROM samples WHERE time < ?', (retention_cutoff,)),
+        'last hour of a matter': (
+            'SELECT * FROM samples WHERE matter_id = ? AND time >= ? ORDER BY time',
+            (250, range_start)),
+        'latest sample': (
+            'SELECT * FROM samples WHERE matter_id = ? ORDER BY time DESC LIMIT 1', (250,)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_filename = os.path.join(directory, 'legacy.db')
+        current_filename = os.path.join(directory, 'current.db')
+        fill_legacy(legacy_filename, row_count)
+        fill_current(current_filename, row_count)
+        print(f'{row_count} samples of {MATTER_COUNT} matters')
+        for name in legacy_queries:
+            times = []
+            for filename, queries in (
+                    (legacy_filename, legacy_queries), (current_filename, current_queries)):
+                connection = sqlite3.connect(filename)
+                repeats = 3 if name == 'retention' and queries is legacy_queries else 20
+                times.append(timed(connection, *queries[name], repeats=repeats))
+                connection.close()
+            print(
+                f'{name}: text {times[0]:.2f} ms, epoch {times[1]:.2f} ms, '
+                f'speedup {times[0] / times[1]:.0f}x')
+        start = time.perf_counter()
+        CachedAPI('http://replay/html', 'http://replay/json', legacy_filename).close()
+        print(f'migration: {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+Benchmark of the GUI startup: time from the start of a fresh process
+(importing gui.py included) until the first paint of the main window
+and until the office list is shown in it.
+
+The office list is replayed at 1 s latency. With a cold (empty) cache it's
+fetched from API; with a warm one (filled by the cold run) it's read from
+cache. Every run is a separate process, so that the imports are measured.
+
+Requires PyQt5; the offscreen platform is used unless QT_QPA_PLATFORM
+is set.
+
+Run from the repository's root directory:
+    python -m benchmarks.startup
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+HTML_URL = 'http://replay/html'
+JSON_URL = 'http://replay/json'
+LATENCY = 1.0
+
+
+def measure(directory: str) -> Dict[str, float]:
+    '''
+    Start the GUI using the cache in given directory and measure the times
+    (in seconds since the start of the function).
+    '''
+    start = time.perf_counter()
+    from PyQt5.QtCore import QTimer
+    from database import CachedAPI
+    from gui import HiDpiApplication, QueueSystemWindow
+    from transport import ReplayTransport
+    times = {'import': time.perf_counter() - start}
+    transport = ReplayTransport(LATENCY)
+    with open('tests/test_response.html', 'rb') as html_file:
+        transport.add_response(HTML_URL, html_file.read())
+    api = CachedAPI(HTML_URL, JSON_URL, os.path.join(directory, 'cache.db'), transport)
+    application = HiDpiApplication([])
+    window = QueueSystemWindow(api, os.path.join(directory, 'settings.ini'))
+    window.firstPainted.connect(
+        lambda: times.setdefault('first_paint', time.perf_counter() - start))
+
+    def office_list_loaded() -> None:
+        times['office_list'] = time.perf_counter() - start
+        application.quit()
+    window.officeListLoaded.connect(office_list_loaded)
+    QTimer.singleShot(30000, application.quit)
+    window.show()
+    application.exec_()
+    api.close()
+    return times
+
+
+def main() -> None:
+    '''
+    Run the benchmark and print its results.
+    '''
+    if len(sys.argv) > 2 and sys.argv[1] == '--measure':
+        print(json.dumps(measure(sys.argv[2])))
+        return
+    environment = dict(os.environ)
+    environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('cold cache', 'warm cache'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', '--measure', directory],
+                env=environment, stdout=subprocess.PIPE, check=True,
+                universal_newlines=True).stdout
+            times = json.loads(output.splitlines()[-1])
+            print(
+                f"{name}: imports {times['import'] * 1000:.0f} ms, "
+                f"first paint {times['first_paint'] * 1000:.0f} ms, "
+                f"office list {times.get('office_list', float('nan')) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
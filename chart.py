@@ -0,0 +1,303 @@
+'''
+File containing chart-related GUI functionalities.
+
+PyQtChart takes a while to load, so the module is imported by the main
+window only once the window has been shown (see gui.py).
+
+Classes:
+DetailedPointF
+QueueSystemSeries
+QueueSystemChart
+'''
+from typing import Optional, Any
+
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QDateTime, QPointF
+from PyQt5.QtGui import QColor
+# QChartView is imported by gui.py from here along with the chart
+from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis, QDateTimeAxis
+
+from database import SampleColumns
+
+
+class DetailedPointF(QPointF):
+    '''
+    Subclass of QPointF with an additional property: user data.
+
+    Qt method naming convention is preserved.
+
+    :param `*args`: Positional arguments passed to QPointF constructor
+    :param `**kwargs`: Named arguments passed to QPointF constructor
+    :ivar _user_data: Arbitrary user data.
+        Getter: userData.
+        Setter: setUserData.
+    '''
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._user_data: Any = None
+
+    def userData(self) -> Any:
+        '''
+        Get user data associated with the point.
+
+        :returns: Arbitrary user data assigned to the point
+        '''
+        return self._user_data
+
+    def setUserData(self, data: Any) -> None:
+        '''
+        Associate user data with the point.
+
+        :param data: Arbitrary user data to be assigned to the point
+        '''
+        self._user_data = data
+
+
+class QueueSystemSeries(QLineSeries):
+    '''
+    Subclass of QLineSeries for encapsulating time samples data associated
+    with queue systems of Warsaw.
+
+    Qt method naming convention is preserved.
+
+    :param parent: Parent widget (optional) passed to QLineSeries constructor
+    :ivar _user_data: Arbitrary user data.
+        Getter: userData.
+        Setter: setUserData.
+    :ivar _max_value: The greatest queue length among the points (at least
+        10, the default height of the chart)
+    '''
+    # Time span of the chart in seconds: older points are removed
+    time_span = 3600
+
+    def __init__(self, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self._user_data: Any = None
+        self._max_value: int = 10
+
+    def _samplePoint(self, samples: SampleColumns, index: int) -> DetailedPointF:
+        '''
+        Convert a time sample to a chart point.
+        (internal function)
+
+        :param samples: Queue time samples
+        :param index: Index of the converted sample
+        :returns: Point carrying the sample's data
+        '''
+        point = DetailedPointF(
+            samples.times[index] * 1000,
+            samples.queue_lengths[index]
+        )
+        if isinstance(self._user_data, dict):
+            name = self._user_data.get('name')
+        else:
+            name = None
+        point.setUserData({
+            'name': name,
+            'open_counters': samples.open_counters[index],
+            'queue_length': samples.queue_lengths[index],
+            'current_number': samples.current_numbers[index]})
+        return point
+
+    def setSamples(self, samples: SampleColumns) -> None:
+        '''
+        Replace current point data with given time samples.
+
+        :param samples: Queue time samples to replace series data with
+        '''
+        self.clear()
+        self._max_value = 10
+        chart = self.chart()
+        if chart is not None:
+            if chart.topSeriesIndex() == chart.series().index(self):
+                chart.series()[-1].clear()
+        self.appendSamples(samples)
+
+    def appendSamples(self, samples: SampleColumns) -> None:
+        '''
+        Append given time samples (newer than the present ones) to point data
+        and remove the points older than self.time_span before the newest one.
+
+        The cost depends on the count of new and removed points only.
+
+        :param samples: Queue time samples ordered by time
+        '''
+        if len(samples) == 0:
+            return
+        points = [self._samplePoint(samples, index) for index in range(len(samples))]
+        max_time = QDateTime.fromSecsSinceEpoch(samples.times[-1])
+        # Count the points falling out of the time span (the oldest ones)
+        min_x = max_time.addSecs(-self.time_span).toMSecsSinceEpoch()
+        expired_count = 0
+        while expired_count < self.count() and self.at(expired_count).x() < min_x:
+            expired_count += 1
+        expired_max = max(
+            (self.at(index).y() for index in range(expired_count)), default=0)
+        chart = self.chart()
+        top_series = None
+        if chart is not None:
+            if chart.topSeriesIndex() == chart.series().index(self):
+                top_series = chart.series()[-1]
+        for series in (self, top_series):
+            if series is not None:
+                if expired_count > 0:
+                    series.removePoints(0, expired_count)
+                series.append(points)
+        # Look for the greatest sample value (among all the points only if
+        # the greatest one has just been removed)
+        if expired_max >= self._max_value:
+            self._max_value = int(max(
+                (point.y() for point in self.pointsVector()), default=10))
+        self._max_value = max(self._max_value, 10, max(samples.queue_lengths))
+        # Move chart's horizontal axis according to the newest sample
+        self.attachedAxes()[0].setRange(max_time.addSecs(-self.time_span), max_time)
+        self.attachedAxes()[0].hide()
+        self.attachedAxes()[0].show()
+        # Scale chart's vertical axis according to the greatest sample
+        self.attachedAxes()[1].setMax(self._max_value)
+        self.attachedAxes()[1].hide()
+        self.attachedAxes()[1].show()
+
+    def userData(self) -> Any:
+        '''
+        Get user data associated with the series.
+
+        :returns: Arbitrary user data assigned to the series
+        '''
+        return self._user_data
+
+    def setUserData(self, data: Any) -> None:
+        '''
+        Associate user data with the series.
+
+        :param data: Arbitrary user data to be assigned to the series
+        '''
+        self._user_data = data
+
+
+class QueueSystemChart(QChart):
+    '''
+    Subclass of QChart for displaying and managing time samples data
+    associated with queue systems of Warsaw.
+
+    Qt method naming convention is preserved.
+
+    :param `*args`: Positional arguments passed to QChart constructor
+    :param `**kwargs`: Named arguments passed to QChart constructor
+    :ivar _top_series: Index of series portrayed as topmost series in graph
+        (covering other series).
+        Getter: topSeriesIndex.
+        Setter: setTopSeriesIndex.
+    '''
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Setup horizontal axis
+        x_axis = QDateTimeAxis()
+        x_axis.setFormat('hh:mm')
+        x_axis.setTickCount(7)
+        x_axis.setTitleText('Godzina [hh:mm]')
+        self.addAxis(x_axis, Qt.AlignBottom)
+        # Setup vertical axis
+        y_axis = QValueAxis()
+        y_axis.setTitleText('Liczba osób w kolejce')
+        self.addAxis(y_axis, Qt.AlignLeft)
+        self.resetAxes()
+
+        self.legend().setVisible(False)
+        self._top_series: Optional[int] = None
+
+    def resetAxes(self) -> None:
+        '''
+        Reset chart's axes to default ranges
+        '''
+        x_axis, y_axis = self.axes()
+        current_time = QDateTime.currentDateTime()
+        x_axis.setRange(current_time.addSecs(-3600), current_time)
+        x_axis.hide()
+        x_axis.show()
+        y_axis.setMax(10)
+        y_axis.hide()
+        y_axis.show()
+
+    def setSeriesCount(self, count: int) -> None:
+        '''
+        Clear the chart and add specified count of series to it.
+
+        Actually, the chart will have one more series than specified:
+        the topmost one simulating bringing chosen series to top.
+
+        :param count: Count of series to set.
+        '''
+        self.removeAllSeries()
+        for _ in range(count + 1):
+            series = QueueSystemSeries()
+            pen = series.pen()
+            pen.setWidth(4)
+            series.setPen(pen)
+            self.addSeries(series)
+            for axis in self.axes():
+                series.attachAxis(axis)
+        self.resetAxes()
+
+    def setSeriesSamples(self, series_index: int, samples: SampleColumns) -> None:
+        '''
+        Set sample data of specified series.
+
+        :param series_index: Index of series which data is to be set
+        :param samples: Time samples
+        '''
+        if 0 <= series_index < len(self.series()):
+            self.series()[series_index].setSamples(samples)
+
+    def appendSeriesSamples(self, series_index: int, samples: SampleColumns) -> None:
+        '''
+        Append new samples to the data of specified series.
+
+        :param series_index: Index of series which data is to be extended
+        :param samples: Time samples newer than the present ones
+        '''
+        if 0 <= series_index < len(self.series()):
+            self.series()[series_index].appendSamples(samples)
+
+    def setSeriesData(self, series_index: int, user_data: Any, color: QColor) -> None:
+        '''
+        Set user and color data of specified series.
+
+        :param series_index: Index of series which data is to be set
+        :param user_data: User data
+        :param color: Color of series
+        '''
+        if 0 <= series_index < len(self.series()):
+            self.series()[series_index].setUserData(user_data)
+            self.series()[series_index].setColor(color)
+
+    def topSeriesIndex(self) -> Optional[int]:
+        '''
+        Get index of topmost series (if any is set).
+
+        :returns: Index of series portrayed as topmost (may be None)
+        '''
+        return self._top_series
+
+    def setTopSeriesIndex(self, index: Optional[int]) -> None:
+        '''
+        Set index of topmost series.
+
+        :param index: Index of series to be portrayed as topmost or None
+            (for resetting state of actual topmost series)
+        '''
+        series = self.series()
+        if index is None:
+            # If index is None, reset the actual topmost series data
+            self._top_series = index
+            series[-1].replace([])
+        elif 0 <= index < len(self.series()):
+            # If index exists, style the actual topmost series to resemble
+            # the one portrayed as topmost
+            self._top_series = index
+            series[-1].replace(series[index].pointsVector())
+            pen = series[index].pen()
+            pen.setWidth(8)
+            series[-1].setPen(pen)
+        else:
+            raise ValueError('Series index out of range')
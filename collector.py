@@ -0,0 +1,154 @@
+'''
+Headless collector of queue data: polls all the offices on a schedule
+and stores their data in the cache, which the GUI may view meanwhile
+(see WSSTORE_READ_ONLY in main.py). Qt isn't required.
+
+Run from the repository's root directory:
+    python -m collector [--cache cache.db] [--cooldown 60] [--workers 8] [--once]
+
+The collector stops after the current sweep on SIGTERM or SIGINT.
+
+Classes:
+Collector
+'''
+import argparse
+import logging
+import signal
+import threading
+import time
+from typing import Optional, Dict, List
+
+from api import API_URLS
+from database import CachedAPI
+
+logger = logging.getLogger('collector')
+
+
+class Collector:
+    '''
+    Poller of all the cached offices: every sweep updates the due offices
+    concurrently (see CachedAPI.update_many) and removes outdated samples.
+    Sweeps are run as soon as some office becomes due; failed offices
+    are retried with backoff. The retry budget of API requests is
+    replenished once per cooldown, i.e. per round of polls of all
+    the offices, not at every sweep.
+
+    :param api: CachedAPI storing the data
+    :param max_workers: Maximal count of simultaneous API requests
+    :param min_interval: Minimal time in seconds between sweeps
+    :ivar _api: CachedAPI provided in constructor
+    :ivar _max_workers: Worker count provided in constructor
+    :ivar _min_interval: Minimal interval provided in constructor
+    :ivar _budget_reset: Monotonic time of the last replenishment
+        of the retry budget (or None)
+    :ivar _stopped: Event set when the collector is requested to stop
+    '''
+    def __init__(
+            self, api: CachedAPI, max_workers: int = 8,
+            min_interval: float = 5.0) -> None:
+        if api.read_only:
+            raise ValueError('Read-only cache cannot be updated')
+        self._api: CachedAPI = api
+        self._max_workers: int = max_workers
+        self._min_interval: float = min_interval
+        self._budget_reset: Optional[float] = None
+        self._stopped: threading.Event = threading.Event()
+
+    #
+    # Public methods
+    #
+
+    def sweep(self) -> Dict[str, Optional[Exception]]:
+        '''
+        Update the due offices and remove outdated samples, logging the time
+        it took and the failures.
+
+        :returns: Dictionary mapping every due office key to None on success
+            or to the exception which caused the failure
+        '''
+        start = time.perf_counter()
+        now = time.monotonic()
+        if self._budget_reset is None or now - self._budget_reset >= self._api.cooldown:
+            self._api.retry_budget.reset()
+            self._budget_reset = now
+        office_keys = [office['key'] for office in self._api.get_office_list()]
+        due_keys = self._api.due_office_keys(office_keys)
+        results = self._api.update_many(due_keys, self._max_workers) if due_keys else {}
+        self._api.remove_old_samples()
+        elapsed = time.perf_counter() - start
+        failures = {key: exc for key, exc in results.items() if exc is not None}
+        logger.info(
+            'Sweep finished in %.3f s: %d of %d offices due, %d failed',
+            elapsed, len(due_keys), len(office_keys), len(failures))
+        for office_key, exc in failures.items():
+            logger.warning('Update of office %s failed: %r', office_key, exc)
+        return results
+
+    def run(self) -> None:
+        '''
+        Run sweeps until self.stop is called, then close the cache.
+        Errors of a sweep are logged without stopping the collector.
+        '''
+        logger.info('Collector started (cooldown: %d s)', self._api.cooldown)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception('Sweep failed')
+                wait = self._api.scheduler.seconds_until_due()
+                if wait is None:
+                    wait = self._api.cooldown
+                self._stopped.wait(max(wait, self._min_interval))
+        finally:
+            self._api.close()
+            logger.info('Collector stopped')
+
+    def stop(self) -> None:
+        '''
+        Request the collector to stop after the current sweep. Can be called
+        from other threads and signal handlers.
+        '''
+        self._stopped.set()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    '''
+    Parse command-line arguments and run the collector.
+
+    :param argv: Command-line arguments (defaults to sys.argv[1:])
+    '''
+    parser = argparse.ArgumentParser(
+        prog='python -m collector', description='Collect queue data of all the offices.')
+    parser.add_argument(
+        '--cache', default='cache.db', help='SQLite3 database filename (default: %(default)s)')
+    parser.add_argument(
+        '--cooldown', type=int, default=60,
+        help='base time in seconds between API calls of an office; busy offices are polled '
+        'more often, idle and failing ones less often (default: %(default)s)')
+    parser.add_argument(
+        '--workers', type=int, default=8,
+        help='maximal count of simultaneous API requests (default: %(default)s)')
+    parser.add_argument('--once', action='store_true', help='run a single sweep and exit')
+    parser.add_argument(
+        '--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+        help='logging level (default: %(default)s)')
+    arguments = parser.parse_args(argv)
+    logging.basicConfig(
+        level=arguments.log_level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    api = CachedAPI(API_URLS['html'], API_URLS['json'], arguments.cache)
+    api.cooldown = arguments.cooldown
+    collector = Collector(api, arguments.workers)
+    if arguments.once:
+        try:
+            collector.sweep()
+        finally:
+            api.close()
+        return
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda signal_number, frame: collector.stop())
+    collector.run()
+
+
+if __name__ == '__main__':
+    main()
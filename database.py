@@ -7,20 +7,67 @@ DatabaseError
     DatabaseTemporaryError
     DatabasePersistentError
 SQLite3Cursor
+SQLite3ConnectionManager
+IdentityMap
+HotTier
+SQLiteTokenBucket
+RetentionPolicy
+SampleColumns
 CachedAPI
 '''
+import asyncio
+import os
+import pathlib
+import socket
 import sqlite3
+import sys
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from types import TracebackType
-from typing import Union, Optional, Dict, List, Tuple, Any
+from typing import (
+    Union, Optional, Dict, List, Tuple, Set, Deque, Iterable, Iterator, Callable, Hashable, Any)
 
-from retrying import retry
-
-from api import WSStoreAPI, OfficeList
+from api import (
+    WSStoreAPI, TokenBucket, APICircuitOpenError, OfficeList,
+    MatterRecord, MatterBatch, read_response_timestamp)
+from retry_policy import RetryBudget, RetryPolicy, retry
+from scheduler import Activity, ActivityPolicy, PollScheduler, Flight, SingleFlight
+from transport import Transport
 
 MatterData = Dict[str, Union[str, Optional[int]]]
 MatterList = List[MatterData]
-SampleData = Dict[str, Union[str, int]]
+SampleData = Dict[str, Union[Optional[str], int]]
+# Sample as stored: (time, queue length, open counters, current number)
+SampleRow = Tuple[int, int, int, Optional[str]]
 SampleList = List[SampleData]
+OfficeSamples = Dict[Tuple[Optional[int], int], Union[SampleList, 'SampleColumns']]
+RollupData = Dict[str, Union[str, int, float]]
+RollupList = List[RollupData]
+
+# Version of the cache database's schema (kept in PRAGMA user_version):
+# 0 - sample times stored as local time text (format: YYYY-MM-DD HH:MM),
+# 1 - sample times stored as integer UNIX epoch, secondary indexes present,
+# 2 - rollups (aggregates of samples over fixed intervals) present,
+# 3 - times of the last API calls stored as integer UNIX epoch,
+# 4 - leases of offices' polls (see CachedAPI._claim_poll) present
+SCHEMA_VERSION = 4
+# Format of times exposed by CachedAPI
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def to_epoch(local_time: str) -> int:
+    '''
+    Convert local time to UNIX epoch.
+
+    :param local_time: Local time (format: YYYY-MM-DD HH:MM)
+    :returns: Seconds since the epoch
+    '''
+    return int(time.mktime(time.strptime(local_time, TIME_FORMAT)))
 
 
 class DatabaseError(Exception):
@@ -61,6 +108,24 @@ def is_temporary_database_error(exception) -> bool:
     return isinstance(exception, DatabaseTemporaryError)
 
 
+def convert_database_error(exception: sqlite3.DatabaseError) -> DatabaseError:
+    '''
+    Convert sqlite3 exception to the appropriate abstract exception.
+
+    :param exception: Exception raised by sqlite3 module
+    :returns: Corresponding DatabaseError instance (to be raised from
+        the original exception)
+    '''
+    exc_string = str(exception.args[0]).lower() if exception.args else ''
+    if isinstance(exception, sqlite3.OperationalError):
+        if exc_string.find('locked') > -1:
+            return DatabaseTemporaryError('Temporary operational error')
+    elif isinstance(exception, sqlite3.IntegrityError):
+        if exc_string.find('constraint failed') > -1:
+            return DatabaseInsertionError('Integrity check failed')
+    return DatabasePersistentError('Fatal database error')
+
+
 class SQLite3Cursor:
     '''
     Context manager for opening and automatically closing sqlite3 database
@@ -72,7 +137,7 @@ class SQLite3Cursor:
     For arguments reference, see sqlite3.connect
 
     :param `*args`: Positional arguments to be passed to sqlite3.connect
-    :param `*kwargs`: Named arguments to be passed to sqlite3.connect
+    :param `**kwargs`: Named arguments to be passed to sqlite3.connect
     :ivar args: Positional arguments to be passed to sqlite3.connect
     :ivar kwargs: Named arguments to be passed to sqlite3.connect
     :ivar connection: SQLite3 connection object created upon entering
@@ -90,7 +155,7 @@ class SQLite3Cursor:
 
         Opened connection's curson is returned for "as" keyword.
         '''
-        self._connection = sqlite3.connect(*self._args, *self._kwargs)
+        self._connection = sqlite3.connect(*self._args, **self._kwargs)
         self._connection.row_factory = sqlite3.Row
         return self._connection.cursor()
 
@@ -115,27 +180,822 @@ class SQLite3Cursor:
         self._connection.close()
         # If error is database-related, raise appropriate abstract exception
         if isinstance(exc_value, sqlite3.DatabaseError):
-            exc_string = str(exc_value.args[0]).lower()
-            if isinstance(exc_value, sqlite3.OperationalError):
-                if exc_string.find('locked') > -1:
-                    raise DatabaseTemporaryError(
-                        'Temporary operational error') from exc_value
-                else:
-                    raise DatabasePersistentError(
-                        'Fatal database error') from exc_value
-            elif isinstance(exc_value, sqlite3.IntegrityError):
-                if exc_string.find('constraint failed') > -1:
-                    raise DatabaseInsertionError(
-                        'Integrity check failed') from exc_value
-                else:
-                    raise DatabasePersistentError(
-                        'Fatal database error') from exc_value
-            else:
-                raise DatabasePersistentError(
-                    'Fatal database error') from exc_value
+            raise convert_database_error(exc_value) from exc_value
         return False
 
 
+class SQLite3ConnectionManager:
+    '''
+    Thread-safe keeper of long-lived sqlite3 connections to a single
+    database: one writer connection shared by all threads (one at a time)
+    and a reader connection per thread.
+
+    Writer contexts can be nested (the outermost one commits or rollbacks
+    the transaction). Reads performed by a thread inside its writer context
+    use the writer connection, so they see the pending changes. A private
+    in-memory database (':memory:') exists only as long as its connection,
+    hence a single connection serves both writers and readers then.
+
+    Database files are switched to write-ahead logging (WAL), so readers
+    never wait for the writer (and vice versa). Commits are synced to disk
+    only at checkpoints (synchronous = NORMAL): a power loss may revert
+    the latest transactions, but cannot corrupt the database. Connections
+    wait up to busy_timeout for locks held by other processes instead
+    of failing immediately.
+
+    Exceptions are converted like in case of SQLite3Cursor.
+
+    :param filename: SQLite3 database filename
+    :param cached_statements: Count of prepared statements cached
+        by every connection
+    :param busy_timeout: Time in seconds a connection waits for a lock
+    :param wal_autocheckpoint: Size of the write-ahead log (in pages)
+        triggering its checkpoint
+    :param read_only: Whether the database file is opened in read-only mode
+        (it's never created then and all writes fail)
+    :ivar _filename: Database filename provided in constructor
+    :ivar _cached_statements: Statement cache size provided in constructor
+    :ivar _busy_timeout: Busy timeout provided in constructor
+    :ivar _wal_autocheckpoint: Checkpoint threshold provided in constructor
+    :ivar _read_only: Read-only flag provided in constructor
+    :ivar _writer: Writer connection (created on first use)
+    :ivar _write_lock: Lock held by the thread using the writer connection
+    :ivar _write_depth: Nesting depth of writer contexts of the lock's owner
+    :ivar _readers: Reader connections by thread identifier
+    :ivar _lock: Lock guarding access to the connections
+    :ivar on_rollback: Function called after rolling back a write
+        transaction, e.g. to invalidate data cached during it (may be None)
+    '''
+    # Size limit in bytes the write-ahead log is truncated to after
+    # checkpoints
+    journal_size_limit = 16 * 1024 * 1024
+
+    def __init__(
+            self, filename: str, cached_statements: int = 256,
+            busy_timeout: float = 5.0, wal_autocheckpoint: int = 1000,
+            read_only: bool = False) -> None:
+        self._filename: str = filename
+        self._cached_statements: int = cached_statements
+        self._busy_timeout: float = busy_timeout
+        self._wal_autocheckpoint: int = wal_autocheckpoint
+        self._read_only: bool = read_only
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock: threading.RLock = threading.RLock()
+        self._write_depth: int = 0
+        self._readers: Dict[int, sqlite3.Connection] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.on_rollback: Optional[Callable[[], None]] = None
+
+    #
+    # Private methods used internally
+    #
+
+    def _rollback(self, connection: sqlite3.Connection) -> None:
+        '''
+        Roll back the write transaction and notify self.on_rollback.
+        (internal function)
+
+        :param connection: Writer connection
+        '''
+        connection.rollback()
+        if self.on_rollback is not None:
+            self.on_rollback()
+
+    def _connect(self, writer: bool = False) -> sqlite3.Connection:
+        '''
+        Open a new connection to the database and configure it.
+        (internal function)
+
+        Connections may be closed by other threads than the ones which
+        opened them (see self.close), but are never used concurrently.
+
+        :param writer: Whether the connection is the writer one
+        :returns: Opened connection
+        '''
+        database = self._filename
+        if self._read_only:
+            # Opening a missing file in read-only mode fails instead
+            # of creating it
+            database = pathlib.Path(self._filename).absolute().as_uri() + '?mode=ro'
+        try:
+            connection = sqlite3.connect(
+                database, timeout=self._busy_timeout,
+                cached_statements=self._cached_statements, check_same_thread=False,
+                uri=self._read_only)
+            if self._filename != ':memory:':
+                # Journal mode is persistent, so it's set by the writer only
+                if writer and not self._read_only:
+                    connection.execute('PRAGMA journal_mode = WAL')
+                    connection.execute(f'PRAGMA journal_size_limit = {self.journal_size_limit}')
+                connection.execute('PRAGMA synchronous = NORMAL')
+                connection.execute(f'PRAGMA wal_autocheckpoint = {self._wal_autocheckpoint}')
+        except sqlite3.DatabaseError as exc:
+            raise convert_database_error(exc) from exc
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _get_reader(self) -> sqlite3.Connection:
+        '''
+        Get the reader connection of the current thread, opening it if needed.
+        Connections of finished threads are closed on the occasion.
+        (internal function)
+
+        :returns: Reader connection
+        '''
+        thread_id = threading.get_ident()
+        with self._lock:
+            connection = self._readers.get(thread_id)
+            if connection is not None:
+                return connection
+            alive = {thread.ident for thread in threading.enumerate()}
+            finished = [
+                self._readers.pop(ident) for ident in list(self._readers)
+                if ident not in alive]
+        for stale_connection in finished:
+            stale_connection.close()
+        connection = self._connect()
+        with self._lock:
+            self._readers[thread_id] = connection
+        return connection
+
+    def _owns_writer(self) -> bool:
+        '''
+        Check if the current thread is inside a writer context.
+        (internal function)
+
+        :returns: True if the thread uses the writer connection
+        '''
+        # Acquiring a held reentrant lock succeeds only for its owner
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._write_depth > 0
+        finally:
+            self._write_lock.release()
+
+    #
+    # Public methods
+    #
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Cursor]:
+        '''
+        Context manager providing a cursor of the writer connection.
+
+        The changes are committed at the end of the outermost writer context
+        or rolled back if it ends with an exception.
+
+        :returns: Cursor of the writer connection
+        '''
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(writer=True)
+            connection = self._writer
+            self._write_depth += 1
+            try:
+                yield connection.cursor()
+            except BaseException as exc:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._rollback(connection)
+                if isinstance(exc, sqlite3.DatabaseError):
+                    raise convert_database_error(exc) from exc
+                raise
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                try:
+                    connection.commit()
+                except sqlite3.DatabaseError as exc:
+                    self._rollback(connection)
+                    raise convert_database_error(exc) from exc
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Cursor]:
+        '''
+        Context manager providing a cursor for reading from the database.
+
+        The cursor belongs to the current thread's reader connection, unless
+        the thread is inside a writer context or the database resides
+        in memory; the writer connection is used then.
+
+        :returns: Cursor of a connection
+        '''
+        if self._filename == ':memory:' or self._owns_writer():
+            with self.writer() as cursor:
+                yield cursor
+            return
+        connection = self._get_reader()
+        try:
+            yield connection.cursor()
+        except sqlite3.DatabaseError as exc:
+            raise convert_database_error(exc) from exc
+        finally:
+            # End the implicit transaction (if any) to release the snapshot
+            if connection.in_transaction:
+                connection.rollback()
+
+    def close(self) -> None:
+        '''
+        Close all the connections. New ones are opened if the manager is used
+        afterwards.
+        '''
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._lock:
+            readers, self._readers = self._readers, {}
+        for connection in readers.values():
+            connection.close()
+
+    #
+    # Properties
+    #
+
+    @property
+    def filename(self) -> str:
+        '''
+        Database filename.
+        '''
+        return self._filename
+
+
+class IdentityMap:
+    '''
+    Thread-safe memo of database ID numbers by natural keys (e.g. office
+    keys), sparing queries for rows which almost never change.
+
+    Only existing rows are remembered: absent ones are looked up again
+    on every request, so that they are found once inserted.
+
+    :ivar _ids: ID numbers by keys
+    :ivar _hits: Count of lookups answered from memory
+    :ivar _misses: Count of lookups requiring a query
+    :ivar _lock: Lock guarding the memo and its counters
+    '''
+    def __init__(self) -> None:
+        self._ids: Dict[Hashable, int] = {}
+        self._hits: int = 0
+        self._misses: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, key: Hashable, load: Callable[[], Optional[int]]) -> Optional[int]:
+        '''
+        Get ID number of a row, querying the database on a miss.
+
+        :param key: Row's natural key
+        :param load: Function querying the database for the ID number
+            (returning None if the row doesn't exist)
+        :returns: Row's ID number (or None if it doesn't exist)
+        '''
+        with self._lock:
+            row_id = self._ids.get(key)
+            if row_id is not None:
+                self._hits += 1
+                return row_id
+            self._misses += 1
+        row_id = load()
+        if row_id is not None:
+            with self._lock:
+                self._ids[key] = row_id
+        return row_id
+
+    def lookup(self, key: Hashable) -> Optional[int]:
+        '''
+        Get remembered ID number of a row without querying the database.
+
+        :param key: Row's natural key
+        :returns: Row's ID number (or None if it isn't remembered)
+        '''
+        with self._lock:
+            row_id = self._ids.get(key)
+            if row_id is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return row_id
+
+    def remember(self, key: Hashable, row_id: int) -> None:
+        '''
+        Note ID number of a row (e.g. an inserted one).
+
+        :param key: Row's natural key
+        :param row_id: Row's ID number
+        '''
+        with self._lock:
+            self._ids[key] = row_id
+
+    def clear(self) -> None:
+        '''
+        Forget all the ID numbers (e.g. after a rolled back transaction,
+        which might have inserted remembered rows).
+        '''
+        with self._lock:
+            self._ids.clear()
+
+    @property
+    def hits(self) -> int:
+        '''
+        Count of lookups answered from memory.
+        '''
+        with self._lock:
+            return self._hits
+
+    @property
+    def misses(self) -> int:
+        '''
+        Count of lookups requiring a query.
+        '''
+        with self._lock:
+            return self._misses
+
+
+class HotTier:
+    '''
+    Thread-safe in-memory copy of the recent samples of the most recently
+    read offices, sparing database reads of data written by the process
+    itself.
+
+    Each matter of a hot office has a ring buffer of its latest samples.
+    A buffer which has never overflowed holds all the samples of its matter;
+    an overflowed one holds all the samples from the oldest one it contains.
+    Requests not covered this way return None (and have to be answered
+    by the database).
+
+    Offices become hot once loaded (usually after being read from the
+    database); the least recently used ones are dropped when there are
+    more than office_limit of them. Every addition of samples to an office
+    (hot or not) changes its version, so that a load based on a read
+    preceding a concurrent addition can be refused.
+
+    :param capacity: Count of samples kept per matter
+    :param office_limit: Count of offices kept (0 disables the tier)
+    :ivar _capacity: Capacity provided in constructor
+    :ivar _office_limit: Office limit provided in constructor
+    :ivar _offices: By office ID numbers (ordered from the least recently
+        used): (ordinal, group ID) pairs by matter ID numbers, sample
+        buffers by matter ID numbers and ID numbers of matters whose buffers
+        have overflowed
+    :ivar _versions: Counts of additions of samples by office ID numbers
+    :ivar _hits: Count of requests answered from memory
+    :ivar _misses: Count of requests not answered from memory
+    :ivar _lock: Lock guarding the buffers and counters
+    '''
+    def __init__(self, capacity: int = 120, office_limit: int = 4) -> None:
+        if capacity < 1 or office_limit < 0:
+            raise ValueError('Hot tier size cannot be negative')
+        self._capacity: int = capacity
+        self._office_limit: int = office_limit
+        self._offices: 'OrderedDict[int, Tuple[Dict, Dict[int, Deque[SampleRow]], Set[int]]]' = \
+            OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._hits: int = 0
+        self._misses: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    #
+    # Private methods used internally
+    #
+
+    def _samples(
+            self, buffer: Deque[SampleRow], overflowed: bool,
+            since_time: int) -> Optional[List[SampleRow]]:
+        '''
+        Pick samples newer than given time from a buffer if it holds all
+        of them.
+        (internal function)
+
+        :param buffer: Buffer of samples
+        :param overflowed: True if the buffer has overflowed
+        :param since_time: Time (seconds since the epoch) the samples have
+            to be newer than
+        :returns: Samples ordered by time (or None if some may be missing)
+        '''
+        if overflowed and (not buffer or since_time < buffer[0][0]):
+            return None
+        return [sample for sample in buffer if sample[0] > since_time]
+
+    #
+    # Public methods
+    #
+
+    def version(self, office_id: int) -> int:
+        '''
+        Get the version of an office's samples (to be passed to self.load).
+
+        :param office_id: Office's ID number
+        :returns: Count of additions of samples to the office
+        '''
+        with self._lock:
+            return self._versions.get(office_id, 0)
+
+    def load(
+            self, office_id: int, matters: Dict[int, Tuple[Optional[int], int]],
+            samples: Iterable[Tuple[int, SampleRow]], version: int) -> bool:
+        '''
+        Make an office hot, replacing its buffers.
+
+        :param office_id: Office's ID number
+        :param matters: (ordinal, group ID) pairs of all the office's matters
+            by their ID numbers
+        :param samples: All the stored samples of the office (ordered by
+            time) along with their matters' ID numbers
+        :param version: Version of the office's samples (see self.version)
+            from before reading them
+        :returns: True if the office has become hot, False if samples have
+            been added in the meantime (or the tier is disabled)
+        '''
+        if self._office_limit == 0:
+            return False
+        buffers = {matter_id: deque(maxlen=self._capacity) for matter_id in matters}
+        overflowed = set()
+        for matter_id, sample in samples:
+            buffer = buffers[matter_id]
+            if len(buffer) == self._capacity:
+                overflowed.add(matter_id)
+            buffer.append(sample)
+        with self._lock:
+            if self._versions.get(office_id, 0) != version:
+                return False
+            self._offices[office_id] = (dict(matters), buffers, overflowed)
+            self._offices.move_to_end(office_id)
+            while len(self._offices) > self._office_limit:
+                self._offices.popitem(last=False)
+            return True
+
+    def add(
+            self, office_id: int, matters: Dict[int, Tuple[Optional[int], int]],
+            samples: Iterable[Tuple[int, SampleRow]]) -> None:
+        '''
+        Add new (already committed) samples to the buffers of an office
+        if it's hot.
+
+        Samples older than the newest buffered one of their matter make
+        the office cold (they couldn't be placed in order).
+
+        :param office_id: Office's ID number
+        :param matters: (ordinal, group ID) pairs of the office's matters
+            (at least the new ones) by their ID numbers
+        :param samples: New samples along with their matters' ID numbers
+        '''
+        with self._lock:
+            self._versions[office_id] = self._versions.get(office_id, 0) + 1
+            office = self._offices.get(office_id)
+            if office is None:
+                return
+            office_matters, buffers, overflowed = office
+            office_matters.update(matters)
+            for matter_id, sample in samples:
+                buffer = buffers.setdefault(matter_id, deque(maxlen=self._capacity))
+                if buffer and buffer[-1][0] >= sample[0]:
+                    del self._offices[office_id]
+                    return
+                if len(buffer) == self._capacity:
+                    overflowed.add(matter_id)
+                buffer.append(sample)
+
+    def trim(self, min_time: int) -> None:
+        '''
+        Remove samples older than given time (as the retention does).
+
+        :param min_time: Time (seconds since the epoch) of the oldest
+            sample to keep
+        '''
+        with self._lock:
+            for _, buffers, _ in self._offices.values():
+                for buffer in buffers.values():
+                    while buffer and buffer[0][0] < min_time:
+                        buffer.popleft()
+
+    def get(self, office_id: int, matter_id: int, since_time: int) -> Optional[List[SampleRow]]:
+        '''
+        Get samples of a matter newer than given time.
+
+        :param office_id: ID number of the matter's office
+        :param matter_id: Matter's ID number
+        :param since_time: Time (seconds since the epoch) the samples have
+            to be newer than (-1 for all of them)
+        :returns: Samples ordered by time (or None if the office isn't hot
+            or some of the samples may be missing)
+        '''
+        with self._lock:
+            office = self._offices.get(office_id)
+            samples = None
+            if office is not None:
+                self._offices.move_to_end(office_id)
+                _, buffers, overflowed = office
+                samples = self._samples(
+                    buffers.get(matter_id, ()), matter_id in overflowed, since_time)
+            if samples is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return samples
+
+    def get_office(
+            self, office_id: int,
+            since_time: int) -> Optional[List[Tuple[Tuple[Optional[int], int], List[SampleRow]]]]:
+        '''
+        Get samples of all the matters of an office newer than given time.
+
+        :param office_id: Office's ID number
+        :param since_time: Time (seconds since the epoch) the samples have
+            to be newer than (-1 for all of them)
+        :returns: ((ordinal, group ID), samples ordered by time) pairs
+            ordered by matters' ID numbers (or None if the office isn't hot
+            or some of the samples may be missing)
+        '''
+        with self._lock:
+            office = self._offices.get(office_id)
+            result = None
+            if office is not None:
+                self._offices.move_to_end(office_id)
+                matters, buffers, overflowed = office
+                result = []
+                for matter_id in sorted(matters):
+                    samples = self._samples(
+                        buffers.get(matter_id, ()), matter_id in overflowed, since_time)
+                    if samples is None:
+                        result = None
+                        break
+                    result.append((matters[matter_id], samples))
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return result
+
+    def is_hot(self, office_id: int) -> bool:
+        '''
+        Check if an office is hot.
+
+        :param office_id: Office's ID number
+        :returns: True if the office's samples are kept in memory
+        '''
+        with self._lock:
+            return office_id in self._offices
+
+    def clear(self) -> None:
+        '''
+        Drop all the offices (e.g. after a rolled back transaction, which
+        might have added samples).
+        '''
+        with self._lock:
+            self._offices.clear()
+
+    #
+    # Properties
+    #
+
+    @property
+    def office_limit(self) -> int:
+        '''
+        Count of offices kept (0 if the tier is disabled).
+        '''
+        return self._office_limit
+
+    @property
+    def hits(self) -> int:
+        '''
+        Count of requests answered from memory.
+        '''
+        with self._lock:
+            return self._hits
+
+    @property
+    def misses(self) -> int:
+        '''
+        Count of requests not answered from memory.
+        '''
+        with self._lock:
+            return self._misses
+
+
+class SQLiteTokenBucket(TokenBucket):
+    '''
+    Token bucket keeping its state in an SQLite3 database, so that the limit
+    is shared by all processes (and threads) using the same database file.
+
+    Since monotonic clocks of different processes are not comparable,
+    wall-clock time is used for refilling the bucket.
+
+    :param filename: SQLite3 database filename
+    :param rate: Count of tokens added every second
+    :param burst: Capacity of the bucket
+    :param name: Name distinguishing buckets stored in the same database
+    :param connections: Connection manager of the database (a private one
+        is created if not provided)
+    :ivar _connections: Connection manager of the database
+    :ivar _name: Bucket's name provided in constructor
+    '''
+    def __init__(
+            self, filename: str, rate: float = 5.0, burst: int = 10,
+            name: str = 'api',
+            connections: Optional[SQLite3ConnectionManager] = None) -> None:
+        super().__init__(rate, burst)
+        if connections is None:
+            connections = SQLite3ConnectionManager(filename)
+        self._connections: SQLite3ConnectionManager = connections
+        self._name: str = name
+        with self._connections.writer() as cursor:
+            cursor.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS rate_limiter (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+                ''')
+
+    def _take(self) -> float:
+        '''
+        Refill the bucket and take one token from it in a single database
+        transaction.
+        (overriden internal function)
+
+        :returns: Count of tokens left (negative if the token has been
+            reserved in advance)
+        '''
+        now = time.time()
+        with self._lock, self._connections.writer() as cursor:
+            cursor.execute(
+                '''
+                INSERT OR IGNORE INTO rate_limiter (name, tokens, updated)
+                VALUES (?, ?, ?)
+                ''', (self._name, self._burst, now))
+            cursor.execute(
+                '''
+                UPDATE rate_limiter
+                SET tokens = MIN(?, tokens + MAX(? - updated, 0) * ?) - 1,
+                    updated = MAX(updated, ?)
+                WHERE name = ?
+                ''', (self._burst, now, self._rate, now, self._name))
+            return cursor.execute(
+                '''
+                SELECT tokens
+                FROM rate_limiter
+                WHERE name = ?
+                ''', (self._name,)).fetchone()[0]
+
+    async def _reserve_async(self) -> float:
+        '''
+        Take a token, possibly in advance, in the default executor: the write
+        transaction may wait for the database lock up to the busy timeout,
+        which would stall every coroutine of the event loop.
+        (overriden internal function)
+
+        :returns: Time in seconds the caller has to wait before sending
+            the request
+        '''
+        return await asyncio.get_running_loop().run_in_executor(None, self.reserve)
+
+
+class RetentionPolicy:
+    '''
+    Description of how long cached data are kept.
+
+    Raw samples are kept for the raw period. Every sample is also added
+    to rollups: aggregates (count, minimum, maximum and sum of queue length
+    and of open counters) of all the samples of a matter falling into
+    an interval of fixed length (resolution). Rollups of each resolution are
+    kept for their own period, so that historical data remain available
+    at lower resolution without the cache growing unboundedly.
+
+    Rollups are maintained as samples are stored. Resolutions added later
+    begin with the samples stored afterwards.
+
+    :param raw: Retention period of raw samples in seconds
+    :param rollups: Retention periods of rollups in seconds by their
+        resolutions in seconds (defaults to 5-minute rollups kept for 30
+        days and hourly ones kept for a year)
+    :ivar raw: Retention period of raw samples in seconds
+    :ivar rollups: Retention periods of rollups by resolutions
+    '''
+    def __init__(self, raw: int = 3600, rollups: Optional[Dict[int, int]] = None) -> None:
+        if rollups is None:
+            rollups = {300: 30 * 86400, 3600: 365 * 86400}
+        if raw <= 0 or any(period <= 0 for period in rollups.values()):
+            raise ValueError('Retention period must be positive')
+        if any(resolution <= 0 or resolution % 60 for resolution in rollups):
+            raise ValueError('Rollup resolution must be a positive multiple of a minute')
+        self.raw: int = raw
+        self.rollups: Dict[int, int] = dict(rollups)
+
+
+class SampleColumns:
+    '''
+    Time samples stored column by column: times (UNIX epoch) in array('q'),
+    queue lengths and open counters in array('i') and current numbers
+    in a list of interned strings.
+
+    Compared to a list of dictionaries, it takes a fraction of memory
+    and its columns can be processed without converting every sample.
+    Indexing with an integer returns a sample dictionary (like the ones
+    of SampleList). Slicing returns read-only columns sharing memory with
+    the sliced ones (the current numbers' list shares the strings);
+    the original columns can't be appended to as long as such views exist.
+
+    :ivar _times: Times of the samples (seconds since the epoch)
+    :ivar _queue_lengths: Queue lengths of the samples
+    :ivar _open_counters: Counts of open counters of the samples
+    :ivar _current_numbers: Current numbers of the samples
+    '''
+    def __init__(self) -> None:
+        self._times: Union[array, memoryview] = array('q')
+        self._queue_lengths: Union[array, memoryview] = array('i')
+        self._open_counters: Union[array, memoryview] = array('i')
+        self._current_numbers: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[SampleData, 'SampleColumns']:
+        if isinstance(index, slice):
+            columns = SampleColumns()
+            columns._times = memoryview(self._times)[index]
+            columns._queue_lengths = memoryview(self._queue_lengths)[index]
+            columns._open_counters = memoryview(self._open_counters)[index]
+            columns._current_numbers = self._current_numbers[index]
+            return columns
+        return {
+            'queue_length': self._queue_lengths[index],
+            'open_counters': self._open_counters[index],
+            'current_number': self._current_numbers[index],
+            'time': time.strftime(TIME_FORMAT, time.localtime(self._times[index]))
+        }
+
+    def append(
+            self, sample_time: int, queue_length: int, open_counters: int,
+            current_number: Optional[str]) -> None:
+        '''
+        Append a sample to the columns.
+
+        :param sample_time: Time of the sample (seconds since the epoch)
+        :param queue_length: Queue length
+        :param open_counters: Count of open counters
+        :param current_number: Current number (None if unknown)
+        :raises: :class:`BufferError`: Views of the columns exist
+        '''
+        self._times.append(sample_time)
+        self._queue_lengths.append(queue_length)
+        self._open_counters.append(open_counters)
+        # Current numbers repeat a lot, so they share string objects
+        self._current_numbers.append(
+            sys.intern(current_number) if current_number is not None else None)
+
+    def to_sample_list(self) -> SampleList:
+        '''
+        Convert the columns to a list of sample dictionaries.
+
+        :returns: List of time samples
+        '''
+        return [self[index] for index in range(len(self))]
+
+    def to_numpy(self) -> Dict[str, Any]:
+        '''
+        Convert the columns to NumPy arrays sharing memory with them
+        (current numbers are copied to an array of objects).
+
+        :returns: Arrays by sample dictionaries' keys
+        :raises: :class:`ImportError`: NumPy not installed
+        '''
+        import numpy
+        return {
+            'time': numpy.frombuffer(self._times, dtype=numpy.longlong),
+            'queue_length': numpy.frombuffer(self._queue_lengths, dtype=numpy.intc),
+            'open_counters': numpy.frombuffer(self._open_counters, dtype=numpy.intc),
+            'current_number': numpy.array(self._current_numbers, dtype=object)
+        }
+
+    @property
+    def times(self) -> Union[array, memoryview]:
+        '''
+        Times of the samples (seconds since the epoch).
+        '''
+        return self._times
+
+    @property
+    def queue_lengths(self) -> Union[array, memoryview]:
+        '''
+        Queue lengths of the samples.
+        '''
+        return self._queue_lengths
+
+    @property
+    def open_counters(self) -> Union[array, memoryview]:
+        '''
+        Counts of open counters of the samples.
+        '''
+        return self._open_counters
+
+    @property
+    def current_numbers(self) -> List[Optional[str]]:
+        '''
+        Current numbers of the samples.
+        '''
+        return self._current_numbers
+
+
 class CachedAPI(WSStoreAPI):
     '''
     Subclass of WWStoreApi, which caches fetched data using an SQLite3
@@ -144,23 +1004,117 @@ class CachedAPI(WSStoreAPI):
     :param html_api_url: Base URL of API returning HTML encoded data
     :param json_api_url: Base URL of API returning JSON encoded data
     :param cache_filename: SQLite3 database filename (defaults to ':memory:')
+    :param transport: Transport used for requests (a private
+        HTTPConnectionPool is created if not provided)
+    :param rate_limiter: Token bucket limiting the rate of requests (if not
+        provided, a bucket shared through the database file is created)
+    :param retention_policy: Retention of samples and their rollups
+        (see RetentionPolicy for the default one)
+    :param hot_offices: Count of the most recently read offices whose
+        samples are kept in memory (0 disables it)
+    :param hot_capacity: Count of samples kept in memory per matter
+    :param lease_time: Time in seconds a process claiming an office's poll
+        is given to store its outcome; once it passes, the lease of a process
+        which died in the meantime may be taken over by another one
+    :param poll_policy: Rule choosing poll intervals of offices according
+        to their activity and to whether they're displayed (the default one
+        is used if not provided, see ActivityPolicy)
+    :param read_only: Whether the cache is only viewed, while another process
+        (e.g. the collector) fetches the data: API isn't called, the database
+        isn't modified (it has to be created beforehand) and no samples are
+        kept in memory, as they'd be made stale by the other process
     :ivar _api_urls: Base URLs of APIs provided in constructor
     :ivar _office_key: Default office identifier (settable through
         self.office_key property)
     :ivar _filename: SQLite3 database filename provided in constructor
-    :ivar _cooldown: Minimal interval between API calls in seconds (default
-        value equals 60, settable through self.cooldown property)
+    :ivar _connections: Long-lived connections to the database
+    :ivar _identity_map: Memo of office and matter ID numbers, keyed
+        by ('office', office key) and ('matter', ordinal, group ID,
+        office ID) tuples
+    :ivar _hot_tier: Recent samples of the most recently read offices,
+        updated along with the database
+    :ivar _data_version: Version of the database's content changed by other
+        processes (PRAGMA data_version), as of the last check of the hot tier
+    :ivar _cooldown: Base interval between API calls of an office in seconds
+        (default value equals 60, settable through self.cooldown property)
+    :ivar _scheduler: Due times of offices' updates (accessible through
+        self.scheduler property), restored from the database on first use
+        and saved to it by claims of polls (see self._claim_polls) and along
+        with the next stored outcome of an update
+    :ivar _single_flight: Updates in progress by office keys, joined
+        by concurrent updates of the same offices
+    :ivar _lease_owner: Identifier of the object in leases of offices'
+        polls, unique across processes sharing the database
+    :ivar _lease_time: Lease time provided in constructor
+    :ivar _read_only: Read-only flag provided in constructor (accessible
+        through self.read_only property)
+    :ivar _fingerprints: Timestamps (date and time pairs) of the last stored
+        API response of each office
+    :ivar _stats: Counters describing cache's operation (accessible through
+        self.stats property)
+    :ivar _lock: Lock guarding access to fingerprints and counters
+    :ivar _database_retry_budget: Limit of retries of database operations,
+        separate from the one of API requests
+    :ivar _database_retry_policy: Retry policy of database operations
+        (accessible through self.database_retry_policy property)
+    :ivar _retention_policy: Retention of samples and their rollups
+        (accessible through self.retention_policy property)
     '''
     def __init__(
-            self, html_api_url: str, json_api_url: str, cache_filename: Optional[str] = None) -> None:
-        super().__init__(html_api_url, json_api_url)
+            self, html_api_url: str, json_api_url: str, cache_filename: Optional[str] = None,
+            transport: Optional[Transport] = None,
+            rate_limiter: Optional[TokenBucket] = None,
+            retention_policy: Optional[RetentionPolicy] = None,
+            hot_offices: int = 4, hot_capacity: int = 120, lease_time: int = 30,
+            poll_policy: Optional[ActivityPolicy] = None, read_only: bool = False) -> None:
         if cache_filename is None:
             self._filename: str = ':memory:'
         else:
             self._filename: str = cache_filename
-        self._init_tables()
-        self._remove_old_samples()
+        self._connections: SQLite3ConnectionManager = SQLite3ConnectionManager(
+            self._filename, read_only=read_only and self._filename != ':memory:')
+        self._read_only: bool = read_only
+        if read_only:
+            hot_offices = 0
+        self._identity_map: IdentityMap = IdentityMap()
+        self._hot_tier: HotTier = HotTier(hot_capacity, hot_offices)
+        self._data_version: Optional[int] = None
+        # Rows inserted by a rolled back transaction don't exist
+        self._connections.on_rollback = self._forget_uncommitted
+        # Processes sharing the database file share the request rate limit
+        # as well (a private in-memory database cannot be shared)
+        if rate_limiter is None and self._filename != ':memory:' and not read_only:
+            rate_limiter = SQLiteTokenBucket(
+                self._filename, connections=self._connections)
+        super().__init__(html_api_url, json_api_url, transport, rate_limiter)
+        # Database retries don't compete with API ones for the budget
+        self._database_retry_budget: RetryBudget = RetryBudget(limit=20, period=60)
+        self._database_retry_policy: RetryPolicy = RetryPolicy(
+            is_temporary_database_error, attempts=3, initial_wait=0.5, max_wait=2,
+            budget=self._database_retry_budget)
+        if retention_policy is None:
+            retention_policy = RetentionPolicy()
+        self._retention_policy: RetentionPolicy = retention_policy
+        if read_only:
+            self._check_schema()
+        else:
+            self._init_tables()
+            self._remove_old_samples()
         self._cooldown: int = 60
+        if poll_policy is None:
+            poll_policy = ActivityPolicy()
+        self._scheduler: PollScheduler = PollScheduler(self._cooldown, poll_policy)
+        self._single_flight: SingleFlight = SingleFlight()
+        self._lease_owner: str = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._lease_time: int = lease_time
+        self._fingerprints: Dict[str, Tuple[str, str]] = {}
+        self._stats: Dict[str, int] = {
+            'fetched_updates': 0,
+            'skipped_updates': 0,
+            'quarantined_groups': 0,
+            'yielded_updates': 0
+        }
+        self._lock: threading.Lock = threading.Lock()
 
     #
     # Methods called during initialization
@@ -168,10 +1122,18 @@ class CachedAPI(WSStoreAPI):
 
     def _init_tables(self) -> None:
         '''
-        Create required database tables if they are non-existent.
+        Create required database tables and indexes if they are non-existent
+        and migrate the ones created by previous versions of the application.
         (internal function)
+
+        All of it forms a single transaction, which blocks other processes'
+        writes, so that the migration is run only once.
         '''
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.writer() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise DatabasePersistentError('Cache created by a newer version')
             cursor.execute(
                 '''
                 CREATE TABLE IF NOT EXISTS offices (
@@ -193,45 +1155,230 @@ class CachedAPI(WSStoreAPI):
                     UNIQUE (ordinal, group_id, office_id)
                 )
                 ''')
+            has_samples = cursor.execute(
+                '''
+                SELECT COUNT(*)
+                FROM sqlite_master
+                WHERE type = 'table' AND name = 'samples'
+                ''').fetchone()[0]
+            if has_samples and version < 1:
+                self._migrate_sample_times(cursor)
+            else:
+                self._create_sample_table(cursor)
+            cursor.execute(
+                '''
+                CREATE INDEX IF NOT EXISTS samples_by_matter
+                ON samples (matter_id, time)
+                ''')
             cursor.execute(
                 '''
-                CREATE TABLE IF NOT EXISTS samples (
-                    time TEXT NOT NULL,
+                CREATE TABLE IF NOT EXISTS rollups (
+                    resolution INTEGER NOT NULL,
+                    time INTEGER NOT NULL,
                     matter_id INTEGER NOT NULL,
-                    open_counters INTEGER,
-                    queue_length INTEGER,
-                    current_number TEXT,
-                    PRIMARY KEY (time, matter_id),
+                    sample_count INTEGER NOT NULL,
+                    queue_length_min INTEGER,
+                    queue_length_max INTEGER,
+                    queue_length_sum INTEGER,
+                    open_counters_min INTEGER,
+                    open_counters_max INTEGER,
+                    open_counters_sum INTEGER,
+                    PRIMARY KEY (resolution, time, matter_id),
                     FOREIGN KEY (matter_id)
                         REFERENCES matters (id)
                 )
                 ''')
             cursor.execute(
                 '''
-                CREATE TABLE IF NOT EXISTS last_connection (
-                    office_id INTEGER PRIMARY KEY,
-                    time TEXT,
-                    FOREIGN KEY (office_id)
-                        REFERENCES offices (id)
-                )
+                CREATE INDEX IF NOT EXISTS rollups_by_matter
+                ON rollups (matter_id, resolution, time)
+                ''')
+            if has_samples and version < 2:
+                self._backfill_rollups(cursor)
+            cursor.execute(
+                '''
+                CREATE INDEX IF NOT EXISTS matters_by_office
+                ON matters (office_id)
                 ''')
+            has_last_connection = cursor.execute(
+                '''
+                SELECT COUNT(*)
+                FROM sqlite_master
+                WHERE type = 'table' AND name = 'last_connection'
+                ''').fetchone()[0]
+            if has_last_connection and version < 3:
+                self._migrate_last_connection_times(cursor)
+            elif has_last_connection and version < 4:
+                cursor.execute('ALTER TABLE last_connection ADD COLUMN lease_owner TEXT')
+                cursor.execute('ALTER TABLE last_connection ADD COLUMN lease_until INTEGER')
+            else:
+                self._create_last_connection_table(cursor)
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _check_schema(self) -> None:
+        '''
+        Make sure the database's schema is the current one (it's neither
+        created nor migrated in case of a read-only cache).
+        (internal function)
+
+        :raises: :class:`DatabasePersistentError`: Missing database or one
+            of other schema version
+        '''
+        if self._filename != ':memory:' and not os.path.exists(self._filename):
+            raise DatabasePersistentError(
+                f'Cache {self._filename} does not exist yet '
+                '(run the collector first to create it)')
+        with self._connections.reader() as cursor:
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            raise DatabasePersistentError(
+                f'Cache of schema version {version} cannot be read '
+                f'(version {SCHEMA_VERSION} required)')
+
+    @staticmethod
+    def _create_last_connection_table(
+            cursor: sqlite3.Cursor, name: str = 'last_connection') -> None:
+        '''
+        Create the table of times of the last API calls (as UNIX epoch)
+        and leases of the next ones if it's non-existent.
+        (internal function)
+
+        :param cursor: Cursor of the writer connection
+        :param name: Name of the table
+        '''
+        cursor.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                office_id INTEGER PRIMARY KEY,
+                time INTEGER,
+                lease_owner TEXT,
+                lease_until INTEGER,
+                FOREIGN KEY (office_id)
+                    REFERENCES offices (id)
+            )
+            ''')
+
+    def _migrate_last_connection_times(self, cursor: sqlite3.Cursor) -> None:
+        '''
+        Convert the table of times of the last API calls from local time
+        text (schema versions up to 2) to UNIX epoch.
+        (internal function)
+
+        :param cursor: Cursor of the writer connection
+        '''
+        self._create_last_connection_table(cursor, 'last_connection_epoch')
+        cursor.execute(
+            '''
+            INSERT INTO last_connection_epoch (office_id, time)
+            SELECT office_id, CAST(STRFTIME('%s', time, 'utc') AS INTEGER)
+            FROM last_connection
+            ''')
+        cursor.execute('DROP TABLE last_connection')
+        cursor.execute('ALTER TABLE last_connection_epoch RENAME TO last_connection')
+
+    @staticmethod
+    def _create_sample_table(cursor: sqlite3.Cursor, name: str = 'samples') -> None:
+        '''
+        Create the table of time samples if it's non-existent.
+        (internal function)
+
+        Sample times are stored as UNIX epoch. The primary key serves
+        the retention, the secondary (matter_id, time) index serves reads.
+
+        :param cursor: Cursor of the writer connection
+        :param name: Name of the table
+        '''
+        cursor.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                time INTEGER NOT NULL,
+                matter_id INTEGER NOT NULL,
+                open_counters INTEGER,
+                queue_length INTEGER,
+                current_number TEXT,
+                PRIMARY KEY (time, matter_id),
+                FOREIGN KEY (matter_id)
+                    REFERENCES matters (id)
+            )
+            ''')
+
+    def _migrate_sample_times(self, cursor: sqlite3.Cursor) -> None:
+        '''
+        Convert the table of time samples from local time text (schema
+        version 0) to UNIX epoch.
+        (internal function)
+
+        Samples with unparsable times are dropped.
+
+        :param cursor: Cursor of the writer connection
+        '''
+        self._create_sample_table(cursor, 'samples_epoch')
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO samples_epoch (time, matter_id, open_counters,
+            queue_length, current_number)
+            SELECT CAST(STRFTIME('%s', time, 'utc') AS INTEGER), matter_id,
+            open_counters, queue_length, current_number
+            FROM samples
+            WHERE STRFTIME('%s', time, 'utc') IS NOT NULL
+            ''')
+        cursor.execute('DROP TABLE samples')
+        cursor.execute('ALTER TABLE samples_epoch RENAME TO samples')
+
+    def _backfill_rollups(self, cursor: sqlite3.Cursor) -> None:
+        '''
+        Compute rollups of the samples stored by previous versions
+        of the application.
+        (internal function)
+
+        :param cursor: Cursor of the writer connection
+        '''
+        for resolution in self._retention_policy.rollups:
+            cursor.execute(
+                '''
+                INSERT OR IGNORE INTO rollups
+                SELECT ?, time / ? * ?, matter_id, COUNT(*),
+                MIN(queue_length), MAX(queue_length), SUM(queue_length),
+                MIN(open_counters), MAX(open_counters), SUM(open_counters)
+                FROM samples
+                GROUP BY time / ?, matter_id
+                ''', (resolution, resolution, resolution, resolution))
 
     def _remove_old_samples(self) -> None:
         '''
-        Remove queue state data older than from 1 hour before.
+        Remove samples and rollups older than their retention periods
+        (see self.retention_policy).
         (internal function)
         '''
-        with SQLite3Cursor(self._filename) as cursor:
+        now = int(time.time())
+        with self._connections.writer() as cursor:
             cursor.execute(
                 '''
                 DELETE FROM samples
-                WHERE DATETIME(time, 'utc') < DATETIME('now', '-1 hour')
-                ''')
+                WHERE time < ?
+                ''', (now - self._retention_policy.raw,))
+            self._hot_tier.trim(now - self._retention_policy.raw)
+            cursor.executemany(
+                '''
+                DELETE FROM rollups
+                WHERE resolution = ? AND time < ?
+                ''', [
+                    (resolution, now - period)
+                    for resolution, period in self._retention_policy.rollups.items()])
 
     #
     # Private methods used internally
     #
 
+    def _forget_uncommitted(self) -> None:
+        '''
+        Forget data which might have been remembered during a rolled back
+        transaction: ID numbers and hot samples.
+        (internal function)
+        '''
+        self._identity_map.clear()
+        self._hot_tier.clear()
+
     def _get_office_id(
             self, office_key: Optional[str] = None) -> Optional[int]:
         '''
@@ -250,8 +1397,20 @@ class CachedAPI(WSStoreAPI):
             raise AssertionError('Office key not provided')
         if not isinstance(office_key, str):
             raise TypeError('Office key has to be of type str')
+        return self._identity_map.get(
+            ('office', office_key), lambda: self._load_office_id(office_key))
+
+    def _load_office_id(self, office_key: str) -> Optional[int]:
+        '''
+        Query the database for ID number representing an office with a given
+        key (see self._get_office_id).
+        (internal function)
+
+        :param office_key: Requested office's key identifier
+        :returns: Corresponding office's ID number (if present)
+        '''
         # Check database for matching office entry
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.reader() as cursor:
             office_id = cursor.execute('''
                 SELECT id
                 FROM offices
@@ -292,9 +1451,26 @@ class CachedAPI(WSStoreAPI):
                 matter_group_id = int(matter_group_id)
             except (ValueError, TypeError):
                 raise TypeError("Matter's group's ID must be convertible to int")
-        # Check database for matching matter entry
         office_id = self._get_office_id(office_key)
-        with SQLite3Cursor(self._filename) as cursor:
+        return self._identity_map.get(
+            ('matter', matter_ordinal, matter_group_id, office_id),
+            lambda: self._load_matter_id(matter_ordinal, matter_group_id, office_id))
+
+    def _load_matter_id(
+            self, matter_ordinal: Optional[int], matter_group_id: int,
+            office_id: Optional[int]) -> Optional[int]:
+        '''
+        Query the database for ID number representing an administrative matter
+        with given details (see self._get_matter_id).
+        (internal function)
+
+        :param matter_ordinal: Requested matter's ordinal number
+        :param matter_group_id: Requested matter's group ID
+        :param office_id: ID number of an office the matter belongs to
+        :returns: Corresponding administrative matter's ID number (if present)
+        '''
+        # Check database for matching matter entry
+        with self._connections.reader() as cursor:
             if matter_ordinal is None:
                 matter_id = cursor.execute(
                     '''
@@ -317,6 +1493,31 @@ class CachedAPI(WSStoreAPI):
         else:
             return matter_id[0]
 
+    @staticmethod
+    def _get_matter_ids(
+            cursor: sqlite3.Cursor,
+            office_id: Optional[int]) -> Dict[Tuple[Optional[int], int], int]:
+        '''
+        Get ID numbers of all cached administrative matters of an office.
+        (internal function)
+
+        Unlike the matters table's unique constraint, the resulting mapping
+        treats matters without ordinal numbers as equal if their group IDs
+        are equal.
+
+        :param cursor: Cursor used for the query
+        :param office_id: ID number of the office
+        :returns: Dictionary mapping (ordinal, group ID) pairs to matters'
+            ID numbers
+        '''
+        cursor.execute(
+            '''
+            SELECT id, ordinal, group_id
+            FROM matters
+            WHERE office_id = ?
+            ''', (office_id,))
+        return {(ordinal, group_id): matter_id for matter_id, ordinal, group_id in cursor}
+
     def _check_if_sample_exists(self, time: str, matter_id: int) -> bool:
         '''
         Check if a time sample represented by a given primary key exists.
@@ -332,13 +1533,13 @@ class CachedAPI(WSStoreAPI):
         if not isinstance(time, str):
             raise TypeError('Time has to be of type str')
         # Check database for matching matter entry
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.reader() as cursor:
             result = cursor.execute(
                 '''
                 SELECT COUNT(*)
                 FROM samples
                 WHERE time = ? AND matter_id = ?
-                ''', (time, matter_id)
+                ''', (to_epoch(time), matter_id)
             ).fetchone()
         # Return found matter ID (or None on failure)
         if result[0] == 0:
@@ -361,24 +1562,47 @@ class CachedAPI(WSStoreAPI):
         # Check arguments' validity
         if office_key is None:
             raise AssertionError('Office key not provided')
-        # Query database for difference in time since last connection
-        # (in seconds)
-        office_id = self._get_office_id(office_key)
-        with SQLite3Cursor(self._filename) as cursor:
-            cursor.execute('''
-                SELECT (STRFTIME('%s', 'now', 'localtime')
-                - STRFTIME('%s', time))
-                FROM last_connection
-                WHERE office_id = ?
-                ''', (office_id,))
-            # Return result of query
-            return cursor.fetchone()[0]
+        self._restore_poll_times([office_key])
+        passed_time = self._scheduler.seconds_since_poll(office_key)
+        return None if passed_time is None else int(passed_time)
+
+    @retry('_database_retry_policy')
+    def _restore_poll_times(self, office_keys: Iterable[str]) -> None:
+        '''
+        Schedule updates of offices unknown to self.scheduler according
+        to the times of the last API calls saved in the database.
+        (internal function)
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param office_keys: Key identifiers of offices
+        '''
+        unknown_keys = [
+            office_key for office_key in office_keys
+            if not self._scheduler.is_known(office_key)]
+        if not unknown_keys:
+            return
+        with self._connections.reader() as cursor:
+            poll_times = dict(cursor.execute(
+                '''
+                SELECT key, time
+                FROM offices
+                JOIN last_connection
+                ON last_connection.office_id = offices.id
+                '''))
+        for office_key in unknown_keys:
+            self._scheduler.restore(office_key, poll_times.get(office_key))
 
     def _update_last_connection_time(self, office_key: Optional[str] = None) -> None:
         '''
         Set time of last API connection to current time.
         (internal function)
 
+        The time is saved in the database along with the next stored outcome
+        of an update (see self._save_poll_times).
+
         :param office_key: Key identifier of an office which data were
             requested (defaults to self.office_key)
         '''
@@ -387,22 +1611,63 @@ class CachedAPI(WSStoreAPI):
         # Check arguments' validity
         if office_key is None:
             raise AssertionError('Office key not provided')
-        # Update appropriate table row
-        office_id = self._get_office_id(office_key)
-        with SQLite3Cursor(self._filename) as cursor:
-            cursor.execute(
+        self._scheduler.record_poll(office_key)
+
+    def _save_poll_times(self) -> Dict[str, float]:
+        '''
+        Save the times of API calls noted by self.scheduler in the database.
+        (internal function)
+
+        It's meant to be a part of a write transaction; once it's committed,
+        the returned times should be passed to self.scheduler.mark_saved.
+
+        :returns: Saved times by office keys
+        '''
+        poll_times = self._scheduler.unsaved()
+        if poll_times:
+            with self._connections.writer() as cursor:
+                cursor.executemany(
+                    '''
+                    UPDATE last_connection
+                    SET time = ?
+                    WHERE office_id = ?
+                    ''', [
+                        (int(poll_time), self._get_office_id(office_key))
+                        for office_key, poll_time in poll_times.items()])
+        return poll_times
+
+    @retry('_database_retry_policy')
+    def _read_office_list(self) -> OfficeList:
+        '''
+        Read office identifiers list from cache.
+        (internal function)
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :returns: Office identifiers list (empty if it isn't cached)
+        '''
+        with self._connections.reader() as cursor:
+            result = cursor.execute(
                 '''
-                UPDATE last_connection
-                SET time = DATETIME('now', 'localtime')
-                WHERE office_id = ?
-                ''', (office_id,))
+                SELECT name, key
+                FROM offices
+                ORDER BY name
+                ''')
+            return [{'name': name, 'key': key} for name, key in result]
 
+    @retry('_database_retry_policy')
     def _store_office_list(self, office_list: OfficeList) -> None:
         '''
         Place given list of office identifiers in cache.
         (internal function)
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
         '''
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.writer() as cursor:
             cursor.executemany(
                 '''
                 INSERT INTO offices (name, key)
@@ -433,7 +1698,7 @@ class CachedAPI(WSStoreAPI):
         :returns: ID number representing the matter in database after its
             addition
         '''
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.writer() as cursor:
             cursor.execute(
                 '''
                 INSERT INTO matters (name, ordinal, group_id, office_id)
@@ -444,6 +1709,10 @@ class CachedAPI(WSStoreAPI):
             )
             # ID of matter = ID of last modified row
             inserted_id = cursor.lastrowid
+            # Samples kept in memory are updated by self._store_update only
+            self._hot_tier.clear()
+            self._identity_map.remember(
+                ('matter', matter['ordinal'], matter['group_id'], office_id), inserted_id)
             return inserted_id
 
     def _store_matter_list(self, office_key: Optional[str], matter_list: MatterList) -> None:
@@ -462,7 +1731,9 @@ class CachedAPI(WSStoreAPI):
             raise AssertionError('Office key not provided')
         # Insert content of matters' list into database
         office_id = self._get_office_id(office_key)
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.writer() as cursor:
+            # Samples kept in memory are updated by self._store_update only
+            self._hot_tier.clear()
             cursor.executemany('''
                 INSERT INTO matters (name, ordinal, group_id, office_id)
                 VALUES (?, ?, ?, ?)
@@ -482,16 +1753,21 @@ class CachedAPI(WSStoreAPI):
             matter given time sample belongs to
         :param sample: Time sample to be stored
         '''
-        with SQLite3Cursor(self._filename) as cursor:
+        sample_time = to_epoch(sample['time'])
+        with self._connections.writer() as cursor:
             cursor.execute(
                 '''
                 INSERT INTO samples (time, open_counters, queue_length,
                 current_number, matter_id)
                 VALUES (?, ?, ?, ?, ?)
                 ''', (
-                    sample['time'], sample['open_counters'],
+                    sample_time, sample['open_counters'],
                     sample['queue_length'], sample['current_number'],
                     matter_id))
+            self._store_rollups(cursor, [(
+                sample_time, matter_id, sample['queue_length'], sample['open_counters'])])
+            # Samples kept in memory are updated by self._store_update only
+            self._hot_tier.clear()
 
     def _store_sample_list(
             self, office_key: Optional[str], matter_ordinal: Optional[int],
@@ -509,59 +1785,474 @@ class CachedAPI(WSStoreAPI):
         :param matter_list: List of time samples to store
         '''
         matter_id = self._get_matter_id(matter_ordinal, matter_group_id, office_key)
-        with SQLite3Cursor(self._filename) as cursor:
+        rows = [(
+            to_epoch(sample['time']), sample['open_counters'],
+            sample['queue_length'], sample['current_number'],
+            matter_id) for sample in sample_list]
+        with self._connections.writer() as cursor:
             cursor.executemany(
                 '''
                 INSERT INTO samples (time, open_counters, queue_length,
                 current_number, matter_id)
                 VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+            self._store_rollups(cursor, [
+                (sample_time, matter_id, queue_length, open_counters)
+                for sample_time, open_counters, queue_length, _, _ in rows])
+            # Samples kept in memory are updated by self._store_update only
+            self._hot_tier.clear()
+
+    def _store_rollups(
+            self, cursor: sqlite3.Cursor, samples: List[Tuple[int, int, int, int]]) -> None:
+        '''
+        Add newly stored samples to the rollups of every resolution.
+        (internal function)
+
+        :param cursor: Cursor of the writer connection
+        :param samples: (time, matter ID, queue length, open counters)
+            tuples of samples which haven't been added before
+        '''
+        for resolution in self._retention_policy.rollups:
+            cursor.executemany(
+                '''
+                INSERT INTO rollups
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (resolution, time, matter_id) DO UPDATE SET
+                    sample_count = sample_count + 1,
+                    queue_length_min = MIN(queue_length_min, excluded.queue_length_min),
+                    queue_length_max = MAX(queue_length_max, excluded.queue_length_max),
+                    queue_length_sum = queue_length_sum + excluded.queue_length_sum,
+                    open_counters_min = MIN(open_counters_min, excluded.open_counters_min),
+                    open_counters_max = MAX(open_counters_max, excluded.open_counters_max),
+                    open_counters_sum = open_counters_sum + excluded.open_counters_sum
                 ''', [(
-                    sample['time'], sample['open_counters'],
-                    sample['queue_length'], sample['current_number'],
-                    matter_id) for sample in sample_list])
+                    resolution, sample_time // resolution * resolution, matter_id,
+                    queue_length, queue_length, queue_length,
+                    open_counters, open_counters, open_counters
+                ) for sample_time, matter_id, queue_length, open_counters in samples])
+
+    def _check_hot_tier(self, cursor: sqlite3.Cursor) -> None:
+        '''
+        Forget hot samples if another process has changed the database since
+        the last check (the samples it stored wouldn't be in memory).
+        (internal function)
+
+        The check is made whenever the process stores office data, so samples
+        stored by other processes are noticed within the cooldown.
+
+        :param cursor: Cursor of the writer connection
+        '''
+        version = cursor.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._data_version:
+            self._hot_tier.clear()
+            self._data_version = version
+
+    def _load_hot_office(self, office_id: int) -> None:
+        '''
+        Read all the samples of an office and keep them in memory (unless
+        the process stores samples of the office in the meantime).
+        (internal function)
+
+        :param office_id: Office's ID number
+        '''
+        version = self._hot_tier.version(office_id)
+        with self._connections.reader() as cursor:
+            # Both queries have to see the same snapshot, otherwise samples
+            # of matters stored in between would have no buffers
+            if not cursor.connection.in_transaction:
+                cursor.execute('BEGIN')
+            matters = {
+                matter_id: (ordinal, group_id)
+                for matter_id, ordinal, group_id in cursor.execute(
+                    '''
+                    SELECT id, ordinal, group_id
+                    FROM matters
+                    WHERE office_id = ?
+                    ''', (office_id,))}
+            result = cursor.execute(
+                '''
+                SELECT matter_id, time, queue_length, open_counters, current_number
+                FROM matters
+                JOIN samples
+                ON samples.matter_id = matters.id
+                WHERE office_id = ?
+                ORDER BY matters.id, time
+                ''', (office_id,))
+            self._hot_tier.load(office_id, matters, (
+                (matter_id, (
+                    int(sample_time), int(queue_length), int(open_counters),
+                    current_number))
+                for matter_id, sample_time, queue_length, open_counters, current_number
+                in result), version)
+
+    def _get_hot_samples(self, get: Callable[[], Any], office_id: Optional[int]) -> Any:
+        '''
+        Get samples kept in memory, making the office hot if it isn't.
+        (internal function)
+
+        :param get: Function getting the samples from self._hot_tier
+        :param office_id: ID number of the samples' office
+        :returns: Result of the function (None if the samples have to be
+            read from the database)
+        '''
+        samples = get()
+        if (samples is None and office_id is not None and self._hot_tier.office_limit > 0
+                and not self._hot_tier.is_hot(office_id)):
+            self._load_hot_office(office_id)
+            samples = get()
+        return samples
+
+    @staticmethod
+    def _to_sample_result(
+            samples: List[SampleRow], columnar: bool) -> Union[SampleList, SampleColumns]:
+        '''
+        Convert stored samples to the form returned by public methods.
+        (internal function)
+
+        :param samples: Samples ordered by time
+        :param columnar: If True, the samples are converted to SampleColumns,
+            otherwise to a list of dictionaries
+        :returns: Converted samples
+        '''
+        if columnar:
+            columns = SampleColumns()
+            for sample in samples:
+                columns.append(*sample)
+            return columns
+        return [{
+            'queue_length': queue_length,
+            'open_counters': open_counters,
+            'current_number': current_number,
+            'time': time.strftime(TIME_FORMAT, time.localtime(sample_time))
+        } for sample_time, queue_length, open_counters, current_number in samples]
+
+    def _is_update_due(self, office_key: Optional[str] = None) -> bool:
+        '''
+        Check if enough time has passed since the last API call concerning
+        given office.
+        (internal function)
+
+        Only the first check of an office queries the database.
+
+        :param office_key: Key identifier of an office (defaults
+            to self.office_key)
+        :returns: True if the office's data should be fetched, False otherwise
+        '''
+        if office_key is None:
+            office_key = self._office_key
+        # Check arguments' validity
+        if office_key is None:
+            raise AssertionError('Office key not provided')
+        self._restore_poll_times([office_key])
+        return self._scheduler.is_due(office_key)
+
+    def _count(self, counter: str, value: int = 1) -> None:
+        '''
+        Increase one of the counters available through self.stats.
+        (internal function)
+
+        :param counter: Counter's name
+        :param value: Value to add to the counter
+        '''
+        with self._lock:
+            self._stats[counter] = self._stats.get(counter, 0) + value
+
+    @retry('_database_retry_policy')
+    def _claim_polls(self, office_keys: List[str]) -> List[str]:
+        '''
+        Claim the next polls of offices, so that processes sharing
+        the database don't poll them at the same time.
+        (internal function)
+
+        A poll is claimed atomically if no other process has called API
+        within the office's interval and no other process holds
+        an unexpired lease of it. The claim notes the time of the API call
+        and leases the poll until the outcome is stored (see
+        self._store_update) or the lease time passes. Offices claimed
+        by other processes are rescheduled according to their times of API
+        calls; if their samples may be stale in the hot tier, it's cleared.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param office_keys: Key identifiers of offices due for update
+        :returns: Key identifiers of the claimed offices
+        '''
+        claimed_keys = []
+        now = int(time.time())
+        with self._connections.writer() as cursor:
+            self._check_hot_tier(cursor)
+            for office_key in office_keys:
+                office_id = self._get_office_id(office_key)
+                if office_id is None:
+                    # Unknown office's poll has nothing to be claimed against
+                    claimed_keys.append(office_key)
+                    continue
+                cursor.execute(
+                    '''
+                    INSERT OR IGNORE INTO last_connection (office_id)
+                    VALUES (?)
+                    ''', (office_id,))
+                cursor.execute(
+                    '''
+                    UPDATE last_connection
+                    SET time = :now, lease_owner = :owner, lease_until = :now + :lease_time
+                    WHERE office_id = :office_id AND (
+                        (lease_owner = :owner AND lease_until > :now)
+                        OR ((time IS NULL OR time <= :now - :cooldown)
+                            AND (lease_until IS NULL OR lease_until <= :now)))
+                    ''', {
+                        'now': now, 'owner': self._lease_owner,
+                        'lease_time': self._lease_time,
+                        'cooldown': self._scheduler.interval_of(office_key),
+                        'office_id': office_id})
+                if cursor.rowcount:
+                    claimed_keys.append(office_key)
+                    continue
+                # The office is due once the other process's API call is
+                # older than the office's interval and its lease has expired
+                poll_time, lease_until = cursor.execute(
+                    '''
+                    SELECT time, lease_until
+                    FROM last_connection
+                    WHERE office_id = ?
+                    ''', (office_id,)).fetchone()
+                if lease_until is not None:
+                    poll_time = max(
+                        poll_time or 0, lease_until - self._scheduler.interval_of(office_key))
+                self._scheduler.restore(office_key, poll_time)
+        self._count('yielded_updates', len(office_keys) - len(claimed_keys))
+        return claimed_keys
+
+    def _release_lease(self, cursor: sqlite3.Cursor, office_key: str) -> None:
+        '''
+        Release the lease of an office's poll held by this process
+        (see self._claim_polls).
+        (internal function)
+
+        :param cursor: Cursor of the writer connection
+        :param office_key: Key identifier of the office
+        '''
+        cursor.execute(
+            '''
+            UPDATE last_connection
+            SET lease_owner = NULL, lease_until = NULL
+            WHERE office_id = ? AND lease_owner = ?
+            ''', (self._get_office_id(office_key), self._lease_owner))
+
+    def _abandon_poll(self, office_key: str, exception: Exception) -> None:
+        '''
+        Retry a failed update of an office later: with backoff, or once
+        the circuit breaker lets a probe through if the office is suspended
+        (see PollScheduler.record_failure). The poll's lease is released.
+        (internal function)
+
+        :param office_key: Key identifier of the office
+        :param exception: Exception which caused the failure
+        '''
+        retry_after = None
+        if isinstance(exception, APICircuitOpenError):
+            retry_after = self._circuit_breaker.seconds_until_probe(office_key)
+        self._scheduler.record_failure(office_key, retry_after)
+        try:
+            with self._connections.writer() as cursor:
+                self._release_lease(cursor, office_key)
+        except DatabaseError:
+            # The lease expires anyway
+            pass
+
+    def _update_if_due(self, office_key: str) -> None:
+        '''
+        Get office data from API and store them in cache if enough time
+        has passed since the last API call and no other process has claimed
+        the poll.
+        (internal function)
+
+        :param office_key: Key identifier of an office
+        '''
+        if self._is_update_due(office_key) and self._claim_polls([office_key]):
+            try:
+                self._store_update(office_key, *self._fetch_update(office_key))
+            except Exception as exc:
+                self._abandon_poll(office_key, exc)
+                raise
+
+    def _fetch_update(
+            self, office_key: str) -> Tuple[Optional[Tuple[str, str]], Optional[MatterBatch]]:
+        '''
+        Get office data from API unless they haven't changed since the last
+        stored response.
+        (internal function)
+
+        Only the timestamp of the response is examined before deciding if
+        the rest of it is worth decoding.
+
+        :param office_key: Key identifier of the office
+        :returns: Response's timestamp and office data (or None in place
+            of the data if they are unchanged)
+        '''
+        response = self._get_raw_json_data(office_key)
+        self._count('fetched_updates')
+        fingerprint = read_response_timestamp(response)
+        with self._lock:
+            unchanged = (
+                fingerprint is not None and self._fingerprints.get(office_key) == fingerprint)
+        if unchanged:
+            self._count('skipped_updates')
+            return fingerprint, None
+        batch = self._decode_matter_batch(office_key, response)
+        if batch.quarantined:
+            self._count('quarantined_groups', len(batch.quarantined))
+        return fingerprint, batch
+
+    @retry('_database_retry_policy')
+    def _store_update(
+            self, office_key: str, fingerprint: Optional[Tuple[str, str]],
+            batch: Optional[MatterBatch]) -> None:
+        '''
+        Place data fetched from API in cache and note the time of the API call.
+        (internal function)
+
+        Missing matters are added and the new samples inserted in bulk
+        and added to rollups; along with the removal of outdated samples
+        and the release of the poll's lease, it forms a single transaction.
+        Committed samples are added to the hot tier if the office is hot.
+        If the data are unchanged, the transaction only saves the time
+        of the API call and releases the lease.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param office_key: Key identifier of an office the data belong to
+        :param fingerprint: Timestamp of the API response
+        :param batch: Decoded office data (or None if only the time of the API
+            call should be noted)
+        '''
+        self._update_last_connection_time(office_key)
+        if batch is None:
+            # Only the time of the API call is saved and the lease released
+            with self._connections.writer() as cursor:
+                poll_times = self._save_poll_times()
+                self._release_lease(cursor, office_key)
+            self._scheduler.mark_saved(poll_times)
+            if fingerprint is not None:
+                with self._lock:
+                    self._fingerprints[office_key] = fingerprint
+            self._scheduler.record_activity(office_key, None)
+            return
+        # The whole refresh of the office forms a single transaction
+        with self._connections.writer() as cursor:
+            self._check_hot_tier(cursor)
+            poll_times = self._save_poll_times()
+            office_id = self._get_office_id(office_key)
+            self._release_lease(cursor, office_key)
+            # Query the database only if some matter ID isn't remembered
+            matter_ids = {
+                (record.ordinal, record.group_id): self._identity_map.lookup(
+                    ('matter', record.ordinal, record.group_id, office_id))
+                for record in batch.records}
+            if None in matter_ids.values():
+                matter_ids = self._get_matter_ids(cursor, office_id)
+                # Add matters not present in cache yet
+                missing_matters = {
+                    (record.ordinal, record.group_id): record for record in batch.records
+                    if (record.ordinal, record.group_id) not in matter_ids}
+                if missing_matters:
+                    cursor.executemany(
+                        '''
+                        INSERT INTO matters (name, ordinal, group_id, office_id)
+                        VALUES (?, ?, ?, ?)
+                        ''', [
+                            (record.name, record.ordinal, record.group_id, office_id)
+                            for record in missing_matters.values()])
+                    matter_ids = self._get_matter_ids(cursor, office_id)
+                for (ordinal, group_id), matter_id in matter_ids.items():
+                    self._identity_map.remember(
+                        ('matter', ordinal, group_id, office_id), matter_id)
+            # Samples past the raw retention period would be removed at once
+            # and couldn't be told apart from repeated ones afterwards
+            sample_time = to_epoch(batch.time)
+            expired = sample_time < time.time() - self._retention_policy.raw
+            # Samples already present (e.g. from a repeated response) are
+            # left untouched, so that they aren't counted twice in rollups
+            present = {matter_id for matter_id, in cursor.execute(
+                '''
+                SELECT matter_id
+                FROM samples
+                WHERE time = ?
+                ''', (sample_time,))}
+            new_samples: Dict[int, MatterRecord] = {}
+            for record in batch.records:
+                matter_id = matter_ids[(record.ordinal, record.group_id)]
+                if not expired and matter_id not in present:
+                    new_samples.setdefault(matter_id, record)
+            cursor.executemany(
+                '''
+                INSERT INTO samples (time, open_counters, queue_length,
+                current_number, matter_id)
+                VALUES (?, ?, ?, ?, ?)
+                ''', [(
+                    sample_time, record.open_counters, record.queue_length,
+                    record.current_number, matter_id
+                ) for matter_id, record in new_samples.items()])
+            self._store_rollups(cursor, [
+                (sample_time, matter_id, record.queue_length, record.open_counters)
+                for matter_id, record in new_samples.items()])
+            self._remove_old_samples()
+        self._scheduler.mark_saved(poll_times)
+        # Hot samples are updated once the samples are committed (if they're
+        # part of an outer transaction, its rollback forgets all of them)
+        self._hot_tier.add(
+            office_id, {matter_id: key for key, matter_id in matter_ids.items()}, [(
+                matter_id, (
+                    sample_time, record.queue_length, record.open_counters,
+                    record.current_number)
+            ) for matter_id, record in new_samples.items()])
+        if fingerprint is not None:
+            with self._lock:
+                self._fingerprints[office_key] = fingerprint
+        # The office's poll interval follows its activity
+        self._scheduler.record_activity(office_key, Activity(
+            sum(record.open_counters for record in batch.records),
+            sum(record.queue_length for record in batch.records)))
 
     #
     # Public methods
     #
 
-    @retry(
-        retry_on_exception=is_temporary_database_error,
-        wait_random_min=500,
-        wait_random_max=1000,
-        stop_max_attempt_number=3)
-    def get_office_list(self) -> OfficeList:
+    def get_office_list(self, cached_only: bool = False) -> OfficeList:
         '''
         Retrieve cached office identifiers list if available, otherwise
-        fetch it using API.
+        fetch it using API (unless the cache is read-only).
 
         The list can be used to get office-specific data.
 
-        Function retries 3 times on temporary database errors, waiting from
-        0.5 to 1 second between retries.
+        Reading and storing the list retry on temporary database errors
+        (3 attempts at most), waiting an exponentially growing, randomized
+        time between retries (see self.database_retry_policy).
 
+        :param cached_only: Whether an empty list should be returned instead
+            of calling API if the list isn't cached (e.g. not to block
+            the GUI)
         :returns: Office identifiers list
+        :raises: :class:`DatabaseTemporaryError`: Read-only cache whose
+            office list hasn't been collected yet (unless cached_only)
         '''
-        with SQLite3Cursor(self._filename) as cursor:
-            result = cursor.execute(
-                '''
-                SELECT name, key
-                FROM offices
-                ORDER BY name
-                ''')
-            result_list = [{'name': name, 'key': key} for name, key in result]
-        if len(result_list) != 0:
+        result_list = self._read_office_list()
+        if len(result_list) != 0 or cached_only:
             return result_list
+        elif self._read_only:
+            # The collector may store the list later on
+            raise DatabaseTemporaryError('Office list has not been collected yet')
         else:
             # If nothing's in database, query the API
             result_list = super().get_office_list()
             self._store_office_list(result_list)
             return result_list
 
-    @retry(
-        retry_on_exception=is_temporary_database_error,
-        wait_random_min=500,
-        wait_random_max=1000,
-        stop_max_attempt_number=3)
+    @retry('_database_retry_policy')
     def get_matter_list(
             self, office_key: Optional[str] = None) -> MatterList:
         '''
@@ -570,8 +2261,9 @@ class CachedAPI(WSStoreAPI):
 
         The list can be used to get matter-specific queue data.
 
-        Function retries 3 times on temporary database errors, waiting from
-        0.5 to 1 second between retries.
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
 
         :returns: Administrative matter description list
         '''
@@ -582,7 +2274,7 @@ class CachedAPI(WSStoreAPI):
             raise AssertionError('Office key not provided')
         # Query the database for matters
         office_id = self._get_office_id(office_key)
-        with SQLite3Cursor(self._filename) as cursor:
+        with self._connections.reader() as cursor:
             result = cursor.execute(
                 '''
                 SELECT name, ordinal, group_id
@@ -597,83 +2289,413 @@ class CachedAPI(WSStoreAPI):
             } for name, ordinal, group_id in result]
         return result_list
 
-    @retry(
-        retry_on_exception=is_temporary_database_error,
-        wait_random_min=500,
-        wait_random_max=1000,
-        stop_max_attempt_number=3)
+    @retry('_database_retry_policy')
     def get_sample_list(
             self, matter_ordinal: Optional[int], matter_group_id: int,
-            office_key: Optional[str] = None) -> SampleList:
+            office_key: Optional[str] = None, since: Optional[str] = None,
+            columnar: bool = False) -> Union[SampleList, SampleColumns]:
         '''
         Retrieve all cached time samples associated with given administrative
-        matter.
+        matter (or only the ones newer than the latest already seen).
 
-        Function retries 3 times on temporary database errors, waiting from
-        0.5 to 1 second between retries.
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
 
         :param matter_ordinal: Requested matter's ordinal number
         :param matter_group_id: Requested matter's group ID
         :param office_key: Key identifier of an office the matter belongs to
             (defaults to self.office_key)
-        :returns: List of time samples of queue connected with requested
-            administrative matter
+        :param since: If given, only samples newer than that time (format:
+            YYYY-MM-DD HH:MM) are retrieved
+        :param columnar: If True, samples are returned as SampleColumns
+        :returns: List (or columns) of time samples of queue connected with
+            requested administrative matter (ordered by time)
         '''
         matter_id = self._get_matter_id(matter_ordinal, matter_group_id, office_key)
-        with SQLite3Cursor(self._filename) as cursor:
+        office_id = self._get_office_id(office_key)
+        # Sample times are positive, so -1 doesn't exclude any
+        since_time = to_epoch(since) if since is not None else -1
+        samples = self._get_hot_samples(
+            lambda: self._hot_tier.get(office_id, matter_id, since_time), office_id)
+        if samples is None:
+            with self._connections.reader() as cursor:
+                result = cursor.execute(
+                    '''
+                    SELECT time, queue_length, open_counters, current_number
+                    FROM samples
+                    WHERE matter_id = ? AND time > ?
+                    ORDER BY time
+                    ''', (matter_id, since_time))
+                samples = [(
+                    int(sample_time), int(queue_length), int(open_counters), current_number
+                ) for sample_time, queue_length, open_counters, current_number in result]
+        return self._to_sample_result(samples, columnar)
+
+    @retry('_database_retry_policy')
+    def get_office_samples(
+            self, office_key: Optional[str] = None, since: Optional[str] = None,
+            columnar: bool = False) -> OfficeSamples:
+        '''
+        Retrieve cached time samples of all administrative matters of given
+        office using a single query.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param office_key: Requested office's key identifier (defaults
+            to self.office_key)
+        :param since: If given, only samples newer than that time (format:
+            YYYY-MM-DD HH:MM) are retrieved
+        :param columnar: If True, samples are returned as SampleColumns
+        :returns: Lists (or columns) of time samples ordered by time
+            by (ordinal number, group ID) pairs of every matter of the office
+        '''
+        office_id = self._get_office_id(office_key)
+        # Sample times are positive, so -1 doesn't exclude any
+        since_time = to_epoch(since) if since is not None else -1
+        office_samples = self._get_hot_samples(
+            lambda: self._hot_tier.get_office(office_id, since_time), office_id)
+        if office_samples is None:
+            office_samples = []
+            with self._connections.reader() as cursor:
+                result = cursor.execute(
+                    '''
+                    SELECT ordinal, group_id, time, queue_length, open_counters,
+                    current_number
+                    FROM matters
+                    LEFT JOIN samples
+                    ON samples.matter_id = matters.id AND samples.time > ?
+                    WHERE office_id = ?
+                    ORDER BY matters.id, time
+                    ''', (since_time, office_id))
+                for (
+                        ordinal, group_id, sample_time, queue_length, open_counters,
+                        current_number) in result:
+                    if not office_samples or office_samples[-1][0] != (ordinal, group_id):
+                        office_samples.append(((ordinal, group_id), []))
+                    # Matters without samples are present with empty lists
+                    if sample_time is not None:
+                        office_samples[-1][1].append((
+                            int(sample_time), int(queue_length), int(open_counters),
+                            current_number))
+        return {
+            matter_key: self._to_sample_result(samples, columnar)
+            for matter_key, samples in office_samples}
+
+    @retry('_database_retry_policy')
+    def get_latest_sample(
+            self, matter_ordinal: Optional[int], matter_group_id: int,
+            office_key: Optional[str] = None) -> Optional[SampleData]:
+        '''
+        Retrieve the most recent cached time sample associated with given
+        administrative matter.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param matter_ordinal: Requested matter's ordinal number
+        :param matter_group_id: Requested matter's group ID
+        :param office_key: Key identifier of an office the matter belongs to
+            (defaults to self.office_key)
+        :returns: The latest time sample (or None if there are no samples)
+        '''
+        matter_id = self._get_matter_id(matter_ordinal, matter_group_id, office_key)
+        with self._connections.reader() as cursor:
             result = cursor.execute(
                 '''
-                SELECT queue_length, open_counters, current_number, time
+                SELECT queue_length, open_counters, current_number,
+                STRFTIME('%Y-%m-%d %H:%M', time, 'unixepoch', 'localtime')
                 FROM samples
                 WHERE matter_id = ?
+                ORDER BY time DESC
+                LIMIT 1
+                ''', (matter_id, )).fetchone()
+        if result is None:
+            return None
+        queue_length, open_counters, current_number, sample_time = result
+        return {
+            'queue_length': int(queue_length),
+            'open_counters': int(open_counters),
+            'current_number': current_number,
+            'time': str(sample_time)
+        }
+
+    @retry('_database_retry_policy')
+    def get_rollup_list(
+            self, matter_ordinal: Optional[int], matter_group_id: int,
+            resolution: int, office_key: Optional[str] = None) -> RollupList:
+        '''
+        Retrieve cached rollups of given resolution associated with given
+        administrative matter.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :param matter_ordinal: Requested matter's ordinal number
+        :param matter_group_id: Requested matter's group ID
+        :param resolution: Length of rollups' intervals in seconds (one
+            of self.retention_policy.rollups)
+        :param office_key: Key identifier of an office the matter belongs to
+            (defaults to self.office_key)
+        :returns: List of rollups ordered by time (the beginning of their
+            interval), containing the count of samples and the minimum,
+            maximum and mean of queue length and of open counters
+        '''
+        matter_id = self._get_matter_id(matter_ordinal, matter_group_id, office_key)
+        with self._connections.reader() as cursor:
+            result = cursor.execute(
+                '''
+                SELECT STRFTIME('%Y-%m-%d %H:%M', time, 'unixepoch', 'localtime'),
+                sample_count, queue_length_min, queue_length_max, queue_length_sum,
+                open_counters_min, open_counters_max, open_counters_sum
+                FROM rollups
+                WHERE matter_id = ? AND resolution = ?
                 ORDER BY time
-                ''', (matter_id, ))
+                ''', (matter_id, resolution))
             result_list = [{
-                'queue_length': int(queue_length),
-                'open_counters': int(open_counters),
-                'current_number': str(current_number),
-                'time': str(time)
-            } for queue_length, open_counters, current_number, time in result]
+                'time': str(rollup_time),
+                'sample_count': int(count),
+                'queue_length_min': int(queue_min),
+                'queue_length_max': int(queue_max),
+                'queue_length_mean': queue_sum / count,
+                'open_counters_min': int(counters_min),
+                'open_counters_max': int(counters_max),
+                'open_counters_mean': counters_sum / count
+            } for (
+                rollup_time, count, queue_min, queue_max, queue_sum,
+                counters_min, counters_max, counters_sum) in result]
         return result_list
 
-    @retry(
-        retry_on_exception=is_temporary_database_error,
-        wait_random_min=500,
-        wait_random_max=1000,
-        stop_max_attempt_number=3)
     def update(self, office_key: Optional[str] = None) -> None:
         '''
         Get data from API and store them in cache.
 
-        Function retries 3 times on temporary database errors, waiting from
-        0.5 to 1 second between retries.
+        If the timestamp of the API response hasn't changed since the last
+        stored one, only the time of the API call is noted. If an update
+        of the office is already in progress (in another thread), its outcome
+        is waited for instead. Read-only cache isn't updated.
+
+        Database operations retry on temporary errors on their own (see
+        self.database_retry_policy); the update isn't repeated as a whole,
+        so errors which persist reach the caller.
         '''
+        if self._read_only:
+            return
         if office_key is None:
             office_key = self._office_key
-        # Check time passed since last API call
-        passed_time = self._get_seconds_since_last_connection(office_key)
-        if passed_time is None or passed_time > self._cooldown:
-            # If passed more than self._cooldown seconds or there is no
-            # information about previous call, proceed with the update
-            matters_with_samples = self.get_matters_with_samples(office_key)
-            self._update_last_connection_time(office_key)
-            office_id = self._get_office_id(office_key)
-            for matter in matters_with_samples:
-                matter_id = self._get_matter_id(matter['ordinal'], matter['group_id'], office_key)
-                if matter_id is None:
-                    matter_id = self._store_matter(office_id, matter)
-                if not self._check_if_sample_exists(matter['time'], matter_id):
-                    self._store_sample(matter_id, matter)
-            self._remove_old_samples()
+        # The time passed since the last API call is checked by the leader
+        # of the flight, after the previous flight has stored its data
+        self._single_flight.do(office_key, lambda: self._update_if_due(office_key))
+
+    def update_many(
+            self, office_keys: Iterable[str],
+            max_workers: int = 8) -> Dict[str, Optional[Exception]]:
+        '''
+        Get data of multiple offices from API concurrently and store them
+        in cache.
+
+        Up to max_workers API requests are sent in parallel, so a sweep
+        through the whole office list takes about as long as the slowest
+        office. Fetched data are stored sequentially by the calling thread
+        as soon as they arrive.
+
+        Offices which have been updated more recently than the cooldown
+        allows or claimed by other processes (see self._claim_polls) are
+        skipped (and reported as successful). Offices suspended
+        by the circuit breaker are skipped as well (and reported with
+        APICircuitOpenError); they're due once a probe is let through.
+        Failed offices are retried with backoff (see
+        PollScheduler.record_failure). Offices being updated by other
+        threads aren't fetched again: the outcome of their updates
+        is reported. Read-only cache isn't updated (all the offices are
+        reported as successful).
+
+        :param office_keys: Key identifiers of offices to update
+        :param max_workers: Maximal count of simultaneous API requests
+        :returns: Dictionary mapping every office key to None on success
+            or to the exception which caused the failure
+        '''
+        if max_workers < 1:
+            raise ValueError('Worker count must be positive')
+        office_keys = list(dict.fromkeys(office_keys))
+        # Offices which aren't due are reported as successful
+        results: Dict[str, Optional[Exception]] = dict.fromkeys(office_keys)
+        due_keys = []
+        joined_flights: Dict[str, Flight] = {}
+        try:
+            for office_key in self.due_office_keys(office_keys):
+                if self._circuit_breaker.is_open(office_key):
+                    results[office_key] = APICircuitOpenError(
+                        'Office temporarily not polled because of repeated failures')
+                    self._scheduler.record_failure(
+                        office_key, self._circuit_breaker.seconds_until_probe(office_key))
+                    continue
+                flight, leading = self._single_flight.join(office_key)
+                if not leading:
+                    joined_flights[office_key] = flight
+                elif self._scheduler.is_due(office_key):
+                    due_keys.append(office_key)
+                else:
+                    # Updated by a flight landed in the meantime
+                    self._single_flight.land(office_key)
+            if due_keys:
+                claimed_keys = self._claim_polls(due_keys)
+                # Offices claimed by other processes are reported as successful
+                for office_key in [key for key in due_keys if key not in claimed_keys]:
+                    self._single_flight.land(office_key)
+                    due_keys.remove(office_key)
+            if due_keys:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(due_keys))) as executor:
+                    futures = {
+                        executor.submit(self._fetch_update, office_key): office_key
+                        for office_key in due_keys}
+                    for future in as_completed(futures):
+                        office_key = futures[future]
+                        try:
+                            self._store_update(office_key, *future.result())
+                            results[office_key] = None
+                        except Exception as exc:
+                            results[office_key] = exc
+                            self._abandon_poll(office_key, exc)
+                        self._single_flight.land(office_key, exception=results[office_key])
+                        due_keys.remove(office_key)
+        except BaseException as exc:
+            # Flights led by the sweep are landed even if it's interrupted
+            for office_key in due_keys:
+                self._single_flight.land(office_key, exception=exc)
+            raise
+        for office_key, flight in joined_flights.items():
+            try:
+                flight.wait()
+            except Exception as exc:
+                results[office_key] = exc
+        # Report results in the order of provided keys
+        return {office_key: results[office_key] for office_key in office_keys}
+
+    @retry('_database_retry_policy')
+    def remove_old_samples(self) -> None:
+        '''
+        Remove samples and rollups older than their retention periods
+        (see self.retention_policy). It's done on every stored update as well.
+
+        Function retries on temporary database errors (3 attempts at most),
+        waiting an exponentially growing, randomized time between retries
+        (see self.database_retry_policy).
+
+        :raises: :class:`DatabasePersistentError`: Read-only cache
+        '''
+        if self._read_only:
+            raise DatabasePersistentError('Cache is read-only')
+        self._remove_old_samples()
+
+    def due_office_keys(self, office_keys: Iterable[str]) -> List[str]:
+        '''
+        Choose offices whose data should be fetched (see self.scheduler).
+
+        :param office_keys: Key identifiers of offices
+        :returns: Key identifiers of the offices which are due, the most
+            overdue first (none if the cache is read-only)
+        '''
+        if self._read_only:
+            return []
+        office_keys = list(office_keys)
+        self._restore_poll_times(office_keys)
+        return self._scheduler.due_keys(office_keys)
+
+    def close(self) -> None:
+        '''
+        Save the times of API calls not saved yet and close connections
+        to the cache database (they are reopened if the object is used
+        afterwards). Closing a private in-memory cache discards its content.
+        '''
+        self._scheduler.mark_saved(self._save_poll_times())
+        self._connections.close()
 
     #
     # Properties
     #
 
+    @property
+    def stats(self) -> Dict[str, int]:
+        '''
+        Snapshot of counters describing cache's operation:
+        - fetched_updates: count of responses fetched from JSON API,
+        - skipped_updates: count of fetched responses left unprocessed
+          because of unchanged timestamp,
+        - quarantined_groups: count of received groups not conforming
+          to the data format (see self.quarantine),
+        - identity_map_hits, identity_map_misses: counts of office and matter
+          ID lookups answered from memory and requiring a query,
+        - hot_tier_hits, hot_tier_misses: counts of sample reads answered
+          from memory and requiring a query (unless the office is made hot
+          as a result),
+        - deduplicated_updates: count of office updates which waited for
+          a concurrent update of the same office instead of calling API,
+        - yielded_updates: count of due office updates left to other
+          processes which claimed them.
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+        stats['identity_map_hits'] = self._identity_map.hits
+        stats['identity_map_misses'] = self._identity_map.misses
+        stats['hot_tier_hits'] = self._hot_tier.hits
+        stats['hot_tier_misses'] = self._hot_tier.misses
+        stats['deduplicated_updates'] = self._single_flight.deduplicated
+        return stats
+
+    @property
+    def database_retry_policy(self) -> RetryPolicy:
+        '''
+        Retry policy of database operations.
+        '''
+        return self._database_retry_policy
+
+    @property
+    def retention_policy(self) -> RetentionPolicy:
+        '''
+        Retention of samples and their rollups.
+        '''
+        return self._retention_policy
+
+    @property
+    def read_only(self) -> bool:
+        '''
+        Whether the cache is only viewed, while another process fetches
+        the data.
+        '''
+        return self._read_only
+
+    @property
+    def scheduler(self) -> PollScheduler:
+        '''
+        Due times of offices' updates.
+        '''
+        return self._scheduler
+
+    @property
+    def office_key(self) -> str:
+        '''
+        Default office identifier used when per-method optional office key
+        is not provided. It's the displayed office for self.scheduler.
+
+        :raises: :class:`TypeError`: Trying to assign non-string value
+        '''
+        return self._office_key
+
+    @office_key.setter
+    def office_key(self, value: str) -> None:
+        WSStoreAPI.office_key.fset(self, value)
+        self._scheduler.displayed = value
+
     @property
     def cooldown(self) -> int:
         '''
-        Minimal interval between API calls in seconds.
+        Base interval between API calls of an office in seconds: busy offices
+        are polled more often, idle ones less often (see self.scheduler).
 
         :raises: :class:`TypeError`: Trying to assign non-integer value
         '''
@@ -683,6 +2705,7 @@ class CachedAPI(WSStoreAPI):
     def cooldown(self, value: int) -> None:
         if isinstance(value, int):
             self._cooldown = value
+            self._scheduler.interval = value
             if value < 30:
                 print('Warning: too short API polling interval')
         else:
@@ -1,36 +1,41 @@
 '''
 File containing GUI- and UI-related functionalities.
 
+Chart-related classes reside in chart.py, which is imported once the main
+window has been shown.
+
 Classes:
 HiDpiApplication
 ComboBox
-DetailedPointF
-QueueSystemSeries
-QueueSystemChart
 QueueSystemTable
 IniSettings
 StatusConfigBar
 CacheThread
     CacheRemainingThread
+OfficeListThread
 GUISetupThread
 GUIUpdateThread
 QueueSystemWindow
 '''
 from functools import partial
 from random import shuffle, randint
-from typing import Union, Optional, Dict, List, Any
+from time import localtime, strftime
+from typing import Union, Optional, Dict, List, Any, TYPE_CHECKING
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QComboBox, QTableWidget, QVBoxLayout, QWidget, QAbstractItemView,
     QHeaderView, QTableWidgetItem, QStatusBar, QLabel, QCheckBox, QScrollArea, QSizePolicy)
 from PyQt5.QtCore import (
-    Qt, QTimer, QDateTime, QPointF, QItemSelection, QThread, pyqtSignal, QSize, QSettings)
+    Qt, QTimer, QDateTime, QItemSelection, QThread, pyqtSignal, QSize, QSettings)
 from PyQt5.QtGui import (
-    QPainter, QColor, QFont, QIcon, QMovie, QResizeEvent, QMoveEvent, QGuiApplication)
-from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis, QDateTimeAxis
+    QPainter, QColor, QFont, QIcon, QMovie, QResizeEvent, QMoveEvent, QPaintEvent,
+    QGuiApplication)
 
 from api import APIError
-from database import MatterData, SampleList, CachedAPI, DatabaseError
+from database import MatterData, SampleColumns, CachedAPI, DatabaseError, TIME_FORMAT
+
+if TYPE_CHECKING:
+    from chart import QueueSystemChart
 NoneType = type(None)
 
 def log_exception(exception: Exception) -> None:
@@ -119,236 +124,6 @@ class ComboBox(QComboBox):
                 self.setItemData(index, data[index])
 
 
-class DetailedPointF(QPointF):
-    '''
-    Subclass of QPointF with an additional property: user data.
-
-    Qt method naming convention is preserved.
-
-    :param `*args`: Positional arguments passed to QPointF constructor
-    :param `**kwargs`: Named arguments passed to QPointF constructor
-    :ivar _user_data: Arbitrary user data.
-        Getter: userData.
-        Setter: setUserData.
-    '''
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self._user_data: Any = None
-
-    def userData(self) -> Any:
-        '''
-        Get user data associated with the point.
-
-        :returns: Arbitrary user data assigned to the point
-        '''
-        return self._user_data
-
-    def setUserData(self, data: Any) -> None:
-        '''
-        Associate user data with the point.
-
-        :param data: Arbitrary user data to be assigned to the point
-        '''
-        self._user_data = data
-
-
-class QueueSystemSeries(QLineSeries):
-    '''
-    Subclass of QLineSeries for encapsulating time samples data associated
-    with queue systems of Warsaw.
-
-    Qt method naming convention is preserved.
-
-    :param parent: Parent widget (optional) passed to QLineSeries constructor
-    :ivar _user_data: Arbitrary user data.
-        Getter: userData.
-        Setter: setUserData.
-    '''
-    def __init__(self, parent: Optional[QWidget] = None) -> None:
-        super().__init__(parent)
-        self._user_data: Any = None
-
-    def setSamples(self, sample_list: SampleList) -> None:
-        '''
-        Replace current point data with given time samples.
-
-        :param sample_list: Queue time samples to replace series data with
-        '''
-        points = []
-        max_time = QDateTime.fromMSecsSinceEpoch(0)
-        max_value = 10
-        # Parse sample data
-        for sample in sample_list:
-            time = QDateTime.fromString(sample['time'], 'yyyy-MM-dd hh:mm')
-            point = DetailedPointF(
-                time.toMSecsSinceEpoch(),
-                sample['queue_length']
-            )
-            if isinstance(self._user_data, dict):
-                name = self._user_data.get('name')
-            else:
-                name = None
-            point.setUserData({
-                'name': name,
-                'open_counters': sample['open_counters'],
-                'queue_length': sample['queue_length'],
-                'current_number': sample['current_number']})
-            points.append(point)
-            # Look for the newest sample time...
-            if time > max_time:
-                max_time = time
-            # ...and the greates sample value
-            if sample['queue_length'] > max_value:
-                max_value = sample['queue_length']
-        self.replace(points)
-        chart = self.chart()
-        if chart is not None:
-            if chart.topSeriesIndex() == chart.series().index(self):
-                chart.series()[-1].replace(points)
-        # Move chart's horizontal axis according to the newest sample
-        self.attachedAxes()[0].setRange(max_time.addSecs(-3600), max_time)
-        self.attachedAxes()[0].hide()
-        self.attachedAxes()[0].show()
-        # Scale chart's vertical axis according to the greatest sample
-        self.attachedAxes()[1].setMax(max_value)
-        self.attachedAxes()[1].hide()
-        self.attachedAxes()[1].show()
-
-    def userData(self) -> Any:
-        '''
-        Get user data associated with the series.
-
-        :returns: Arbitrary user data assigned to the series
-        '''
-        return self._user_data
-
-    def setUserData(self, data: Any) -> None:
-        '''
-        Associate user data with the series.
-
-        :param data: Arbitrary user data to be assigned to the series
-        '''
-        self._user_data = data
-
-
-class QueueSystemChart(QChart):
-    '''
-    Subclass of QChart for displaying and managing time samples data
-    associated with queue systems of Warsaw.
-
-    Qt method naming convention is preserved.
-
-    :param `*args`: Positional arguments passed to QChart constructor
-    :param `**kwargs`: Named arguments passed to QChart constructor
-    :ivar _top_series: Index of series portrayed as topmost series in graph
-        (covering other series).
-        Getter: topSeriesIndex.
-        Setter: setTopSeriesIndex.
-    '''
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        # Setup horizontal axis
-        x_axis = QDateTimeAxis()
-        x_axis.setFormat('hh:mm')
-        x_axis.setTickCount(7)
-        x_axis.setTitleText('Godzina [hh:mm]')
-        self.addAxis(x_axis, Qt.AlignBottom)
-        # Setup vertical axis
-        y_axis = QValueAxis()
-        y_axis.setTitleText('Liczba osób w kolejce')
-        self.addAxis(y_axis, Qt.AlignLeft)
-        self.resetAxes()
-
-        self.legend().setVisible(False)
-        self._top_series: Optional[int] = None
-
-    def resetAxes(self) -> None:
-        '''
-        Reset chart's axes to default ranges
-        '''
-        x_axis, y_axis = self.axes()
-        current_time = QDateTime.currentDateTime()
-        x_axis.setRange(current_time.addSecs(-3600), current_time)
-        x_axis.hide()
-        x_axis.show()
-        y_axis.setMax(10)
-        y_axis.hide()
-        y_axis.show()
-
-    def setSeriesCount(self, count: int) -> None:
-        '''
-        Clear the chart and add specified count of series to it.
-
-        Actually, the chart will have one more series than specified:
-        the topmost one simulating bringing chosen series to top.
-
-        :param count: Count of series to set.
-        '''
-        self.removeAllSeries()
-        for _ in range(count + 1):
-            series = QueueSystemSeries()
-            pen = series.pen()
-            pen.setWidth(4)
-            series.setPen(pen)
-            self.addSeries(series)
-            for axis in self.axes():
-                series.attachAxis(axis)
-        self.resetAxes()
-
-    def setSeriesSamples(self, series_index: int, sample_list: SampleList) -> None:
-        '''
-        Set sample data of specified series.
-
-        :param series_index: Index of series which data is to be set
-        :param sample_list: List of time samples
-        '''
-        if 0 <= series_index < len(self.series()):
-            self.series()[series_index].setSamples(sample_list)
-
-    def setSeriesData(self, series_index: int, user_data: Any, color: QColor) -> None:
-        '''
-        Set user and color data of specified series.
-
-        :param series_index: Index of series which data is to be set
-        :param user_data: User data
-        :param color: Color of series
-        '''
-        if 0 <= series_index < len(self.series()):
-            self.series()[series_index].setUserData(user_data)
-            self.series()[series_index].setColor(color)
-
-    def topSeriesIndex(self) -> Optional[int]:
-        '''
-        Get index of topmost series (if any is set).
-
-        :returns: Index of series portrayed as topmost (may be None)
-        '''
-        return self._top_series
-
-    def setTopSeriesIndex(self, index: Optional[int]) -> None:
-        '''
-        Set index of topmost series.
-
-        :param index: Index of series to be portrayed as topmost or None
-            (for resetting state of actual topmost series)
-        '''
-        series = self.series()
-        if index is None:
-            # If index is None, reset the actual topmost series data
-            self._top_series = index
-            series[-1].replace([])
-        elif 0 <= index < len(self.series()):
-            # If index exists, style the actual topmost series to resemble
-            # the one portrayed as topmost
-            self._top_series = index
-            series[-1].replace(series[index].pointsVector())
-            pen = series[index].pen()
-            pen.setWidth(8)
-            series[-1].setPen(pen)
-        else:
-            raise ValueError('Series index out of range')
-
-
 class QueueSystemTable(QTableWidget):
     '''
     Subclass of QTableWidget for displaying (only) current time samples data
@@ -415,20 +190,18 @@ class QueueSystemTable(QTableWidget):
         self.item(row, 0).setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
         self.item(row, 1).setTextAlignment(int(Qt.AlignLeft | Qt.AlignVCenter))
 
-    def updateRow(self, row: int, sample_list: SampleList) -> None:
+    def updateRow(self, row: int, samples: SampleColumns) -> None:
         '''
         Update row's data.
 
         :param row: Row's index
-        :param sample_list: List of time samples for administrative matter
-            associated with the row
+        :param samples: Time samples for administrative matter associated
+            with the row, ordered by time (e.g. only the new ones; the row
+            is left unchanged if there are none)
         '''
-        if len(sample_list) > 0:
+        if len(samples) > 0:
             # Table shows only the newest sample
-            latest_sample = max(
-                sample_list,
-                key=lambda sample: QDateTime.fromString(sample['time'], 'yyyy-MM-dd hh:mm')
-            )
+            latest_sample = samples[-1]
             self.item(row, 2).setText(str(latest_sample['open_counters']))
             self.item(row, 3).setText(str(latest_sample['queue_length']))
             self.item(row, 4).setText(latest_sample['current_number'])
@@ -693,15 +466,56 @@ class CacheRemainingThread(CacheThread):
         current_key = api.office_key
         combo_box = self._window.combo_box
         if not settings.value('check_box/update_only_current', value_type=bool):
-            for index in range(combo_box.count()):
-                key = combo_box.itemData(index)
-                if key not in (current_key, 'placeholder'):
-                    # Catch all exceptions in order to iterate through the whole
-                    # list of offices
-                    try:
-                        api.update(key)
-                    except Exception as exc:
-                        self.failed.emit(exc)
+            keys = [
+                key for key in combo_box.itemsData()
+                if key not in (current_key, 'placeholder')]
+            # Offices are updated concurrently; failures are reported one
+            # by one without interrupting the sweep
+            try:
+                # Most of the time no office is due (checked in memory)
+                keys = api.due_office_keys(keys)
+                if not keys:
+                    return
+                results = api.update_many(keys)
+            except Exception as exc:
+                self.failed.emit(exc)
+                return
+            for exc in results.values():
+                if exc is not None:
+                    self.failed.emit(exc)
+
+
+class OfficeListThread(QThread):
+    '''
+    Subclass of QThread used for asynchronously getting the office list
+    (from API if it isn't cached).
+
+    Qt method and signal naming convention is preserved.
+
+    :cvar gotOfficeList: signal emitted after getting the office list
+    :cvar succeeded: pyqtSignal emitted on successful thread execution
+    :cvar failed: pyqtSignal emitted on any exception
+    :ivar _window: QueueSystemWindow provided in constructor
+    '''
+    gotOfficeList: pyqtSignal = pyqtSignal(list)
+    succeeded: pyqtSignal = pyqtSignal()
+    failed: pyqtSignal = pyqtSignal(Exception)
+
+    def __init__(self, window: 'QueueSystemWindow') -> None:
+        super().__init__()
+        self._window: 'QueueSystemWindow' = window
+
+    def run(self) -> None:
+        '''
+        Run the thread.
+        (internal function)
+        '''
+        api = self._window.api
+        try:
+            self.gotOfficeList.emit(api.get_office_list())
+            self.succeeded.emit()
+        except Exception as exc:
+            self.failed.emit(exc)
 
 
 class GUISetupThread(QThread):
@@ -760,19 +574,30 @@ class GUIUpdateThread(QThread):
     :param api: CachedAPI used for fetching data
     :param chart: QueueSystemChart with series containing identifiers
         of administrative matters (set as user data)
-    :cvar got_sample_list: signal emitted after fetching sample list
+    :cvar got_sample_list: signal emitted after fetching samples newer than
+        the ones fetched before
     :cvar succeeded: pyqtSignal emitted on successful thread execution
     :cvar failed: pyqtSignal emitted on any exception
     :ivar _api: CachedAPI provided in constructor
     :ivar _chart: Chart provided in constructor
+    :ivar _watermark: Time of the newest sample fetched so far (None if
+        nothing has been fetched since the last reset)
     '''
-    gotSampleList: pyqtSignal = pyqtSignal(int, list)
+    gotSampleList: pyqtSignal = pyqtSignal(int, SampleColumns)
     succeeded: pyqtSignal = pyqtSignal()
     failed: pyqtSignal = pyqtSignal(Exception)
 
     def __init__(self, window: 'QueueSystemWindow') -> None:
         super().__init__()
         self._window: 'QueueSystemWindow' = window
+        self._watermark: Optional[str] = None
+
+    def resetWatermark(self) -> None:
+        '''
+        Make the next run fetch all the samples (e.g. after changing
+        the office).
+        '''
+        self._watermark = None
 
     def run(self) -> None:
         '''
@@ -782,13 +607,22 @@ class GUIUpdateThread(QThread):
         api = self._window.api
         chart = self._window.chart
         try:
+            # Samples of all the matters are read at once, only the ones
+            # which haven't been displayed yet
+            office_samples = api.get_office_samples(since=self._watermark, columnar=True)
             matter_key_list = map(
                 lambda series: series.userData(), chart.series())
             for index, matter_key in enumerate(matter_key_list):
                 if matter_key is not None:
-                    sample_list = api.get_sample_list(
-                        matter_key['ordinal'], matter_key['group_id'])
-                    self.gotSampleList.emit(index, sample_list)
+                    samples = office_samples.get(
+                        (matter_key['ordinal'], matter_key['group_id']), SampleColumns())
+                    self.gotSampleList.emit(index, samples)
+            # Sample times of an office are updated all at once, so the newest
+            # one marks the samples already seen
+            newest_times = [
+                samples.times[-1] for samples in office_samples.values() if len(samples) > 0]
+            if newest_times:
+                self._watermark = strftime(TIME_FORMAT, localtime(max(newest_times)))
             self.succeeded.emit()
         except Exception as exc:
             self.failed.emit(exc)
@@ -799,14 +633,29 @@ class QueueSystemWindow(QMainWindow):
     Subclass of QMainWindow, center of the whole application, setting up
     widgets and connecting signals to callbacks.
 
+    The window is shown without waiting for anything slow: the chart
+    (along with PyQtChart) is set up after the first paint of the window,
+    followed by the office list (read from cache or, if it's empty, fetched
+    asynchronously). Chosen office's data are displayed from cache before
+    being refreshed using API.
+
     Qt method naming convention is preserved.
 
     :param api: CachedAPI object used for fetching queue system data
+    :param settings_filename: Path to the file containing settings (defaults
+        to settings.ini)
     :param `*args`: Positional arguments passed to QMainWindow constructor
     :param `**kwargs`: Named arguments passed to QMainWindow constructor
+    :cvar firstPainted: signal emitted after the first paint of the window
+    :cvar officeListLoaded: signal emitted after filling the combo box with
+        the office list
     :ivar _api: CachedAPI provided in constructor
     :ivar _combo: Window's combo box object
-    :ivar _chart: Window's chart of queue data samples object
+    :ivar _chart: Window's chart of queue data samples object (None until
+        the window has been painted)
+    :ivar _painted: Whether the window has been painted
+    :ivar _refresh_on_empty: Whether the chosen office's data should be
+        fetched and the widgets set up again if no matters are cached
     :ivar _settings: Window's configuration file object
     :ivar _status: Window's status bar containing application state
         description and basic settings
@@ -815,6 +664,9 @@ class QueueSystemWindow(QMainWindow):
         and GUI data
     :ivar _timer: Window's API call timer
     '''
+    firstPainted: pyqtSignal = pyqtSignal()
+    officeListLoaded: pyqtSignal = pyqtSignal()
+
     def __init__(
             self, api: CachedAPI, settings_filename: Optional[str] = None,
             *args: Any, **kwargs: Any) -> None:
@@ -825,60 +677,52 @@ class QueueSystemWindow(QMainWindow):
         self.setWindowTitle('Systemy kolejkowe')
         # Configure settings file and load saved application's settings:
         # window's size and position
-        self._settings: IniSettings = IniSettings()
+        if settings_filename is None:
+            self._settings: IniSettings = IniSettings()
+        else:
+            self._settings: IniSettings = IniSettings(settings_filename)
         self.resize(self._settings.value('window/size', QSize(750, 580), set_if_missing=True))
         self.move(self._settings.value('window/position', self.pos(), set_if_missing=True))
-        # Create ComboBox object
+        # Create ComboBox object, disabled until the office list is loaded
         self._combo: ComboBox = ComboBox()
-        # Create and setup chart and its view
-        self._chart: QueueSystemChart = QueueSystemChart()
-        chart_view = QChartView()
-        chart_view.setChart(self._chart)
-        chart_view.setRenderHint(QPainter.Antialiasing)
+        self._combo.addItem('Wczytywanie listy urzędów...', 'placeholder')
+        self._combo.setEnabled(False)
+        # The chart is created after the first paint of the window
+        self._chart: Optional['QueueSystemChart'] = None
+        self._painted: bool = False
+        self._refresh_on_empty: bool = False
         # Create the table
         self._table: QueueSystemTable = QueueSystemTable()
         # Create the status bar for the window
         self._status: StatusConfigBar = StatusConfigBar()
         self._status.setSettings(self._settings)
         self.setStatusBar(self._status)
-        # Create window's layout and place elements in it
+        # Create window's layout and place elements in it (the chart's view
+        # is inserted between the combo box and the table)
         vbox_layout = QVBoxLayout()
         vbox_layout.addWidget(self._combo)
-        vbox_layout.addWidget(chart_view)
         vbox_layout.addWidget(self._table)
         # Create central window's widget and apply layout to it
         main_widget = QWidget()
         main_widget.setLayout(vbox_layout)
         self.setCentralWidget(main_widget)
-        # Create the timer
+        # Create the timer, ticking as often as the busiest offices are
+        # polled (offices which aren't due are skipped at no cost)
         self._timer: QTimer = QTimer()
-        self._timer.setInterval(api.cooldown * 1000)
+        self._timer.setInterval(
+            int(min(api.cooldown, api.scheduler.policy.min_interval) * 1000))
         # Create and setup required threads
         self._setup_threads()
         # Connect (cyclical) timer's timeout signal to a method starting cache
         # update
         self._timer.timeout.connect(self._threads['caching'].start)
 
-        # Get list of available offices and display it in combo box
-        office_list = sorted(api.get_office_list(), key=lambda x: x['name'])
-        self._combo.setItems(
-            [x['name'] for x in office_list], [x['key'] for x in office_list])
-        # Insert placeholder value
-        self._combo.insertItem(0, 'Wybierz urząd...', 'placeholder')
-        self._combo.setCurrentIndex(0)
-        # Connect combo box's index changing signal to appropriate callback
-        # (responsible for resetting table names and reconnecting series with
-        # them)
-        self._combo.currentIndexChanged.connect(self._setup_widgets_content)
-        if self._settings.value('check_box/restore_last_closed', value_type=bool):
-            index = self._settings.value('combo_box/index', -1, value_type=int, set_if_missing=True)
-            self._combo.setCurrentIndex(index + 1)
-
     def _setup_threads(self) -> None:
         # Create the dictionary of threads
         self._threads: Dict[str, QThread] = {
             'caching': CacheThread(self),
             'caching_other': CacheRemainingThread(self),
+            'listing': OfficeListThread(self),
             'displaying': GUIUpdateThread(self),
             'setting': GUISetupThread(self)
         }
@@ -886,6 +730,7 @@ class QueueSystemWindow(QMainWindow):
         # busyness of the application
         self._threads['caching'].started.connect(lambda: self.setCursor(Qt.BusyCursor))
         self._threads['caching'].started.connect(self._status.showBusy)
+        self._threads['listing'].started.connect(self._status.showBusy)
         # Connect all threads' failed signals to exception logging function
         # and all threads' finished signals to the function "debusying" mouse
         # cursor...
@@ -901,6 +746,14 @@ class QueueSystemWindow(QMainWindow):
         # Make background caching of non-current offices run after the caching
         # of currently displayed one
         self._threads['caching'].finished.connect(self._threads['caching_other'].start)
+        # Connect office list thread's got_office_list signal to the method
+        # filling the combo box and retry getting the list after the cooldown
+        # in case of failure
+        self._threads['listing'].gotOfficeList.connect(self._set_office_list)
+        self._threads['listing'].succeeded.connect(self._status.showSuccess)
+        self._threads['listing'].failed.connect(
+            lambda exc: QTimer.singleShot(
+                self._api.cooldown * 1000, self._threads['listing'].start))
         # Connect GUI threads' succeeded signals to the status bar's success
         # showing method
         self._threads['displaying'].succeeded.connect(self._status.showSuccess)
@@ -908,22 +761,72 @@ class QueueSystemWindow(QMainWindow):
         # Connect caching thread's succeeded signal to a method starting GUI
         # update
         self._threads['caching'].succeeded.connect(self._threads['displaying'].start)
-        # Connect GUI updating thread's got_sample_list signal to methods
-        # updating table values and chart series' values
+        # Connect GUI updating thread's got_sample_list signal to the method
+        # updating table values (the chart is connected once it's created)
         self._threads['displaying'].gotSampleList.connect(self._table.updateRow)
-        self._threads['displaying'].gotSampleList.connect(self._chart.setSeriesSamples)
-        # Connect GUI setting thread's got_matter_count signal to methods
-        # changing number of table rows ang chart series
+        # Connect GUI setting thread's got_matter_count signal to the method
+        # changing number of table rows
         self._threads['setting'].gotMatterCount.connect(self._table.setRowCount)
-        self._threads['setting'].gotMatterCount.connect(self._chart.setSeriesCount)
-        # Connect GUI setting thread's got_matter signal to methods changing
-        # table rows' descriptions and chart series' data
+        # Connect GUI setting thread's got_matter signal to the method changing
+        # table rows' descriptions
         self._threads['setting'].gotMatter.connect(self._table.setRow)
-        self._threads['setting'].gotMatter.connect(self._chart.setSeriesData)
         # Connect GUI setting thread's finished signal to a callback
         # responsible for preparing just-set widgets for updates
         self._threads['setting'].finished.connect(self._prepare_widgets_for_updates)
 
+    def _finish_setup(self) -> None:
+        '''
+        Set up the chart and the office list once the window is shown.
+        (callback function)
+        '''
+        # PyQtChart is imported only now, not to delay showing the window
+        from chart import QChartView, QueueSystemChart
+        self._chart = QueueSystemChart()
+        chart_view = QChartView()
+        chart_view.setChart(self._chart)
+        chart_view.setRenderHint(QPainter.Antialiasing)
+        self.centralWidget().layout().insertWidget(1, chart_view)
+        # Connect GUI threads' signals to methods changing number of chart
+        # series, their data and values
+        self._threads['setting'].gotMatterCount.connect(self._chart.setSeriesCount)
+        self._threads['setting'].gotMatter.connect(self._chart.setSeriesData)
+        self._threads['displaying'].gotSampleList.connect(self._chart.appendSeriesSamples)
+        # Get list of available offices from cache, fetching it
+        # asynchronously if it's not cached yet
+        try:
+            office_list = self._api.get_office_list(cached_only=True)
+        except Exception as exc:
+            log_exception(exc)
+            office_list = []
+        if office_list:
+            self._set_office_list(office_list)
+        else:
+            self._threads['listing'].start()
+
+    def _set_office_list(self, office_list: List[Dict[str, str]]) -> None:
+        '''
+        Display the list of available offices in combo box and restore
+        the last chosen office (if enabled).
+        (callback function)
+
+        :param office_list: Office identifiers list
+        '''
+        office_list = sorted(office_list, key=lambda x: x['name'])
+        self._combo.setItems(
+            [x['name'] for x in office_list], [x['key'] for x in office_list])
+        # Insert placeholder value
+        self._combo.insertItem(0, 'Wybierz urząd...', 'placeholder')
+        self._combo.setCurrentIndex(0)
+        self._combo.setEnabled(True)
+        # Connect combo box's index changing signal to appropriate callback
+        # (responsible for resetting table names and reconnecting series with
+        # them)
+        self._combo.currentIndexChanged.connect(self._setup_widgets_content)
+        if self._settings.value('check_box/restore_last_closed', value_type=bool):
+            index = self._settings.value('combo_box/index', -1, value_type=int, set_if_missing=True)
+            self._combo.setCurrentIndex(index + 1)
+        self.officeListLoaded.emit()
+
     def _setup_widgets_content(self, item_index: int) -> None:
         '''
         Setup widgets settings and content according to office chosen from
@@ -944,19 +847,25 @@ class QueueSystemWindow(QMainWindow):
             # Reconnect the signal
             self._combo.currentIndexChanged.connect(self._setup_widgets_content)
         # Prevent caching thread from triggering the GUI updating thread
+        # and the GUI updating thread from triggering the first refresh
+        # of previously chosen office
         try:
             self._threads['caching'].succeeded.disconnect()
         except TypeError:
             # If nothing is connected to the signal, an exception will be
             # raised
             pass
-        # Make GUI setup thread run after caching data
-        self._threads['caching'].finished.connect(self._threads['setting'].start)
+        try:
+            self._threads['displaying'].finished.disconnect(self._start_first_refresh)
+        except TypeError:
+            pass
         # Change the office_key parameter of API object to the identifier
         # of newly chosen office
         self._api.office_key = self._combo.itemData(item_index)
-        # Refresh database data and setup the widgets after it
-        self._threads['caching'].start()
+        # Setup the widgets using cached data (if there are none, they're
+        # fetched and the widgets set up again)
+        self._refresh_on_empty = True
+        self._threads['setting'].start()
         if self._settings.value('check_box/restore_last_closed', value_type=bool):
             self._settings.setValue('combo_box/index', item_index)
 
@@ -968,13 +877,47 @@ class QueueSystemWindow(QMainWindow):
             # If nothing is connected to the signal, an exception will be
             # raised
             pass
+        if self._table.rowCount() == 0 and self._refresh_on_empty:
+            # Nothing cached: fetch the office data and set the widgets up
+            # again afterwards
+            self._refresh_on_empty = False
+            self._threads['caching'].finished.connect(self._threads['setting'].start)
+            self._threads['caching'].start()
+            return
+        # Samples of the just-set series have to be fetched from scratch
+        self._threads['displaying'].resetWatermark()
         # Reconnect succeeded signal to the GUI update thread
         self._threads['caching'].succeeded.connect(self._threads['displaying'].start)
-        # Cache and display queue system data
-        self._threads['caching'].start()
+        # Display cached data and refresh them using API afterwards
+        self._threads['displaying'].finished.connect(self._start_first_refresh)
+        self._threads['displaying'].start()
         # Start timer again in order to update the widgets cyclically
         self._timer.start()
 
+    def _start_first_refresh(self) -> None:
+        '''
+        Refresh chosen office's data using API once the cached ones are
+        displayed.
+        (callback function)
+        '''
+        self._threads['displaying'].finished.disconnect(self._start_first_refresh)
+        self._threads['caching'].start()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        '''
+        Slot called on paint event. After the first one, the rest
+        of the window is set up.
+        (internal function)
+
+        :param event: Event containing paint data
+        '''
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            self.firstPainted.emit()
+            # Let the painting finish before the setup
+            QTimer.singleShot(0, self._finish_setup)
+
     def resizeEvent(self, event: QResizeEvent) -> None:
         '''
         Slot called on resize event.
@@ -1024,9 +967,9 @@ class QueueSystemWindow(QMainWindow):
         return self._combo
 
     @property
-    def chart(self) -> QueueSystemChart:
+    def chart(self) -> Optional['QueueSystemChart']:
         '''
-        Window's chart
+        Window's chart (None until the window has been painted)
         '''
         return self._chart
 
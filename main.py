@@ -1,27 +1,61 @@
 '''
 Main file executing the application.
+
+Setting WSSTORE_RECORD environment variable to a directory path makes
+the application record API responses there. Setting WSSTORE_REPLAY
+to such a directory makes it replay them offline instead (using a separate
+cache file). Setting WSSTORE_READ_ONLY (to any non-empty value) makes
+the application only view the cache, while the collector (see collector.py)
+fetches the data.
 '''
-from database import CachedAPI
+import os
+import sys
+from api import API_URLS, HTTPConnectionPool
+from database import CachedAPI, DatabasePersistentError
+from transport import RecordingTransport, ReplayTransport
 from gui import HiDpiApplication, QueueSystemWindow
 
 # URLs used for connecting to the API
-# html: HTML-based reply
-# json: JSON reply
-api_urls = {
-    'html': 'https://api.um.warszawa.pl/daneszcz.php?data=16c404ef084cfaffca59ef14b07dc516',
-    'json': 'https://api.um.warszawa.pl/api/action/wsstore_get/'
-}
-
-# Create cached API object
-api = CachedAPI(api_urls['html'], api_urls['json'], 'cache.db')
-# and set minimum time between API requests (in seconds)
-api.cooldown = 60
-
-# Initialize GUI
-application = HiDpiApplication([])
-window = QueueSystemWindow(api)
+api_urls = API_URLS
 
-if __name__ == '__main__':
-    # Run the application
+
+def create_api() -> CachedAPI:
+    '''
+    Create cached API object according to the environment variables.
+
+    :returns: Cached API object
+    '''
+    # Choose the means of fetching API responses
+    cache_filename = 'cache.db'
+    transport = HTTPConnectionPool()
+    if os.environ.get('WSSTORE_REPLAY'):
+        transport = ReplayTransport.load(os.environ['WSSTORE_REPLAY'])
+        cache_filename = 'replay_cache.db'
+    elif os.environ.get('WSSTORE_RECORD'):
+        transport = RecordingTransport(transport, os.environ['WSSTORE_RECORD'])
+    api = CachedAPI(
+        api_urls['html'], api_urls['json'], cache_filename, transport,
+        read_only=bool(os.environ.get('WSSTORE_READ_ONLY')))
+    # Set minimum time between API requests (in seconds)
+    api.cooldown = 60
+    return api
+
+
+def main() -> None:
+    '''
+    Run the application. The window is shown at once; the chart and
+    the office list are set up afterwards (see QueueSystemWindow).
+    '''
+    try:
+        api = create_api()
+    except DatabasePersistentError as exc:
+        # E.g. a read-only cache which the collector hasn't created yet
+        sys.exit(f'Cannot open the cache: {exc}')
+    application = HiDpiApplication([])
+    window = QueueSystemWindow(api)
     window.show()
     application.exec_()
+
+
+if __name__ == '__main__':
+    main()
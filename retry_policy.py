@@ -0,0 +1,340 @@
+'''
+File containing functionalities related to retrying failed operations.
+
+Classes:
+RetryBudget
+CircuitBreaker
+RetryPolicy
+'''
+import asyncio
+import random
+import threading
+import time
+from functools import wraps
+from typing import Optional, Dict, Callable, Awaitable, Any
+
+
+class RetryBudget:
+    '''
+    Thread-safe limit of retries shared by multiple retry policies.
+
+    The budget is replenished at the beginning of every period and whenever
+    reset explicitly (e.g. at the beginning of a sweep through all offices).
+
+    :param limit: Count of retries allowed per period
+    :param period: Length of a period in seconds
+    :ivar _limit: Count of retries allowed per period
+    :ivar _period: Length of a period in seconds
+    :ivar _remaining: Count of retries left in the current period
+    :ivar _period_start: Monotonic time of the current period's beginning
+    :ivar _lock: Lock guarding the budget's state
+    '''
+    def __init__(self, limit: int = 20, period: float = 60.0) -> None:
+        if limit < 0:
+            raise ValueError('Retry budget cannot be negative')
+        self._limit: int = limit
+        self._period: float = period
+        self._remaining: int = limit
+        self._period_start: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def reset(self) -> None:
+        '''
+        Replenish the budget and start a new period.
+        '''
+        with self._lock:
+            self._remaining = self._limit
+            self._period_start = time.monotonic()
+
+    def try_spend(self) -> bool:
+        '''
+        Take one retry from the budget if there is any left.
+
+        :returns: True if a retry is allowed, False otherwise
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if now - self._period_start >= self._period:
+                self._remaining = self._limit
+                self._period_start = now
+            if self._remaining > 0:
+                self._remaining -= 1
+                return True
+            return False
+
+    @property
+    def remaining(self) -> int:
+        '''
+        Count of retries left in the current period.
+        '''
+        with self._lock:
+            return self._remaining
+
+    @property
+    def limit(self) -> int:
+        '''
+        Count of retries allowed per period.
+
+        :raises: :class:`ValueError`: Trying to assign negative value
+        '''
+        return self._limit
+
+    @limit.setter
+    def limit(self, value: int) -> None:
+        if value < 0:
+            raise ValueError('Retry budget cannot be negative')
+        with self._lock:
+            self._limit = value
+            self._remaining = min(self._remaining, value)
+
+
+class CircuitBreaker:
+    '''
+    Thread-safe set of circuit breakers, one per key (e.g. office key).
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are refused. Once recovery_time passes, a single probing call is let
+    through: its success closes the circuit, its failure opens it again.
+
+    :param failure_threshold: Count of consecutive failures opening
+        the circuit
+    :param recovery_time: Time in seconds after which an open circuit lets
+        a probing call through
+    :ivar _failure_threshold: Failure threshold provided in constructor
+    :ivar _recovery_time: Recovery time provided in constructor
+    :ivar _failures: Counts of consecutive failures per key
+    :ivar _opened: Monotonic times of opening circuits per key
+    :ivar _probing: Keys whose probing call is in progress
+    :ivar _lock: Lock guarding the breakers' state
+    '''
+    def __init__(self, failure_threshold: int = 3, recovery_time: float = 300.0) -> None:
+        if failure_threshold < 1:
+            raise ValueError('Failure threshold must be positive')
+        self._failure_threshold: int = failure_threshold
+        self._recovery_time: float = recovery_time
+        self._failures: Dict[Any, int] = {}
+        self._opened: Dict[Any, float] = {}
+        self._probing: Dict[Any, bool] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def allow(self, key: Any) -> bool:
+        '''
+        Check if a call concerning given key may proceed. A positive answer
+        for an open circuit marks the call as the probing one.
+
+        :param key: Circuit's key
+        :returns: True if the call may proceed, False otherwise
+        '''
+        with self._lock:
+            opened = self._opened.get(key)
+            if opened is None:
+                return True
+            if self._probing.get(key) or time.monotonic() - opened < self._recovery_time:
+                return False
+            self._probing[key] = True
+            return True
+
+    def is_open(self, key: Any) -> bool:
+        '''
+        Check if calls concerning given key are currently refused (without
+        affecting the circuit's state).
+
+        :param key: Circuit's key
+        :returns: True if the circuit is open and not ready for probing
+        '''
+        with self._lock:
+            opened = self._opened.get(key)
+            if opened is None:
+                return False
+            return bool(self._probing.get(key)) or time.monotonic() - opened < self._recovery_time
+
+    def seconds_until_probe(self, key: Any) -> float:
+        '''
+        Get time left until a call concerning given key may proceed.
+
+        :param key: Circuit's key
+        :returns: Time in seconds (0 if calls are allowed, the whole recovery
+            time if a probing call is in progress)
+        '''
+        with self._lock:
+            opened = self._opened.get(key)
+            if opened is None:
+                return 0.0
+            if self._probing.get(key):
+                return self._recovery_time
+            return max(0.0, opened + self._recovery_time - time.monotonic())
+
+    def record_success(self, key: Any) -> None:
+        '''
+        Note a successful call: close the circuit.
+
+        :param key: Circuit's key
+        '''
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened.pop(key, None)
+            self._probing.pop(key, None)
+
+    def record_failure(self, key: Any) -> None:
+        '''
+        Note a failed call: open the circuit if the threshold is reached
+        or if the call was a probing one.
+
+        :param key: Circuit's key
+        '''
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            if failures >= self._failure_threshold or self._probing.get(key):
+                self._opened[key] = time.monotonic()
+            self._probing.pop(key, None)
+
+    def release(self, key: Any) -> None:
+        '''
+        Note the end of a call, whatever its outcome: a probing call ended
+        without recording success or failure (e.g. interrupted) lets another
+        probe through. To be called in a finally clause.
+
+        :param key: Circuit's key
+        '''
+        with self._lock:
+            self._probing.pop(key, None)
+
+    @property
+    def failure_threshold(self) -> int:
+        '''
+        Count of consecutive failures opening the circuit.
+        '''
+        return self._failure_threshold
+
+    @property
+    def recovery_time(self) -> float:
+        '''
+        Time in seconds after which an open circuit lets a probing call
+        through.
+        '''
+        return self._recovery_time
+
+
+class RetryPolicy:
+    '''
+    Description of retrying behavior: which exceptions are worth retrying,
+    how many times and how long to wait between attempts.
+
+    Waiting time grows exponentially with every attempt and is randomized
+    ("full jitter") to avoid synchronized retries of multiple threads.
+    If a retry budget is provided, each retry has to be paid for from it;
+    retries stop once the budget is depleted.
+
+    :param retry_on: Function checking if an exception is worth retrying
+    :param attempts: Maximal count of attempts (including the first one)
+    :param initial_wait: Upper bound of waiting time before the first retry
+        in seconds
+    :param max_wait: Upper bound of waiting time before any retry in seconds
+    :param multiplier: Growth factor of the waiting time's upper bound
+    :param budget: Retry budget shared with other policies (optional)
+    :ivar retry_on: Function checking if an exception is worth retrying
+    :ivar attempts: Maximal count of attempts (including the first one)
+    :ivar initial_wait: Upper bound of waiting time before the first retry
+    :ivar max_wait: Upper bound of waiting time before any retry
+    :ivar multiplier: Growth factor of the waiting time's upper bound
+    :ivar budget: Retry budget shared with other policies (may be None)
+    :ivar on_retry: Function called with the exception before every retry
+        (may be None)
+    '''
+    def __init__(
+            self, retry_on: Callable[[Exception], bool], attempts: int = 3,
+            initial_wait: float = 0.5, max_wait: float = 8.0, multiplier: float = 2.0,
+            budget: Optional[RetryBudget] = None) -> None:
+        if attempts < 1:
+            raise ValueError('Attempt count must be positive')
+        self.retry_on: Callable[[Exception], bool] = retry_on
+        self.attempts: int = attempts
+        self.initial_wait: float = initial_wait
+        self.max_wait: float = max_wait
+        self.multiplier: float = multiplier
+        self.budget: Optional[RetryBudget] = budget
+        self.on_retry: Optional[Callable[[Exception], None]] = None
+
+    def wait_time(self, retry_number: int) -> float:
+        '''
+        Draw waiting time before given retry.
+
+        :param retry_number: Number of the retry (starting from 0)
+        :returns: Waiting time in seconds
+        '''
+        bound = min(self.max_wait, self.initial_wait * self.multiplier ** retry_number)
+        return random.uniform(0, bound)
+
+    def _should_retry(self, exception: Exception, attempt: int) -> bool:
+        '''
+        Decide if a failed attempt should be retried.
+        (internal function)
+
+        :param exception: Exception raised by the attempt
+        :param attempt: Number of the failed attempt (starting from 0)
+        :returns: True if the call should be retried, False otherwise
+        '''
+        if attempt + 1 >= self.attempts or not self.retry_on(exception):
+            return False
+        if self.budget is not None and not self.budget.try_spend():
+            return False
+        if self.on_retry is not None:
+            self.on_retry(exception)
+        return True
+
+    def call(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        '''
+        Call a function, retrying it according to the policy.
+
+        :param function: Called function
+        :param `*args`: Positional arguments passed to the function
+        :param `**kwargs`: Named arguments passed to the function
+        :returns: Function's result
+        '''
+        attempt = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as exc:
+                if not self._should_retry(exc, attempt):
+                    raise
+            time.sleep(self.wait_time(attempt))
+            attempt += 1
+
+    async def call_async(
+            self, function: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        '''
+        Await a coroutine function, retrying it according to the policy.
+
+        :param function: Coroutine function
+        :param `*args`: Positional arguments passed to the function
+        :param `**kwargs`: Named arguments passed to the function
+        :returns: Function's result
+        '''
+        attempt = 0
+        while True:
+            try:
+                return await function(*args, **kwargs)
+            except Exception as exc:
+                if not self._should_retry(exc, attempt):
+                    raise
+            await asyncio.sleep(self.wait_time(attempt))
+            attempt += 1
+
+
+def retry(policy_name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    '''
+    Decorator retrying a method according to the retry policy stored
+    in an attribute of the method's object.
+
+    :param policy_name: Name of the attribute containing RetryPolicy
+    :returns: Method decorator
+    '''
+    def decorator(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            policy = getattr(self, policy_name)
+            return policy.call(method, self, *args, **kwargs)
+        return wrapper
+    return decorator
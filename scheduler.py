@@ -0,0 +1,569 @@
+'''
+File containing functionalities related to scheduling periodic polls
+and coalescing concurrent ones.
+
+Classes:
+Activity
+ActivityPolicy
+PollScheduler
+Flight
+SingleFlight
+'''
+import heapq
+import math
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Iterable, Hashable, Callable, Any, NamedTuple
+
+
+def _doubled(interval: float, times: int, limit: float) -> float:
+    '''
+    Double an interval given number of times, up to a limit. The exponent
+    is capped where the limit is reached, so that any count is fine.
+
+    :param interval: Interval in seconds
+    :param times: Count of doublings
+    :param limit: Maximal result in seconds (the interval itself if it's
+        longer)
+    :returns: Doubled interval in seconds
+    '''
+    if interval >= limit:
+        return interval
+    return min(interval * 2 ** min(times, math.ceil(math.log2(limit / interval))), limit)
+
+
+class Activity(NamedTuple):
+    '''
+    Summary of a polled office's state: totals over all its matters.
+    '''
+    open_counters: int
+    queue_length: int
+
+
+class ActivityPolicy:
+    '''
+    Rule choosing poll intervals of keys (offices) according to their recent
+    activity.
+
+    A poll is idle if it brings nothing new (unchanged response or state)
+    or there are no open counters. After idle_polls consecutive idle polls,
+    the interval is doubled with every further one, up to max_interval
+    (e.g. outside office hours). The displayed key's interval never exceeds
+    the base one. Keys whose last poll wasn't idle and whose queues are
+    at least busy_queue_length long are polled every min_interval.
+
+    :param min_interval: Interval of busy keys in seconds
+    :param max_interval: Maximal interval of idle keys in seconds
+    :param idle_polls: Count of consecutive idle polls before backing off
+    :param busy_queue_length: Total queue length from which a key is busy
+    :ivar min_interval: Interval of busy keys
+    :ivar max_interval: Maximal interval of idle keys
+    :ivar idle_polls: Count of idle polls before backing off
+    :ivar busy_queue_length: Queue length of busy keys
+    '''
+    def __init__(
+            self, min_interval: float = 30.0, max_interval: float = 900.0,
+            idle_polls: int = 3, busy_queue_length: int = 10) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError('Poll intervals must be positive and ordered')
+        if idle_polls < 1:
+            raise ValueError('Idle poll count must be positive')
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.idle_polls: int = idle_polls
+        self.busy_queue_length: int = busy_queue_length
+
+    def interval(
+            self, base: float, idle_polls: int, activity: Optional[Activity],
+            displayed: bool) -> float:
+        '''
+        Choose the poll interval of a key.
+
+        :param base: Base interval in seconds (e.g. the cooldown)
+        :param idle_polls: Count of the key's consecutive idle polls
+        :param activity: State noted by the last poll (None if unknown)
+        :param displayed: Whether the key is displayed
+        :returns: Interval in seconds
+        '''
+        if idle_polls >= self.idle_polls:
+            if displayed:
+                return base
+            return _doubled(base, idle_polls - self.idle_polls + 1, self.max_interval)
+        if (idle_polls == 0 and activity is not None
+                and activity.queue_length >= self.busy_queue_length):
+            return min(self.min_interval, base)
+        return base
+
+
+class PollScheduler:
+    '''
+    Thread-safe schedule of periodic polls of multiple keys (e.g. offices).
+
+    Due times are kept in memory using the monotonic clock, so checking
+    whether a key is due costs a dictionary lookup. A heap orders the due
+    times, so that due keys are found without examining the others.
+    Keys never polled nor restored are due.
+
+    Wall-clock times of polls are kept until the owner persists them
+    (see self.unsaved and self.mark_saved), which it may do lazily.
+
+    With an activity policy, every key is given its own interval, according
+    to the activity noted by its polls (see self.record_activity) and
+    to whether it's displayed.
+
+    Keys whose polls fail are retried with exponential backoff (see
+    self.record_failure) until they're polled successfully.
+
+    :param interval: Time in seconds between polls of a key (the base one
+        if a policy is provided)
+    :param policy: Rule choosing intervals of keys (all of them are polled
+        every interval if not provided)
+    :param max_backoff: Maximal time in seconds between retries of a key
+        whose polls fail
+    :ivar _interval: Interval provided in constructor (settable through
+        self.interval property)
+    :ivar _policy: Policy provided in constructor (accessible through
+        self.policy property)
+    :ivar _max_backoff: Maximal backoff provided in constructor
+    :ivar _displayed: Displayed key (settable through self.displayed
+        property)
+    :ivar _idle_polls: Counts of consecutive idle polls by keys
+    :ivar _activity: Activity noted by the last polls by keys
+    :ivar _failures: Counts of consecutive failed polls by keys
+    :ivar _polled: Monotonic times of the last polls by keys
+    :ivar _due: Monotonic due times by keys
+    :ivar _heap: (due time, key) pairs; the ones whose time differs from
+        self._due are outdated and skipped
+    :ivar _unsaved: Wall-clock times of polls not persisted yet by keys
+    :ivar _lock: Lock guarding the schedule
+    '''
+    def __init__(
+            self, interval: float = 60.0, policy: Optional[ActivityPolicy] = None,
+            max_backoff: float = 900.0) -> None:
+        if interval <= 0:
+            raise ValueError('Poll interval must be positive')
+        self._interval: float = interval
+        self._policy: Optional[ActivityPolicy] = policy
+        self._max_backoff: float = max_backoff
+        self._displayed: Optional[Hashable] = None
+        self._idle_polls: Dict[Hashable, int] = {}
+        self._activity: Dict[Hashable, Activity] = {}
+        self._failures: Dict[Hashable, int] = {}
+        self._polled: Dict[Hashable, float] = {}
+        self._due: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._unsaved: Dict[Hashable, float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    #
+    # Private methods used internally
+    #
+
+    def _schedule(self, key: Hashable, due: float) -> None:
+        '''
+        Set due time of a key.
+        (internal function)
+
+        :param key: Scheduled key
+        :param due: Monotonic due time
+        '''
+        self._due[key] = due
+        # The identifier keeps keys of equal due times from being compared
+        heapq.heappush(self._heap, (due, id(key), key))
+
+    def _interval_of(self, key: Hashable) -> float:
+        '''
+        Choose the interval of a key (the lock has to be held).
+        (internal function)
+
+        :param key: Polled key
+        :returns: Interval in seconds
+        '''
+        if self._policy is None:
+            return self._interval
+        return self._policy.interval(
+            self._interval, self._idle_polls.get(key, 0), self._activity.get(key),
+            key == self._displayed)
+
+    def _reschedule(self, key: Hashable) -> None:
+        '''
+        Set due time of a polled key according to its current interval
+        (the lock has to be held).
+        (internal function)
+
+        :param key: Polled key
+        '''
+        polled = self._polled.get(key)
+        if polled is not None:
+            self._schedule(key, polled + self._interval_of(key))
+
+    #
+    # Public methods
+    #
+
+    def is_known(self, key: Hashable) -> bool:
+        '''
+        Check if a key has been polled or restored.
+
+        :param key: Checked key
+        :returns: True if the key has a due time
+        '''
+        with self._lock:
+            return key in self._due
+
+    def is_due(self, key: Hashable) -> bool:
+        '''
+        Check if a key should be polled.
+
+        :param key: Checked key
+        :returns: True if the key's due time has come (or it has none)
+        '''
+        with self._lock:
+            due = self._due.get(key)
+        return due is None or due <= time.monotonic()
+
+    def due_keys(self, keys: Optional[Iterable[Hashable]] = None) -> List[Hashable]:
+        '''
+        Get the keys which should be polled.
+
+        :param keys: Keys of interest: the ones without due times are
+            included as well (defaults to all the known keys)
+        :returns: Due keys, the most overdue first (followed by the ones
+            without due times)
+        '''
+        now = time.monotonic()
+        due_keys = []
+        with self._lock:
+            entries = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                due, _, key = entry
+                # Skip outdated entries (and duplicates of valid ones)
+                if self._due.get(key) == due and key not in due_keys:
+                    entries.append(entry)
+                    due_keys.append(key)
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            if keys is not None:
+                wanted = list(dict.fromkeys(keys))
+                wanted_set = set(wanted)
+                due_keys = [key for key in due_keys if key in wanted_set] + [
+                    key for key in wanted if key not in self._due]
+        return due_keys
+
+    def seconds_until_due(self) -> Optional[float]:
+        '''
+        Get time left until the earliest due time.
+
+        :returns: Time in seconds (0 if some key is due, None if no key
+            is known)
+        '''
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def seconds_since_poll(self, key: Hashable) -> Optional[float]:
+        '''
+        Get time passed since the last poll of a key.
+
+        :param key: Polled key
+        :returns: Time in seconds (or None if the key hasn't been polled
+            nor restored)
+        '''
+        with self._lock:
+            polled = self._polled.get(key)
+        return None if polled is None else time.monotonic() - polled
+
+    def record_poll(self, key: Hashable) -> None:
+        '''
+        Note that a key has just been polled: it's due after the interval.
+
+        :param key: Polled key
+        '''
+        now = time.monotonic()
+        with self._lock:
+            self._failures.pop(key, None)
+            self._polled[key] = now
+            self._unsaved[key] = time.time()
+            self._schedule(key, now + self._interval_of(key))
+
+    def restore(self, key: Hashable, poll_time: Optional[float]) -> None:
+        '''
+        Schedule a key according to a persisted time of its last poll.
+
+        :param key: Polled key
+        :param poll_time: Wall-clock time of the last poll (seconds since
+            the epoch) or None if it has never been polled
+        '''
+        now = time.monotonic()
+        with self._lock:
+            if poll_time is None:
+                self._polled.pop(key, None)
+                self._schedule(key, now)
+            else:
+                # A poll time from the future (e.g. clock adjustment) counts
+                # as a poll made just now
+                polled = now - max(0.0, time.time() - poll_time)
+                self._polled[key] = polled
+                self._schedule(key, polled + self._interval_of(key))
+
+    def record_failure(self, key: Hashable, retry_after: Optional[float] = None) -> None:
+        '''
+        Note that a poll of a key has failed or has been refused: the key is
+        due after a backoff, which starts at the key's interval and doubles
+        with every consecutive failure, up to the maximal backoff.
+
+        :param key: Polled key
+        :param retry_after: Time in seconds after which the poll may succeed
+            (e.g. until a circuit breaker lets a probe through), used
+            instead of the backoff
+        '''
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            if retry_after is None:
+                retry_after = _doubled(self._interval_of(key), failures - 1, self._max_backoff)
+            self._schedule(key, now + retry_after)
+
+    def record_activity(self, key: Hashable, activity: Optional[Activity]) -> None:
+        '''
+        Note the outcome of a key's poll, adjusting the key's interval
+        (if there is a policy).
+
+        :param key: Polled key
+        :param activity: State brought by the poll (None if the poll brought
+            nothing new)
+        '''
+        with self._lock:
+            if (activity is None or activity.open_counters == 0
+                    or activity == self._activity.get(key)):
+                self._idle_polls[key] = self._idle_polls.get(key, 0) + 1
+            else:
+                self._idle_polls[key] = 0
+            if activity is not None:
+                self._activity[key] = activity
+            self._reschedule(key)
+
+    def interval_of(self, key: Hashable) -> float:
+        '''
+        Get the current interval of a key.
+
+        :param key: Polled key
+        :returns: Interval in seconds
+        '''
+        with self._lock:
+            return self._interval_of(key)
+
+    def make_due(self, key: Hashable) -> None:
+        '''
+        Make a key due immediately (e.g. to force a refresh).
+
+        :param key: Polled key
+        '''
+        with self._lock:
+            self._schedule(key, time.monotonic())
+
+    def unsaved(self) -> Dict[Hashable, float]:
+        '''
+        Get wall-clock times of polls which haven't been persisted yet.
+
+        :returns: Times (seconds since the epoch) by keys
+        '''
+        with self._lock:
+            return dict(self._unsaved)
+
+    def mark_saved(self, poll_times: Dict[Hashable, float]) -> None:
+        '''
+        Note that poll times (returned by self.unsaved) have been persisted.
+
+        :param poll_times: Persisted times by keys
+        '''
+        with self._lock:
+            for key, poll_time in poll_times.items():
+                if self._unsaved.get(key) == poll_time:
+                    del self._unsaved[key]
+
+    #
+    # Properties
+    #
+
+    @property
+    def interval(self) -> float:
+        '''
+        Time in seconds between polls of a key (the base one if there is
+        a policy). Changing it reschedules the polled keys.
+
+        :raises: :class:`ValueError`: Trying to assign non-positive value
+        '''
+        return self._interval
+
+    @interval.setter
+    def interval(self, value: float) -> None:
+        if value <= 0:
+            raise ValueError('Poll interval must be positive')
+        with self._lock:
+            self._interval = value
+            for key in self._polled:
+                self._reschedule(key)
+
+    @property
+    def policy(self) -> Optional[ActivityPolicy]:
+        '''
+        Rule choosing intervals of keys (or None if all of them are polled
+        every self.interval).
+        '''
+        return self._policy
+
+    @property
+    def displayed(self) -> Optional[Hashable]:
+        '''
+        Displayed key (or None), which is never backed off beyond the base
+        interval. Changing it reschedules the previous and the new one.
+        '''
+        return self._displayed
+
+    @displayed.setter
+    def displayed(self, value: Optional[Hashable]) -> None:
+        with self._lock:
+            previous, self._displayed = self._displayed, value
+            for key in (previous, value):
+                if key is not None:
+                    self._reschedule(key)
+
+
+class Flight:
+    '''
+    Call in progress, whose outcome is shared by all the callers which
+    joined it (see SingleFlight).
+
+    :ivar _done: Event set once the call has finished
+    :ivar _result: Value returned by the call
+    :ivar _exception: Exception raised by the call (or None)
+    '''
+    def __init__(self) -> None:
+        self._done: threading.Event = threading.Event()
+        self._result: Any = None
+        self._exception: Optional[BaseException] = None
+
+    #
+    # Public methods
+    #
+
+    def land(self, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        '''
+        Note the outcome of the call and wake the waiting callers.
+
+        :param result: Value returned by the call
+        :param exception: Exception raised by the call (or None on success)
+        '''
+        self._result = result
+        self._exception = exception
+        self._done.set()
+
+    def wait(self) -> Any:
+        '''
+        Wait until the call finishes.
+
+        :returns: Value returned by the call
+        :raises: Exception raised by the call
+        '''
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class SingleFlight:
+    '''
+    Thread-safe coalescing of concurrent calls concerning the same key
+    (e.g. updates of an office): while a call is in progress, callers
+    of the key wait for its outcome instead of making their own call.
+
+    The first caller of a key leads the flight: it makes the call and lands
+    the flight once it's done. Flights are forgotten once landed, so later
+    callers start new ones.
+
+    :ivar _flights: Flights in progress by keys
+    :ivar _deduplicated: Count of callers which joined a flight in progress
+        (accessible through self.deduplicated property)
+    :ivar _lock: Lock guarding the flights
+    '''
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, Flight] = {}
+        self._deduplicated: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    #
+    # Public methods
+    #
+
+    def join(self, key: Hashable) -> Tuple[Flight, bool]:
+        '''
+        Join the flight of a key, starting it if there is none.
+
+        The leader has to call self.land once the call is done (whatever
+        its outcome), the others may wait for the outcome using Flight.wait.
+
+        :param key: Key of the call
+        :returns: Flight and a flag telling if the caller leads it
+        '''
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._deduplicated += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def land(
+            self, key: Hashable, result: Any = None,
+            exception: Optional[BaseException] = None) -> None:
+        '''
+        Finish the flight of a key, passing the outcome of the call
+        to the waiting callers.
+
+        :param key: Key of the call
+        :param result: Value returned by the call
+        :param exception: Exception raised by the call (or None on success)
+        '''
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight.land(result, exception)
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        '''
+        Call a function unless a call of the same key is in progress,
+        in which case wait for its outcome.
+
+        :param key: Key of the call
+        :param function: Function making the call
+        :returns: Value returned by the call
+        :raises: Exception raised by the call
+        '''
+        flight, leading = self.join(key)
+        if not leading:
+            return flight.wait()
+        try:
+            result = function()
+        except BaseException as exc:
+            self.land(key, exception=exc)
+            raise
+        self.land(key, result)
+        return result
+
+    #
+    # Properties
+    #
+
+    @property
+    def deduplicated(self) -> int:
+        '''
+        Count of callers which joined a flight in progress instead
+        of making their own call.
+        '''
+        with self._lock:
+            return self._deduplicated
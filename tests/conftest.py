@@ -0,0 +1,86 @@
+'''
+Fixtures shared by the test files.
+'''
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+import pytest
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''
+    Request handler imitating both the HTML and the JSON API.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        path, _, query = self.path.partition('?')
+        parameters = parse_qs(query)
+        with server.lock:
+            server.requests.append(self.path)
+        if server.delay:
+            time.sleep(server.delay(parameters) if callable(server.delay) else server.delay)
+        if path == '/html':
+            body = server.html
+        elif path == '/json':
+            office_key = parameters.get('id', [''])[0]
+            body = server.offices.get(office_key, server.json)
+        else:
+            body = None
+        if body is None:
+            self.send_response(404)
+            body = b''
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if server.close_connections:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    '''
+    Returns a local HTTP server imitating the city API. Its HTML API is
+    available under /html and its JSON API under /json.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = []
+    server.delay = 0
+    server.close_connections = False
+    with open('tests/test_response.html', 'rb') as test_file:
+        server.html = test_file.read()
+    with open('tests/test_response.json', 'rb') as test_file:
+        server.json = test_file.read()
+    server.offices = {}
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_apikey(monkeypatch):
+    '''
+    Provides a placeholder for the (not versioned) apikey module.
+    '''
+    monkeypatch.setitem(sys.modules, 'apikey', SimpleNamespace(apikey=lambda: 'test'))
@@ -1,8 +1,15 @@
 '''
 Tests applying to api.py file.
 '''
+import asyncio
+import threading
+import time
 import pytest
-from api import OfficeListParser, append_parameters, WSStoreAPI, APIError
+from urllib.error import HTTPError
+from api import (
+    OfficeListParser, OfficeListScanner, append_parameters, HTTPConnectionPool, TokenBucket,
+    WSStoreAPI, AsyncWSStoreAPI,
+    APIError, APIConnectionError, APIResponseError, read_response_timestamp, decode_matter_batch)
 
 #
 # Testing the OfficeListParser class
@@ -64,6 +71,60 @@ def test_parser_result_reset(fed_office_list_parser):
     assert fed_office_list_parser.get_result() == []
 
 
+#
+# Testing the OfficeListScanner class
+#
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 100000])
+def test_scanner_matches_parser(fed_office_list_parser, chunk_size):
+    '''
+    Test if OfficeListScanner fed in chunks of any size gives the same result
+    as OfficeListParser.
+    '''
+    with open('tests/test_response.html', encoding='utf-8') as test_file:
+        test_html = test_file.read()
+    scanner = OfficeListScanner()
+    for start in range(0, len(test_html), chunk_size):
+        scanner.feed(test_html[start:start + chunk_size])
+    assert scanner.get_result() == fed_office_list_parser.get_result()
+
+def test_scanner_reads_whole_page():
+    '''
+    Test if OfficeListScanner finds office entries after the element
+    enclosing the first one is closed, e.g. when each entry is wrapped
+    in its own element.
+    '''
+    with open('tests/test_response.html', encoding='utf-8') as test_file:
+        entry = test_file.read()
+    keys = ['7ef70889', 'aaaaaaaa', 'bbbbbbbb']
+    html = '<body><div class="menu">Menu</div><div id="offices">' + ''.join(
+        '<div class="wrapper">' + entry.replace('7ef70889', key) + '</div>'
+        for key in keys) + '</div><div class="footer"><!-- <div> --></div>'
+    scanner = OfficeListScanner()
+    for start in range(0, len(html), 100):
+        scanner.feed(html[start:start + 100])
+    result = scanner.get_result()
+    parser = OfficeListParser()
+    parser.feed(html)
+    assert result == parser.get_result()
+    assert [office['key'][:8] for office in result] == keys
+    assert all(office['name'] == 'Urząd Dzielnicy Wola' for office in result)
+
+def test_scanner_fallback():
+    '''
+    Test if OfficeListScanner falls back to OfficeListParser when its fast
+    path finds nothing.
+    '''
+    html = (
+        '<DIV role="wsstore_api_info#https://api.um.warszawa.pl/api/action" '
+        'class=show_example id=x></DIV><p>Opis danych</p><p>Nazwa</p>')
+    scanner = OfficeListScanner()
+    scanner.feed(html)
+    parser = OfficeListParser()
+    parser.feed(html)
+    assert scanner.get_result() == parser.get_result()
+
+
 #
 # Testing the append_parameters function
 #
@@ -115,6 +176,195 @@ def test_append_function_url_and_params(url, params, expected_result):
     assert append_parameters(url, params) == expected_result
 
 
+#
+# Testing the read_response_timestamp function
+#
+
+def test_response_timestamp():
+    '''
+    Test extracting the timestamp from raw JSON API responses.
+    '''
+    with open('tests/test_response.json', 'rb') as test_file:
+        response = test_file.read()
+    assert read_response_timestamp(response) == ('2019-12-27', '15:41')
+    assert read_response_timestamp(b'{"result": "false", "error": "x"}') is None
+
+
+#
+# Testing the decode_matter_batch function
+#
+
+def test_decode_matter_batch():
+    '''
+    Test decoding a valid raw JSON API response.
+    '''
+    with open('tests/test_response.json', 'rb') as test_file:
+        batch = decode_matter_batch(test_file.read())
+    assert batch.time == '2019-12-27 15:41'
+    assert batch.quarantined == []
+    assert len(batch.records) == 3
+    assert batch.records[0] == ('G: Geodezja i kataster', 2, 652, 0, 1, 'G005')
+    assert [matter['name'] for matter in batch.to_matter_sample_list()] == [
+        'E: Dowody osobiste - odbi\u00f3r', 'G: Geodezja i kataster', 'K: Kasa']
+
+@pytest.mark.parametrize('group,reason', [
+    ('[]', 'Group is not an object'),
+    ('{"nazwaGrupy": "A"}', 'Missing lp'),
+    ('{"nazwaGrupy": "", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid nazwaGrupy'),
+    ('{"nazwaGrupy": "A", "lp": "0", "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid lp'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": "01", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid idGrupy'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": 1, "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid idGrupy'),
+    ('{"nazwaGrupy": "A", "lp": [], "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid lp'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": true,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}', 'Invalid liczbaKlwKolejce'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 100, "aktualnyNumer": ""}', 'Invalid liczbaCzynnychStan'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": "AB12"}', 'Invalid aktualnyNumer'),
+    ('{"nazwaGrupy": "A", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": 0,'
+     ' "liczbaCzynnychStan": 0, "aktualnyNumer": []}', 'Invalid aktualnyNumer'),
+])
+def test_decode_matter_batch_quarantine(group, reason):
+    '''
+    Test if malformed groups are set aside without rejecting valid ones.
+    '''
+    valid_group = (
+        '{"nazwaGrupy": "A", "lp": null, "idGrupy": "1", "liczbaKlwKolejce": 0,'
+        ' "liczbaCzynnychStan": 0, "aktualnyNumer": ""}')
+    response = (
+        '{"result": {"date": "2019-12-27", "time": "15:41", "grupy": ['
+        + valid_group + ', ' + group + ']}}').encode('utf-8')
+    batch = decode_matter_batch(response)
+    assert batch.records == [('A', None, 1, 0, 0, '')]
+    assert len(batch.quarantined) == 1
+    assert batch.quarantined[0][1] == reason
+
+@pytest.mark.parametrize('response', [
+    b'not json',
+    b'\xff',
+    b'[]',
+    b'{"result": "false", "error": "Wrong key"}',
+    b'{"result": {"date": "2019-13-27", "time": "15:41", "grupy": []}}',
+    b'{"result": {"date": "2019-12-27", "time": "24:00", "grupy": []}}',
+    b'{"result": {"date": "2019-12-27", "time": "15:41", "grupy": {}}}',
+])
+def test_decode_matter_batch_malformed(response):
+    '''
+    Test if malformed responses are rejected as a whole.
+    '''
+    with pytest.raises(APIResponseError):
+        decode_matter_batch(response)
+
+
+#
+# Testing the HTTPConnectionPool class
+#
+
+def test_pool_reuses_connection(stand_in_server):
+    '''
+    Test if consecutive requests to the same host share a single connection.
+    '''
+    pool = HTTPConnectionPool()
+    for _ in range(3):
+        assert pool.request(stand_in_server.url + '/html') == stand_in_server.html
+    assert stand_in_server.connections == 1
+    assert len(stand_in_server.requests) == 3
+
+def test_pool_idle_timeout(stand_in_server):
+    '''
+    Test if connections idle for longer than the idle timeout are replaced.
+    '''
+    pool = HTTPConnectionPool(idle_timeout=0)
+    pool.request(stand_in_server.url + '/html')
+    pool.request(stand_in_server.url + '/html')
+    assert stand_in_server.connections == 2
+
+def test_pool_health_check(stand_in_server):
+    '''
+    Test if connections closed by the server are not reused.
+    '''
+    stand_in_server.close_connections = True
+    pool = HTTPConnectionPool()
+    pool.request(stand_in_server.url + '/html')
+    pool.request(stand_in_server.url + '/html')
+    assert stand_in_server.connections == 2
+
+def test_pool_stream(stand_in_server):
+    '''
+    Test if a streamed response is split into chunks and if abandoning
+    the stream doesn't break the pool.
+    '''
+    pool = HTTPConnectionPool()
+    chunks = list(pool.stream(stand_in_server.url + '/html', chunk_size=100))
+    assert len(chunks) > 1
+    assert b''.join(chunks) == stand_in_server.html
+    stream = pool.stream(stand_in_server.url + '/html', chunk_size=100)
+    next(stream)
+    stream.close()
+    assert pool.request(stand_in_server.url + '/html') == stand_in_server.html
+    assert stand_in_server.connections == 2
+
+def test_pool_error_status(stand_in_server):
+    '''
+    Test if error status codes result in HTTPError being raised.
+    '''
+    pool = HTTPConnectionPool()
+    with pytest.raises(HTTPError):
+        pool.request(stand_in_server.url + '/missing')
+
+def test_pool_invalid_size():
+    '''
+    Test if the pool refuses non-positive sizes.
+    '''
+    with pytest.raises(ValueError, match='size'):
+        HTTPConnectionPool(max_size=0)
+
+
+#
+# Testing the TokenBucket class
+#
+
+def test_token_bucket_burst():
+    '''
+    Test if a burst of requests is let through at once and further requests
+    have to wait according to the rate.
+    '''
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    # Tokens are reserved in advance: waiting times accumulate
+    first, second = bucket.reserve(), bucket.reserve()
+    assert first == pytest.approx(0.1, abs=0.01)
+    assert second == pytest.approx(0.2, abs=0.01)
+
+def test_token_bucket_shared_by_threads():
+    '''
+    Test if simultaneous callers don't exceed the limit.
+    '''
+    bucket = TokenBucket(rate=100, burst=5)
+    start = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(25)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 requests over the burst at 100 requests per second
+    assert time.monotonic() - start >= 0.18
+
+def test_token_bucket_invalid_arguments():
+    '''
+    Test if the bucket refuses non-positive rate or burst.
+    '''
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(burst=0)
+
+
 #
 # Testing the WSStoreAPI class
 #
@@ -169,3 +419,111 @@ def test_api_json_result(api_instance):
             'name', 'ordinal', 'group_id', 'queue_length', 'open_counters', 'current_number', 'time']
     except Exception as exc:
         assert isinstance(exc, APIError)
+
+def test_api_local_results(stand_in_server, fake_apikey):
+    '''
+    Verify results fetched from a local stand-in server through a single
+    persistent connection.
+    '''
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/json')
+    office_list = api.get_office_list()
+    assert office_list[0]['key'] == '7ef70889-4eb9-4301-a970-92287db23052'
+    result = api.get_matters_with_samples(office_list[0]['key'])
+    assert len(result) == 3
+    assert result[0]['time'] == '2019-12-27 15:41'
+    assert stand_in_server.connections == 1
+
+
+#
+# Testing the AsyncWSStoreAPI class
+#
+
+async def start_async_stand_in(payloads):
+    '''
+    Start a local asyncio server imitating the city API. Responses are looked
+    up in payloads by request path (without query string) or by office key.
+    '''
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            path, _, query = request_line.split()[1].decode().partition('?')
+            office_key = dict(
+                parameter.split('=') for parameter in query.split('&') if parameter).get('id')
+            body = payloads.get(office_key, payloads.get(path, b''))
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}', connections
+
+
+def test_async_api_results(fake_apikey):
+    '''
+    Verify results of AsyncWSStoreAPI fetched from a local asyncio stand-in
+    server, including the gathered multi-office variant.
+    '''
+    with open('tests/test_response.html', 'rb') as test_file:
+        html = test_file.read()
+    with open('tests/test_response.json', 'rb') as test_file:
+        json_data = test_file.read()
+
+    async def scenario():
+        server, url, connections = await start_async_stand_in({
+            '/html': html,
+            '/json': json_data,
+            'bad': b'{"result": "false", "error": "Wrong key"}'
+        })
+        api = AsyncWSStoreAPI(url + '/html', url + '/json')
+        try:
+            office_list = await api.get_office_list()
+            single = await api.get_matters_with_samples(office_list[0]['key'])
+            many = await api.get_many_matters_with_samples(
+                ['a', 'b', 'c', 'bad'], max_concurrency=2)
+        finally:
+            await api.close()
+            server.close()
+            await server.wait_closed()
+        return office_list, single, many, len(connections)
+
+    office_list, single, many, connection_count = asyncio.run(scenario())
+    assert office_list == [{
+        'name': 'Urząd Dzielnicy Wola',
+        'key': '7ef70889-4eb9-4301-a970-92287db23052'}]
+    assert len(single) == 3
+    assert list(single[0].keys()) == [
+        'name', 'ordinal', 'group_id', 'queue_length', 'open_counters', 'current_number', 'time']
+    assert single[0]['time'] == '2019-12-27 15:41'
+    assert many['a'] == single and many['c'] == single
+    assert isinstance(many['bad'], APIResponseError)
+    # Connections are reused: at most max_concurrency of them are opened
+    assert connection_count <= 2
+
+def test_async_api_request_errors(monkeypatch):
+    '''
+    Test if connecting times out like reading does and unsupported URLs
+    aren't taken for connection errors.
+    '''
+    async def hanging_connection(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        api = AsyncWSStoreAPI('ftp://127.0.0.1/html', 'http://127.0.0.1:1/json')
+        api.timeout = 0.05
+        with pytest.raises(ValueError):
+            await api._request('ftp://127.0.0.1/html')
+        monkeypatch.setattr(asyncio, 'open_connection', hanging_connection)
+        start = time.monotonic()
+        with pytest.raises(APIConnectionError):
+            await api._request('http://127.0.0.1:1/json')
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 1
@@ -0,0 +1,140 @@
+'''
+Tests applying to collector.py file.
+'''
+import threading
+import time
+import pytest
+from collector import Collector
+from api import APIConnectionError, APICircuitOpenError
+from database import CachedAPI, DatabasePersistentError, DatabaseTemporaryError
+
+#
+# Testing the Collector class and read-only CachedAPI
+#
+
+@pytest.fixture
+def collector_api(stand_in_server, fake_apikey, tmp_path):
+    '''
+    Returns CachedAPI instance using a local stand-in server and a temporary
+    database listing two offices.
+    '''
+    api = CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json',
+        str(tmp_path / 'cache.db'))
+    api._store_office_list([{'name': key, 'key': key} for key in ('a', 'b')])
+    return api
+
+
+def test_collector_sweep(collector_api, stand_in_server):
+    '''
+    Test if a sweep updates the due offices only.
+    '''
+    collector = Collector(collector_api)
+    assert collector.sweep() == {'a': None, 'b': None}
+    assert len(collector_api.get_matter_list('a')) == 3
+    stand_in_server.requests.clear()
+    assert collector.sweep() == {}
+    assert stand_in_server.requests == []
+
+def test_collector_run_until_stopped(collector_api):
+    '''
+    Test if the collector keeps sweeping until it's stopped and closes
+    the cache then.
+    '''
+    collector = Collector(collector_api, min_interval=0.05)
+    collector_api.cooldown = 1
+    thread = threading.Thread(target=collector.run)
+    thread.start()
+    time.sleep(1.5)
+    collector.stop()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    # Both offices have been polled twice
+    assert collector_api.stats['fetched_updates'] == 4
+
+def test_collector_backs_off_failing_offices(collector_api, stand_in_server):
+    '''
+    Test if failing and suspended offices aren't polled at every sweep
+    and if sweeps don't replenish the retry budget.
+    '''
+    stand_in_server.offices['b'] = None
+    collector_api.connection_retry_policy.initial_wait = 0
+    collector = Collector(collector_api)
+    results = collector.sweep()
+    assert results['a'] is None and isinstance(results['b'], APIConnectionError)
+    remaining = collector_api.retry_budget.remaining
+    assert remaining < collector_api.retry_budget.limit
+    stand_in_server.requests.clear()
+    assert collector.sweep() == {}
+    assert stand_in_server.requests == []
+    assert collector_api.retry_budget.remaining == remaining
+    assert collector_api.scheduler.seconds_until_due() > 25
+    # The lease of the failed poll is released
+    with collector_api._connections.reader() as cursor:
+        assert cursor.execute(
+            'SELECT COUNT(lease_owner) FROM last_connection').fetchone()[0] == 0
+    # A suspended office is due once the circuit breaker lets a probe through
+    for _ in range(collector_api.circuit_breaker.failure_threshold):
+        collector_api.circuit_breaker.record_failure('b')
+    collector_api.scheduler.make_due('b')
+    assert isinstance(collector.sweep()['b'], APICircuitOpenError)
+    assert stand_in_server.requests == []
+    assert not collector_api.scheduler.is_due('b')
+    assert collector_api.scheduler.seconds_until_due() > 25
+
+def test_read_only_cache(collector_api, stand_in_server, tmp_path):
+    '''
+    Test if a read-only cache shows the collected data without calling API
+    nor modifying the database.
+    '''
+    Collector(collector_api).sweep()
+    viewer = CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json',
+        collector_api._filename, read_only=True)
+    assert viewer.read_only
+    assert [office['key'] for office in viewer.get_office_list()] == ['a', 'b']
+    assert len(viewer.get_matter_list('a')) == 3
+    stand_in_server.requests.clear()
+    viewer.cooldown = 1
+    time.sleep(1.1)
+    viewer.update('a')
+    assert viewer.update_many(['a', 'b']) == {'a': None, 'b': None}
+    assert viewer.due_office_keys(['a', 'b']) == []
+    assert stand_in_server.requests == []
+    with pytest.raises(DatabasePersistentError):
+        viewer.remove_old_samples()
+    # Samples of offices aren't kept in memory, as the collector changes them
+    viewer.get_office_samples('a')
+    viewer.get_office_samples('a')
+    assert viewer.stats['hot_tier_hits'] == 0
+    viewer.close()
+    # A cache not created beforehand isn't created
+    with pytest.raises(DatabasePersistentError, match='collector'):
+        CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json',
+                  str(tmp_path / 'missing.db'), read_only=True)
+    assert not (tmp_path / 'missing.db').exists()
+
+def test_read_only_cache_without_office_list(stand_in_server, tmp_path):
+    '''
+    Test if a read-only cache whose office list hasn't been collected yet
+    reports it as a temporary error instead of an empty list.
+    '''
+    filename = str(tmp_path / 'cache.db')
+    CachedAPI(stand_in_server.url + '/html', stand_in_server.url + '/json', filename).close()
+    viewer = CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json', filename, read_only=True)
+    assert viewer.get_office_list(cached_only=True) == []
+    with pytest.raises(DatabaseTemporaryError):
+        viewer.get_office_list()
+    assert stand_in_server.requests == []
+    viewer.close()
+
+def test_collector_rejects_read_only_cache(collector_api, stand_in_server):
+    '''
+    Test if the collector refuses to update a read-only cache.
+    '''
+    viewer = CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json',
+        collector_api._filename, read_only=True)
+    with pytest.raises(ValueError):
+        Collector(viewer)
@@ -1,8 +1,14 @@
 import pytest
+import asyncio
 import os
 import sqlite3
-from api import APIError
-from database import SQLite3Cursor, DatabaseError, CachedAPI
+import threading
+import time
+from api import APIError, APIResponseError, MatterRecord, MatterBatch
+from database import (
+    SQLite3Cursor, SQLite3ConnectionManager, SQLiteTokenBucket, CachedAPI,
+    RetentionPolicy, SampleColumns, DatabaseError, DatabaseInsertionError, DatabasePersistentError,
+    SCHEMA_VERSION)
 
 #
 # Testing the SQLite3Cursor context manager
@@ -79,6 +85,50 @@ def test_cursor_context_custom_exception(remove_database_if_exists):
             cursor.execute('SELECT * FROM test')
 
 
+#
+# Testing the SQLiteTokenBucket class
+#
+
+def test_sqlite_token_bucket_shared(tmp_path):
+    '''
+    Test if buckets using the same database file share their tokens.
+    '''
+    filename = str(tmp_path / 'limiter.db')
+    first = SQLiteTokenBucket(filename, rate=10, burst=2)
+    second = SQLiteTokenBucket(filename, rate=10, burst=2)
+    assert first.reserve() == 0
+    assert second.reserve() == 0
+    assert first.reserve() == pytest.approx(0.1, abs=0.02)
+    assert second.reserve() == pytest.approx(0.2, abs=0.02)
+    # Buckets of other names are independent
+    assert SQLiteTokenBucket(filename, rate=10, burst=2, name='other').reserve() == 0
+
+
+def test_sqlite_token_bucket_async_doesnt_block_loop(tmp_path):
+    '''
+    Test if waiting for the database lock while taking a token leaves
+    the event loop free to run other coroutines.
+    '''
+    filename = str(tmp_path / 'limiter.db')
+    bucket = SQLiteTokenBucket(
+        filename, connections=SQLite3ConnectionManager(filename, busy_timeout=1))
+    blocker = sqlite3.connect(filename, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+
+    async def run():
+        ticks = 0
+        acquiring = asyncio.ensure_future(bucket.acquire_async())
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            ticks += 1
+        assert not acquiring.done()
+        blocker.execute('COMMIT')
+        return ticks, await acquiring
+
+    assert asyncio.run(run()) == (10, 0)
+    blocker.close()
+
+
 #
 # Testing the CachedAPI class
 #
@@ -146,7 +196,7 @@ def test_cached_api_json_result(cached_api_instance):
     cached_api_instance.office_key = ''
     with SQLite3Cursor('tests/test.db') as cursor:
         cursor.execute("INSERT INTO offices VALUES (1, 'test', '')")
-        cursor.execute("INSERT INTO last_connection VALUES (1, NULL)")
+        cursor.execute("INSERT INTO last_connection (office_id) VALUES (1)")
     try:
         cached_api_instance.update()
         # Test matter list fetching
@@ -209,3 +259,752 @@ def test_cached_api_json_result(cached_api_instance):
                 assert db_result_samples[0]['queue_length'] == result_samples[0]['queue_length']
     except Exception as exc:
         assert isinstance(exc, APIError)
+
+
+#
+# Testing the SQLite3ConnectionManager class
+#
+
+def test_connection_manager_transactions(tmp_path):
+    '''
+    Test if nested writer contexts form a single transaction, visible
+    to readers of other threads only after commit.
+    '''
+    connections = SQLite3ConnectionManager(str(tmp_path / 'test.db'))
+    with connections.writer() as cursor:
+        cursor.execute('CREATE TABLE test (value INTEGER UNIQUE)')
+    seen_by_other_thread = []
+
+    def count_values():
+        with connections.reader() as cursor:
+            seen_by_other_thread.append(cursor.execute('SELECT COUNT(*) FROM test').fetchone()[0])
+
+    with connections.writer() as cursor:
+        cursor.execute('INSERT INTO test VALUES (1)')
+        with connections.writer() as inner_cursor:
+            inner_cursor.execute('INSERT INTO test VALUES (2)')
+        with connections.reader() as reader_cursor:
+            assert reader_cursor.execute('SELECT COUNT(*) FROM test').fetchone()[0] == 2
+        thread = threading.Thread(target=count_values)
+        thread.start()
+        thread.join()
+    count_values()
+    assert seen_by_other_thread == [0, 2]
+    connections.close()
+
+def test_connection_manager_errors(tmp_path):
+    '''
+    Test if failed transactions are rolled back and exceptions converted.
+    '''
+    connections = SQLite3ConnectionManager(str(tmp_path / 'test.db'))
+    with connections.writer() as cursor:
+        cursor.execute('CREATE TABLE test (value INTEGER UNIQUE)')
+    with pytest.raises(DatabaseInsertionError):
+        with connections.writer() as cursor:
+            cursor.execute('INSERT INTO test VALUES (1)')
+            cursor.execute('INSERT INTO test VALUES (1)')
+    with pytest.raises(DatabasePersistentError):
+        with connections.reader() as cursor:
+            cursor.execute('SELECT * FROM missing')
+    with connections.reader() as cursor:
+        assert cursor.execute('SELECT COUNT(*) FROM test').fetchone()[0] == 0
+
+def test_cached_api_in_memory(stand_in_server, fake_apikey):
+    '''
+    Test if the default in-memory cache keeps its content between calls.
+    '''
+    api = CachedAPI(stand_in_server.url + '/html', stand_in_server.url + '/json')
+    # An empty cache doesn't call API if only cached data are wanted
+    assert api.get_office_list(cached_only=True) == []
+    assert stand_in_server.requests == []
+    office_list = api.get_office_list()
+    assert api.get_office_list(cached_only=True) == office_list
+    api.update(office_list[0]['key'])
+    assert len(api.get_matter_list(office_list[0]['key'])) == 3
+    stand_in_server.requests.clear()
+    assert api.get_office_list() == office_list
+    assert stand_in_server.requests == []
+
+def test_cached_api_reuses_connections(local_cached_api, monkeypatch):
+    '''
+    Test if an update doesn't open new database connections for every
+    query.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    opened = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        sqlite3, 'connect', lambda *args, **kwargs: opened.append(args) or connect(*args, **kwargs))
+    for _ in range(3):
+        local_cached_api.update('office')
+        make_due(local_cached_api, 'office')
+    assert len(local_cached_api.get_matter_list('office')) == 3
+    # At most the reader connection of the current thread has been opened
+    assert len(opened) <= 1
+
+
+#
+# Testing the CachedAPI class against a local stand-in server
+#
+
+@pytest.fixture
+def local_cached_api(stand_in_server, fake_apikey, tmp_path):
+    '''
+    Returns CachedAPI instance using a local stand-in server and an empty
+    temporary database.
+    '''
+    return CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json',
+        str(tmp_path / 'cache.db'))
+
+def make_due(api, office_key):
+    '''
+    Makes an office due for update, forgetting the time of the last API call
+    and its lease.
+    '''
+    api.scheduler.make_due(office_key)
+    with api._connections.writer() as cursor:
+        cursor.execute('UPDATE last_connection SET time = NULL, lease_until = NULL')
+
+
+def test_cached_api_update_many_concurrent(local_cached_api, stand_in_server):
+    '''
+    Test if multiple offices are fetched concurrently and stored.
+    '''
+    office_keys = [f'office-{index}' for index in range(6)]
+    local_cached_api._store_office_list(
+        [{'name': key, 'key': key} for key in office_keys])
+    stand_in_server.delay = 0.3
+    start = time.monotonic()
+    results = local_cached_api.update_many(office_keys, max_workers=6)
+    elapsed = time.monotonic() - start
+    assert list(results) == office_keys
+    assert all(exc is None for exc in results.values())
+    # A sequential sweep would last at least 6 * 0.3 seconds
+    assert elapsed < 1.2
+    for office_key in office_keys:
+        assert len(local_cached_api.get_matter_list(office_key)) == 3
+    # Offices updated moments ago are skipped
+    stand_in_server.requests.clear()
+    results = local_cached_api.update_many(office_keys)
+    assert all(exc is None for exc in results.values())
+    assert stand_in_server.requests == []
+
+def test_cached_api_update_many_failures(local_cached_api, stand_in_server):
+    '''
+    Test if failures of single offices are reported without affecting
+    the others.
+    '''
+    local_cached_api._store_office_list(
+        [{'name': 'good', 'key': 'good'}, {'name': 'bad', 'key': 'bad'}])
+    stand_in_server.offices['bad'] = b'{"result": "false", "error": "Wrong key"}'
+    results = local_cached_api.update_many(['good', 'bad'])
+    assert results['good'] is None
+    assert isinstance(results['bad'], APIResponseError)
+    assert len(local_cached_api.get_matter_list('good')) == 3
+    assert local_cached_api.get_matter_list('bad') == []
+
+def test_cached_api_update_reports_store_failure(local_cached_api, stand_in_server, monkeypatch):
+    '''
+    Test if an update whose data cannot be stored raises the error instead
+    of being retried as a whole (and then skipped as not due).
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    local_cached_api.database_retry_policy.initial_wait = 0
+    attempts = []
+
+    def store_rollups(cursor, samples):
+        attempts.append(samples)
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(local_cached_api, '_store_rollups', store_rollups)
+    stand_in_server.requests.clear()
+    with pytest.raises(DatabaseError):
+        local_cached_api.update('office')
+    assert len(stand_in_server.requests) == 1
+    assert len(attempts) == 3
+    assert local_cached_api.get_matter_list('office') == []
+
+def test_cached_api_database_retry_budget(local_cached_api, monkeypatch):
+    '''
+    Test if database operations are still retried after API retries have
+    depleted their budget.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    local_cached_api.database_retry_policy.initial_wait = 0
+    while local_cached_api.retry_budget.try_spend():
+        pass
+    store_rollups = local_cached_api._store_rollups
+    attempts = []
+
+    def store_rollups_once_locked(cursor, samples):
+        attempts.append(samples)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        store_rollups(cursor, samples)
+
+    monkeypatch.setattr(local_cached_api, '_store_rollups', store_rollups_once_locked)
+    timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 60))
+    local_cached_api._store_update('office', None, MatterBatch(timestamp, [
+        MatterRecord('A', 1, 1, 3, 1, 'A001')], []))
+    assert len(attempts) == 2
+    assert len(local_cached_api.get_matter_list('office')) == 1
+
+def test_cached_api_coalesces_concurrent_updates(local_cached_api, stand_in_server):
+    '''
+    Test if concurrent updates of an office wait for the one in progress
+    instead of calling API again, and share its outcome.
+    '''
+    local_cached_api._store_office_list(
+        [{'name': 'office', 'key': 'office'}, {'name': 'other', 'key': 'other'}])
+    stand_in_server.delay = 0.3
+    threads = [
+        threading.Thread(target=local_cached_api.update, args=('office',))
+        for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    results = local_cached_api.update_many(['office', 'other'])
+    for thread in threads:
+        thread.join()
+    assert results == {'office': None, 'other': None}
+    json_requests = [path for path in stand_in_server.requests if 'office' in path]
+    assert len(json_requests) == 1
+    assert local_cached_api.stats['deduplicated_updates'] == 3
+    assert len(local_cached_api.get_matter_list('office')) == 3
+    # Failures are shared as well
+    make_due(local_cached_api, 'office')
+    stand_in_server.offices['office'] = b'{"result": "false", "error": "Wrong key"}'
+    errors = []
+
+    def update():
+        try:
+            local_cached_api.update('office')
+        except Exception as exc:
+            errors.append(exc)
+    threads = [threading.Thread(target=update) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2 and all(isinstance(exc, APIResponseError) for exc in errors)
+    assert local_cached_api.stats['deduplicated_updates'] == 4
+
+def test_cached_api_poll_lease(local_cached_api, stand_in_server):
+    '''
+    Test if only one of processes sharing the cache polls a due office,
+    while the other one reads the stored result, and if the lease of a dead
+    process expires.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    other_api = CachedAPI(
+        stand_in_server.url + '/html', stand_in_server.url + '/json',
+        local_cached_api._filename)
+    # Both processes consider the office due
+    assert local_cached_api._is_update_due('office') and other_api._is_update_due('office')
+    stand_in_server.delay = 0.3
+    threads = [
+        threading.Thread(target=api.update, args=('office',))
+        for api in (local_cached_api, other_api)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len([path for path in stand_in_server.requests if '/json' in path]) == 1
+    assert local_cached_api.stats['yielded_updates'] + other_api.stats['yielded_updates'] == 1
+    for api in (local_cached_api, other_api):
+        assert len(api.get_matter_list('office')) == 3
+        assert not api._is_update_due('office')
+    # The lease of a dead process blocks the poll until it expires
+    now = int(time.time())
+    make_due(other_api, 'office')
+    with other_api._connections.writer() as cursor:
+        cursor.execute(
+            "UPDATE last_connection SET lease_owner = 'dead', lease_until = ?", (now + 60,))
+    stand_in_server.requests.clear()
+    other_api.update('office')
+    assert stand_in_server.requests == []
+    other_api.scheduler.make_due('office')
+    with other_api._connections.writer() as cursor:
+        cursor.execute('UPDATE last_connection SET lease_until = ?', (now - 1,))
+    other_api.update('office')
+    assert len(stand_in_server.requests) == 1
+    # The lease is released once the outcome is stored
+    with other_api._connections.reader() as cursor:
+        assert cursor.execute('SELECT lease_owner FROM last_connection').fetchone()[0] is None
+    other_api.close()
+
+def update_counters(api):
+    '''
+    Returns the counters of API responses from the statistics of CachedAPI.
+    '''
+    return {
+        counter: api.stats[counter]
+        for counter in ('fetched_updates', 'skipped_updates', 'quarantined_groups')}
+
+def test_cached_api_skips_unchanged_response(local_cached_api, stand_in_server):
+    '''
+    Test if a response with unchanged timestamp is neither parsed nor stored,
+    while the time of the API call is still noted.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    local_cached_api.update('office')
+    assert update_counters(local_cached_api) == {'fetched_updates': 1, 'skipped_updates': 0,
+                                      'quarantined_groups': 0}
+    # Forget the time of the API call to force another one
+    make_due(local_cached_api, 'office')
+    local_cached_api.update('office')
+    assert update_counters(local_cached_api) == {'fetched_updates': 2, 'skipped_updates': 1,
+                                      'quarantined_groups': 0}
+    assert local_cached_api._get_seconds_since_last_connection('office') is not None
+    # A changed timestamp results in a regular update
+    make_due(local_cached_api, 'office')
+    stand_in_server.json = stand_in_server.json.replace(b'"15:41"', b'"15:42"')
+    local_cached_api.update('office')
+    assert update_counters(local_cached_api) == {'fetched_updates': 3, 'skipped_updates': 1,
+                                      'quarantined_groups': 0}
+    assert local_cached_api._fingerprints['office'] == ('2019-12-27', '15:42')
+
+def test_cached_api_quarantines_malformed_groups(local_cached_api, stand_in_server):
+    '''
+    Test if malformed groups are counted and left out of cache without
+    affecting the rest of the response.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    stand_in_server.json = stand_in_server.json.replace(b'"idGrupy":"652"', b'"idGrupy":"x"', 1)
+    local_cached_api.update('office')
+    assert local_cached_api.stats['quarantined_groups'] == 1
+    assert len(local_cached_api.get_matter_list('office')) == 2
+    assert local_cached_api.quarantine[0][0] == 'office'
+
+def test_cached_api_batched_ingest(local_cached_api):
+    '''
+    Test if repeated refreshes neither duplicate matters (including ones
+    without ordinal numbers) nor samples.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    records = [
+        MatterRecord('A', None, 1, 2, 1, 'A001'),
+        MatterRecord('B', 3, 2, 0, 1, 'B010')]
+    # Samples older than an hour would be removed
+    timestamps = [
+        time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - seconds))
+        for seconds in (120, 120, 60)]
+    for timestamp in timestamps:
+        local_cached_api._store_update('office', None, MatterBatch(timestamp, records, []))
+    assert len(local_cached_api.get_matter_list('office')) == 2
+    samples = local_cached_api.get_sample_list(None, 1, 'office')
+    assert [sample['time'] for sample in samples] == timestamps[1:]
+
+def test_cached_api_identity_map(local_cached_api):
+    '''
+    Test if ID numbers are queried once and forgotten after rollbacks.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    records = [MatterRecord('A', 1, 1, 2, 1, 'A001')]
+    timestamp = time.strftime('%Y-%m-%d %H:%M')
+    local_cached_api._store_update('office', None, MatterBatch(timestamp, records, []))
+    misses = local_cached_api.stats['identity_map_misses']
+    for _ in range(3):
+        local_cached_api._store_update('office', None, MatterBatch(timestamp, records, []))
+        assert local_cached_api._get_matter_id(1, 1, 'office') is not None
+    assert local_cached_api.stats['identity_map_misses'] == misses
+    assert local_cached_api.stats['identity_map_hits'] > 0
+    with pytest.raises(RuntimeError):
+        with local_cached_api._connections.writer():
+            raise RuntimeError()
+    assert local_cached_api._identity_map.lookup(('office', 'office')) is None
+    assert local_cached_api._get_office_id('office') is not None
+
+def test_cached_api_migrates_text_times(tmp_path):
+    '''
+    Test if a cache storing sample times as text is migrated to UNIX epoch
+    without changing the results.
+    '''
+    filename = str(tmp_path / 'cache.db')
+    recent = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 120))
+    with SQLite3Cursor(filename) as cursor:
+        cursor.execute('CREATE TABLE offices (id INTEGER PRIMARY KEY, name TEXT, key TEXT UNIQUE)')
+        cursor.execute(
+            '''
+            CREATE TABLE matters (id INTEGER PRIMARY KEY, name TEXT, ordinal INT,
+            group_id INT, office_id INTEGER NOT NULL, UNIQUE (ordinal, group_id, office_id))
+            ''')
+        cursor.execute(
+            '''
+            CREATE TABLE samples (time TEXT NOT NULL, matter_id INTEGER NOT NULL,
+            open_counters INTEGER, queue_length INTEGER, current_number TEXT,
+            PRIMARY KEY (time, matter_id))
+            ''')
+        cursor.execute("INSERT INTO offices VALUES (1, 'office', 'office')")
+        cursor.execute("INSERT INTO matters VALUES (1, 'A', 1, 1, 1)")
+        cursor.execute("INSERT INTO samples VALUES (?, 1, 1, 2, 'A001')", (recent,))
+        cursor.execute('CREATE TABLE last_connection (office_id INTEGER PRIMARY KEY, time TEXT)')
+        cursor.execute(
+            'INSERT INTO last_connection VALUES (1, ?)',
+            (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - 30)),))
+    api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename)
+    # The local time of the last API call is converted as well
+    assert 29 <= api._get_seconds_since_last_connection('office') <= 32
+    assert not api._is_update_due('office')
+    assert api.get_sample_list(1, 1, 'office') == [
+        {'queue_length': 2, 'open_counters': 1, 'current_number': 'A001', 'time': recent}]
+    assert api.get_latest_sample(1, 1, 'office')['time'] == recent
+    api.close()
+    with SQLite3Cursor(filename) as cursor:
+        assert cursor.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert cursor.execute('SELECT TYPEOF(time) FROM samples').fetchone()[0] == 'integer'
+        assert cursor.execute('SELECT TYPEOF(time) FROM last_connection').fetchone()[0] == 'integer'
+    # Opening the migrated cache again leaves it intact
+    api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename)
+    assert len(api.get_sample_list(1, 1, 'office')) == 1
+    # Rollups of the samples are computed during the migration
+    assert [rollup['sample_count'] for rollup in api.get_rollup_list(1, 1, 3600, 'office')] == [1]
+
+def test_cached_api_poll_times(local_cached_api):
+    '''
+    Test if the times of API calls are kept in memory, saved along with
+    the stored outcome of an update and restored by another CachedAPI
+    instance.
+    '''
+    local_cached_api._store_office_list([
+        {'name': name, 'key': name} for name in ('a', 'b', 'c')])
+    assert local_cached_api.due_office_keys(['a', 'b', 'c']) == ['a', 'b', 'c']
+    local_cached_api._store_update('a', None, None)
+    assert local_cached_api.due_office_keys(['a', 'b', 'c']) == ['b', 'c']
+    assert not local_cached_api._is_update_due('a')
+    # Unchanged data aren't stored, but the time of the call is saved
+    assert local_cached_api.scheduler.unsaved() == {}
+    with local_cached_api._connections.reader() as cursor:
+        assert cursor.execute('SELECT COUNT(time) FROM last_connection').fetchone()[0] == 1
+    timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime())
+    local_cached_api._store_update(
+        'b', None, MatterBatch(timestamp, [MatterRecord('A', None, 1, 2, 1, 'A001')], []))
+    assert local_cached_api.scheduler.unsaved() == {}
+    other_api = CachedAPI(
+        'http://127.0.0.1/html', 'http://127.0.0.1/json', local_cached_api._filename)
+    assert other_api.due_office_keys(['a', 'b', 'c']) == ['c']
+    # A changed cooldown reschedules the offices
+    other_api.cooldown = 1
+    time.sleep(1.1)
+    assert set(other_api.due_office_keys(['a', 'b', 'c'])) == {'a', 'b', 'c'}
+    other_api.close()
+
+def test_cached_api_activity_intervals(local_cached_api):
+    '''
+    Test if busy offices are polled more often than the cooldown, closed
+    ones less often, unless they're displayed.
+    '''
+    local_cached_api._store_office_list(
+        [{'name': key, 'key': key} for key in ('busy', 'closed')])
+    for minutes in (3, 2, 1):
+        timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 60 * minutes))
+        local_cached_api._store_update('busy', None, MatterBatch(
+            timestamp, [MatterRecord('A', None, 1, 10 + minutes, 2, 'A001')], []))
+        local_cached_api._store_update('closed', None, MatterBatch(
+            timestamp, [MatterRecord('A', None, 1, 0, 0, 'A001')], []))
+    scheduler = local_cached_api.scheduler
+    assert scheduler.interval_of('busy') == 30
+    assert scheduler.interval_of('closed') == 120
+    assert not local_cached_api._is_update_due('closed')
+    local_cached_api.office_key = 'closed'
+    assert scheduler.interval_of('closed') == local_cached_api.cooldown
+
+def test_cached_api_office_samples(local_cached_api):
+    '''
+    Test if samples of all the matters of an office read at once equal
+    the ones read matter by matter.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    records = [MatterRecord('A', None, 1, 2, 1, 'A001'), MatterRecord('B', 3, 2, 0, 1, 'B010')]
+    timestamps = [
+        time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - seconds))
+        for seconds in (180, 120, 60)]
+    for timestamp in timestamps:
+        local_cached_api._store_update('office', None, MatterBatch(timestamp, records, []))
+    local_cached_api._store_update(
+        'office', None, MatterBatch(timestamps[-1], [MatterRecord('C', 4, 3, 1, 1, 'C001')], []))
+    with local_cached_api._connections.writer() as cursor:
+        cursor.execute('DELETE FROM samples WHERE matter_id = 3')
+    office_samples = local_cached_api.get_office_samples('office')
+    assert set(office_samples) == {(None, 1), (3, 2), (4, 3)}
+    for (ordinal, group_id), sample_list in office_samples.items():
+        assert sample_list == local_cached_api.get_sample_list(ordinal, group_id, 'office')
+    assert office_samples[(4, 3)] == []
+    newer_samples = local_cached_api.get_office_samples('office', since=timestamps[0])
+    assert [sample['time'] for sample in newer_samples[(3, 2)]] == timestamps[1:]
+    assert local_cached_api.get_sample_list(3, 2, 'office', since=timestamps[0]) == \
+        newer_samples[(3, 2)]
+    assert local_cached_api.get_sample_list(3, 2, 'office', since=timestamps[-1]) == []
+
+def test_cached_api_columnar_samples(local_cached_api):
+    '''
+    Test if samples read as columns equal the ones read as dictionaries
+    and if slices of the columns share memory with them.
+    '''
+    local_cached_api._store_office_list([{'name': 'office', 'key': 'office'}])
+    for seconds in (180, 120, 60):
+        timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - seconds))
+        records = [MatterRecord('A', 1, 1, seconds // 60, 1, 'A001')]
+        local_cached_api._store_update('office', None, MatterBatch(timestamp, records, []))
+    sample_list = local_cached_api.get_sample_list(1, 1, 'office')
+    columns = local_cached_api.get_sample_list(1, 1, 'office', columnar=True)
+    assert isinstance(columns, SampleColumns)
+    assert len(columns) == 3 and columns.to_sample_list() == sample_list
+    assert local_cached_api.get_office_samples('office', columnar=True)[(1, 1)].to_sample_list() \
+        == sample_list
+    assert list(columns.queue_lengths) == [3, 2, 1]
+    assert columns.current_numbers[0] is columns.current_numbers[2]
+    view = columns[1:]
+    assert view.times.obj is columns.times
+    assert view.to_sample_list() == sample_list[1:] and view[-1] == sample_list[-1]
+    # The columns can't be resized while they are viewed
+    with pytest.raises(BufferError):
+        columns.append(0, 0, 0, 'A001')
+    numpy = pytest.importorskip('numpy')
+    arrays = view.to_numpy()
+    assert numpy.shares_memory(arrays['queue_length'], numpy.frombuffer(columns.queue_lengths, numpy.intc))
+    assert arrays['queue_length'].tolist() == [2, 1]
+
+def test_cached_api_hot_tier(tmp_path):
+    '''
+    Test if samples of recently read offices are served from memory
+    (identical to the ones read from the database), ingest keeps them up
+    to date and memory stays bounded.
+    '''
+    filename = str(tmp_path / 'cache.db')
+    api = CachedAPI(
+        'http://127.0.0.1/html', 'http://127.0.0.1/json', filename,
+        hot_offices=1, hot_capacity=3)
+    cold_api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename, hot_offices=0)
+    api._store_office_list([{'name': 'first', 'key': 'first'}, {'name': 'second', 'key': 'second'}])
+    timestamps = [
+        time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 60 * minutes))
+        for minutes in range(5, 0, -1)]
+
+    def ingest(office_key, timestamp):
+        records = [MatterRecord('A', 1, 1, int(timestamp[-1]), 1, 'A001'),
+                   MatterRecord('B', 2, 2, 0, 1, 'B001')]
+        api._store_update(office_key, None, MatterBatch(timestamp, records, []))
+
+    def hot_counters():
+        return api.stats['hot_tier_hits'], api.stats['hot_tier_misses']
+
+    ingest('first', timestamps[0])
+    ingest('second', timestamps[0])
+    # The first read makes the office hot
+    assert api.get_office_samples('first') == cold_api.get_office_samples('first')
+    assert hot_counters() == (1, 1)
+    for timestamp in timestamps[1:3]:
+        ingest('first', timestamp)
+        assert api.get_office_samples('first') == cold_api.get_office_samples('first')
+        assert api.get_sample_list(1, 1, 'first', since=timestamps[0]) == \
+            cold_api.get_sample_list(1, 1, 'first', since=timestamps[0])
+    assert hot_counters() == (5, 1)
+    # Overflowed buffers serve only the samples they hold entirely
+    ingest('first', timestamps[3])
+    assert api.get_sample_list(1, 1, 'first', since=timestamps[1]) == \
+        cold_api.get_sample_list(1, 1, 'first', since=timestamps[1])
+    assert api.get_sample_list(1, 1, 'first', columnar=True).to_sample_list() == \
+        cold_api.get_sample_list(1, 1, 'first')
+    assert hot_counters() == (6, 2)
+    # Reading another office makes the least recently used one cold
+    api.get_sample_list(1, 1, 'second')
+    assert api._hot_tier.is_hot(api._get_office_id('second'))
+    assert not api._hot_tier.is_hot(api._get_office_id('first'))
+    # Samples stored by other processes are noticed at the next ingest
+    cold_api._store_update('second', None, MatterBatch(timestamps[1], [
+        MatterRecord('A', 1, 1, 7, 1, 'A001')], []))
+    ingest('first', timestamps[4])
+    assert api.get_office_samples('second') == cold_api.get_office_samples('second')
+    # Rolled back transactions make all the offices cold
+    with pytest.raises(RuntimeError):
+        with api._connections.writer():
+            raise RuntimeError()
+    assert not api._hot_tier.is_hot(api._get_office_id('second'))
+    api.close()
+    cold_api.close()
+
+def test_cached_api_hot_tier_unknown_current_number(tmp_path):
+    '''
+    Test if samples without a current number are read the same way from
+    memory and from the database.
+    '''
+    filename = str(tmp_path / 'cache.db')
+    api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename, hot_offices=1)
+    cold_api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename, hot_offices=0)
+    api._store_office_list([{'name': 'office', 'key': 'office'}])
+    timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 60))
+    api._store_update('office', None, MatterBatch(timestamp, [
+        MatterRecord('A', 1, 1, 3, 1, 'A001')], []))
+    with api._connections.writer() as cursor:
+        cursor.execute('UPDATE samples SET current_number = NULL')
+    samples = api.get_office_samples('office')
+    assert samples == cold_api.get_office_samples('office')
+    assert samples[(1, 1)][0]['current_number'] is None
+    assert api.get_sample_list(1, 1, 'office', columnar=True).current_numbers == [None]
+    assert api.get_latest_sample(1, 1, 'office')['current_number'] is None
+    api.close()
+    cold_api.close()
+
+def test_cached_api_hot_tier_consistent_snapshot(tmp_path):
+    '''
+    Test if making an office hot isn't broken by a matter (with samples)
+    committed by another process between reading matters and samples.
+    '''
+    filename = str(tmp_path / 'cache.db')
+    api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename, hot_offices=1)
+    other_api = CachedAPI('http://127.0.0.1/html', 'http://127.0.0.1/json', filename, hot_offices=0)
+    api._store_office_list([{'name': 'office', 'key': 'office'}])
+    timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() - 60))
+    api._store_update('office', None, MatterBatch(timestamp, [
+        MatterRecord('A', 1, 1, 3, 1, 'A001')], []))
+    injected = []
+
+    def inject_commit(statement):
+        if 'JOIN samples' in statement and not injected:
+            injected.append(statement)
+            other_api._store_update('office', None, MatterBatch(timestamp, [
+                MatterRecord('A', 1, 1, 3, 1, 'A001'),
+                MatterRecord('B', 2, 2, 5, 1, 'B001')], []))
+
+    api.get_matter_list('office')
+    with api._connections.reader() as cursor:
+        cursor.connection.set_trace_callback(inject_commit)
+    try:
+        samples = api.get_office_samples('office')
+    finally:
+        with api._connections.reader() as cursor:
+            cursor.connection.set_trace_callback(None)
+    assert injected
+    assert list(samples) == [(1, 1)]
+    # The matter is noticed at the next ingest
+    api._store_update('office', None, MatterBatch(timestamp, [
+        MatterRecord('A', 1, 1, 3, 1, 'A001')], []))
+    assert api.get_office_samples('office') == other_api.get_office_samples('office')
+    api.close()
+    other_api.close()
+
+def test_cached_api_rollups(tmp_path):
+    '''
+    Test if rollups are maintained at ingest (without counting repeated
+    samples twice) and outlive raw samples according to retention policy.
+    '''
+    api = CachedAPI(
+        'http://127.0.0.1/html', 'http://127.0.0.1/json', str(tmp_path / 'cache.db'),
+        retention_policy=RetentionPolicy(raw=3 * 3600, rollups={300: 3 * 3600, 3600: 86400}))
+    api._store_office_list([{'name': 'office', 'key': 'office'}])
+    # Minutes of the previous full hour (3 samples in its first 5 minutes)
+    hour_start = int(time.time()) // 3600 * 3600 - 3600
+    for minute, queue_length in ((0, 4), (1, 2), (2, 9), (2, 9), (5, 1)):
+        timestamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(hour_start + 60 * minute))
+        records = [MatterRecord('A', 1, 1, queue_length, minute, 'A001')]
+        api._store_update('office', None, MatterBatch(timestamp, records, []))
+    # Samples past the raw retention period are removed, rollups aren't
+    api.retention_policy.raw = 60
+    api._remove_old_samples()
+    assert api.get_sample_list(1, 1, 'office') == []
+    # and such samples are no longer stored
+    api._store_update('office', None, MatterBatch(timestamp, records, []))
+    rollups = api.get_rollup_list(1, 1, 300, 'office')
+    assert [rollup['sample_count'] for rollup in rollups] == [3, 1]
+    assert rollups[0]['time'] == time.strftime('%Y-%m-%d %H:%M', time.localtime(hour_start))
+    assert rollups[0]['queue_length_min'] == 2
+    assert rollups[0]['queue_length_max'] == 9
+    assert rollups[0]['queue_length_mean'] == 5
+    assert rollups[0]['open_counters_mean'] == 1
+    hourly = api.get_rollup_list(1, 1, 3600, 'office')
+    assert len(hourly) == 1 and hourly[0]['sample_count'] == 4
+    # Shortening the retention removes the expired rollups
+    api.retention_policy.rollups[3600] = 60
+    api._remove_old_samples()
+    assert api.get_rollup_list(1, 1, 3600, 'office') == []
+    assert len(api.get_rollup_list(1, 1, 300, 'office')) == 2
+    with pytest.raises(ValueError):
+        RetentionPolicy(rollups={90: 3600})
+    api.close()
+
+def test_cached_api_sample_queries_use_indexes(local_cached_api):
+    '''
+    Test if retention and sample reads are index searches, not table scans.
+    '''
+    with local_cached_api._connections.reader() as cursor:
+        for query in (
+                'DELETE FROM samples WHERE time < 0',
+                'DELETE FROM rollups WHERE resolution = 300 AND time < 0',
+                'SELECT * FROM rollups WHERE matter_id = 1 AND resolution = 300 ORDER BY time',
+                'SELECT * FROM samples WHERE matter_id = 1 ORDER BY time DESC LIMIT 1',
+                'SELECT id FROM matters WHERE office_id = 1',
+                'SELECT * FROM matters LEFT JOIN samples ON samples.matter_id = matters.id '
+                'AND samples.time > 0 WHERE office_id = 1 ORDER BY matters.id, time'):
+            plan = ' '.join(row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + query))
+            assert 'USING' in plan and 'SCAN' not in plan
+
+def test_cached_api_concurrent_access(local_cached_api):
+    '''
+    Stress test of simultaneous ingest (by two CachedAPI objects, like two
+    processes) and reads, including slowly consumed ones: neither readers
+    nor writers wait for each other and no operation needs retrying.
+    '''
+    local_cached_api._store_office_list(
+        [{'name': 'first', 'key': 'first'}, {'name': 'second', 'key': 'second'}])
+    other_api = CachedAPI(
+        'http://127.0.0.1/html', 'http://127.0.0.1/json', local_cached_api._filename)
+    retries, errors, read_times, write_times = [], [], [], []
+    for api in (local_cached_api, other_api):
+        api.database_retry_policy.on_retry = retries.append
+    records = [MatterRecord(f'M{index}', index, index, 1, 1, 'A001') for index in range(1, 51)]
+    deadline = time.monotonic() + 1.5
+
+    def ingest(api, office_key):
+        minute = 0
+        try:
+            while time.monotonic() < deadline:
+                minute += 1
+                timestamp = time.strftime(
+                    '%Y-%m-%d %H:%M', time.localtime(time.time() - 60 * (minute % 50)))
+                start = time.monotonic()
+                api._store_update(office_key, None, MatterBatch(timestamp, records, []))
+                write_times.append(time.monotonic() - start)
+        except Exception as exc:
+            errors.append(exc)
+
+    def read():
+        try:
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                local_cached_api.get_matter_list('first')
+                local_cached_api.get_sample_list(1, 1, 'second')
+                read_times.append(time.monotonic() - start)
+        except Exception as exc:
+            errors.append(exc)
+
+    def read_slowly():
+        try:
+            while time.monotonic() < deadline:
+                with other_api._connections.reader() as cursor:
+                    cursor.execute('SELECT * FROM samples')
+                    cursor.fetchone()
+                    # Keep the statement (and its snapshot) open for a while
+                    time.sleep(0.2)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [
+        threading.Thread(target=ingest, args=(local_cached_api, 'first')),
+        threading.Thread(target=ingest, args=(other_api, 'second')),
+        threading.Thread(target=read_slowly)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert retries == []
+    assert len(read_times) > 100 and len(write_times) > 20
+    # Nobody waits anywhere near the busy timeout (the bounds are loose,
+    # as wall-clock times depend on the machine's load)
+    busy_timeout = local_cached_api._connections._busy_timeout
+    assert max(read_times) < busy_timeout / 2
+    assert max(write_times) < busy_timeout / 2
+    other_api.close()
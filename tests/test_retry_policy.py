@@ -0,0 +1,178 @@
+'''
+Tests applying to retry_policy.py file.
+'''
+import pytest
+import sys
+from api import WSStoreAPI, APIConnectionError, APICircuitOpenError
+from retry_policy import RetryBudget, CircuitBreaker, RetryPolicy, retry
+
+#
+# Testing the RetryPolicy class
+#
+
+class Flaky:
+    '''
+    Object whose method fails given number of times before succeeding.
+    '''
+    def __init__(self, failures, policy):
+        self.failures = failures
+        self.calls = 0
+        self.policy = policy
+
+    @retry('policy')
+    def method(self, value):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ValueError('Failure')
+        return value
+
+
+def test_policy_retries_until_success():
+    '''
+    Test if a failing call is retried until it succeeds.
+    '''
+    flaky = Flaky(2, RetryPolicy(lambda exc: isinstance(exc, ValueError), attempts=3, initial_wait=0))
+    assert flaky.method(5) == 5
+    assert flaky.calls == 3
+
+def test_policy_attempt_limit():
+    '''
+    Test if the last exception is raised after running out of attempts.
+    '''
+    flaky = Flaky(5, RetryPolicy(lambda exc: True, attempts=3, initial_wait=0))
+    with pytest.raises(ValueError):
+        flaky.method(5)
+    assert flaky.calls == 3
+
+def test_policy_unmatched_exception():
+    '''
+    Test if exceptions not worth retrying are raised at once.
+    '''
+    flaky = Flaky(1, RetryPolicy(lambda exc: isinstance(exc, KeyError), initial_wait=0))
+    with pytest.raises(ValueError):
+        flaky.method(5)
+    assert flaky.calls == 1
+
+def test_policy_budget():
+    '''
+    Test if retries stop when the shared budget is depleted and resume after
+    resetting it.
+    '''
+    budget = RetryBudget(limit=2)
+    policy = RetryPolicy(lambda exc: True, attempts=10, initial_wait=0, budget=budget)
+    flaky = Flaky(5, policy)
+    with pytest.raises(ValueError):
+        flaky.method(5)
+    assert flaky.calls == 3
+    assert budget.remaining == 0
+    budget.reset()
+    assert Flaky(2, policy).method(5) == 5
+
+def test_policy_wait_time():
+    '''
+    Test if waiting time grows exponentially up to its limit.
+    '''
+    policy = RetryPolicy(lambda exc: True, initial_wait=1, max_wait=3, multiplier=2)
+    for _ in range(100):
+        assert 0 <= policy.wait_time(0) <= 1
+        assert 0 <= policy.wait_time(1) <= 2
+        assert 0 <= policy.wait_time(5) <= 3
+
+
+#
+# Testing the CircuitBreaker class
+#
+
+def test_breaker_opens_and_recovers():
+    '''
+    Test circuit's opening after consecutive failures, its probing after
+    the recovery time and its closing after a successful probe.
+    '''
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=0)
+    breaker.record_failure('office')
+    assert breaker.allow('office')
+    breaker.record_failure('office')
+    # Recovery time equals 0: the first call is a probing one...
+    assert breaker.allow('office')
+    # ...and no other call is let through until the probe ends
+    assert not breaker.allow('office')
+    assert breaker.is_open('office')
+    breaker.record_failure('office')
+    assert breaker.allow('office')
+    breaker.record_success('office')
+    assert not breaker.is_open('office')
+    assert breaker.allow('office') and breaker.allow('office')
+
+def test_breaker_interrupted_probe():
+    '''
+    Test if a probe released without recording its outcome lets another
+    probe through.
+    '''
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0)
+    breaker.record_failure('office')
+    assert breaker.allow('office')
+    assert not breaker.allow('office')
+    breaker.release('office')
+    assert breaker.allow('office')
+
+def test_breaker_keys_are_independent():
+    '''
+    Test if failures of one key don't affect the others.
+    '''
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=300)
+    breaker.record_failure('dead')
+    assert not breaker.allow('dead')
+    assert breaker.allow('alive')
+    assert 299 < breaker.seconds_until_probe('dead') <= 300
+    assert breaker.seconds_until_probe('alive') == 0
+
+
+#
+# Testing retrying in WSStoreAPI
+#
+
+def test_api_circuit_breaker(stand_in_server, fake_apikey):
+    '''
+    Test if requests concerning a repeatedly failing office are suspended.
+    '''
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/missing')
+    api.connection_retry_policy.initial_wait = 0
+    for _ in range(api.circuit_breaker.failure_threshold):
+        with pytest.raises(APIConnectionError):
+            api.get_matters_with_samples('dead')
+    request_count = len(stand_in_server.requests)
+    with pytest.raises(APICircuitOpenError):
+        api.get_matters_with_samples('dead')
+    assert len(stand_in_server.requests) == request_count
+
+def test_api_circuit_breaker_interrupted_probe(stand_in_server, fake_apikey):
+    '''
+    Test if a probe interrupted by a BaseException doesn't keep the circuit
+    refusing probes.
+    '''
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/json')
+    api.circuit_breaker._recovery_time = 0
+    for _ in range(api.circuit_breaker.failure_threshold):
+        api.circuit_breaker.record_failure('office')
+
+    def interrupted(office_key):
+        raise KeyboardInterrupt
+    api._request_json_data = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        api.get_matters_with_samples('office')
+    del api._request_json_data
+    assert len(api.get_matters_with_samples('office')) == 3
+    assert not api.circuit_breaker.is_open('office')
+
+def test_api_circuit_breaker_ignores_local_errors(stand_in_server, monkeypatch):
+    '''
+    Test if errors not caused by the office (e.g. a missing API key) neither
+    count as its failures nor suspend it.
+    '''
+    monkeypatch.setitem(sys.modules, 'apikey', None)
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/json')
+    for _ in range(api.circuit_breaker.failure_threshold):
+        with pytest.raises(ImportError):
+            api.get_matters_with_samples('office')
+    assert not api.circuit_breaker.is_open('office')
+    assert stand_in_server.requests == []
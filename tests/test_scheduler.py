@@ -0,0 +1,206 @@
+'''
+Tests applying to scheduler.py file.
+'''
+import threading
+import time
+import pytest
+from scheduler import Activity, ActivityPolicy, PollScheduler, SingleFlight
+
+#
+# Testing the PollScheduler class
+#
+
+def test_scheduler_unknown_keys_due():
+    '''
+    Test if keys never polled nor restored are due.
+    '''
+    scheduler = PollScheduler(60)
+    assert scheduler.is_due('a')
+    assert not scheduler.is_known('a')
+    assert scheduler.due_keys(['a', 'b']) == ['a', 'b']
+    assert scheduler.seconds_since_poll('a') is None
+    assert scheduler.seconds_until_due() is None
+
+def test_scheduler_polled_keys_not_due():
+    '''
+    Test if a polled key isn't due until the interval passes.
+    '''
+    scheduler = PollScheduler(0.05)
+    scheduler.record_poll('a')
+    assert scheduler.is_known('a')
+    assert not scheduler.is_due('a')
+    assert scheduler.due_keys(['a', 'b']) == ['b']
+    assert 0 < scheduler.seconds_until_due() <= 0.05
+    time.sleep(0.06)
+    assert scheduler.is_due('a')
+    assert scheduler.due_keys() == ['a']
+    assert scheduler.seconds_until_due() == 0
+
+def test_scheduler_most_overdue_first():
+    '''
+    Test if due keys are ordered by their due times.
+    '''
+    scheduler = PollScheduler(60)
+    now = time.time()
+    scheduler.restore('a', now - 70)
+    scheduler.restore('b', now - 90)
+    scheduler.restore('c', now - 30)
+    scheduler.restore('d', None)
+    assert scheduler.due_keys() == ['b', 'a', 'd']
+    assert scheduler.due_keys(['a', 'b', 'c', 'e']) == ['b', 'a', 'e']
+    # Rescheduling leaves no outdated entries among due keys
+    scheduler.record_poll('b')
+    scheduler.make_due('c')
+    assert scheduler.due_keys() == ['a', 'd', 'c']
+
+def test_scheduler_interval_change():
+    '''
+    Test if changing the interval reschedules the polled keys.
+    '''
+    scheduler = PollScheduler(60)
+    scheduler.restore('a', time.time() - 30)
+    assert not scheduler.is_due('a')
+    scheduler.interval = 20
+    assert scheduler.is_due('a')
+    with pytest.raises(ValueError):
+        scheduler.interval = 0
+
+def test_scheduler_unsaved_polls():
+    '''
+    Test if the poll times are reported until marked as saved, unless
+    the key is polled again in the meantime.
+    '''
+    scheduler = PollScheduler(60)
+    scheduler.record_poll('a')
+    scheduler.record_poll('b')
+    poll_times = scheduler.unsaved()
+    assert set(poll_times) == {'a', 'b'}
+    assert abs(poll_times['a'] - time.time()) < 1
+    time.sleep(0.01)
+    scheduler.record_poll('b')
+    scheduler.mark_saved(poll_times)
+    assert list(scheduler.unsaved()) == ['b']
+
+def test_scheduler_failure_backoff():
+    '''
+    Test if failing keys are retried with growing backoff until they're
+    polled successfully.
+    '''
+    scheduler = PollScheduler(60, max_backoff=200)
+    delays = []
+    for _ in range(4):
+        scheduler.record_failure('a')
+        delays.append(scheduler.seconds_until_due())
+    assert [round(delay) for delay in delays] == [60, 120, 200, 200]
+    scheduler.record_failure('a', retry_after=5)
+    assert 4 < scheduler.seconds_until_due() <= 5
+    scheduler.record_poll('a')
+    scheduler.record_failure('a')
+    assert 59 < scheduler.seconds_until_due() <= 60
+
+def test_activity_policy_intervals():
+    '''
+    Test if busy keys are polled more often and idle ones back off, unless
+    they're displayed.
+    '''
+    policy = ActivityPolicy(min_interval=30, max_interval=900, idle_polls=3, busy_queue_length=10)
+    assert policy.interval(60, 0, None, False) == 60
+    assert policy.interval(60, 0, Activity(4, 15), False) == 30
+    assert policy.interval(60, 0, Activity(4, 5), False) == 60
+    assert policy.interval(60, 2, Activity(4, 15), False) == 60
+    assert [policy.interval(60, idle, None, False) for idle in range(3, 8)] == [
+        120, 240, 480, 900, 900]
+    assert policy.interval(60, 6, None, True) == 60
+    # Long idle runs (e.g. a closed office polled for weeks) stay capped
+    assert policy.interval(60, 10 ** 6, None, False) == 900
+    assert policy.interval(60.0, 2000, None, False) == 900
+    assert policy.interval(1200, 10 ** 6, None, False) == 1200
+    with pytest.raises(ValueError):
+        ActivityPolicy(min_interval=60, max_interval=30)
+
+def test_scheduler_activity():
+    '''
+    Test if intervals of keys follow their activity and whether they're
+    displayed.
+    '''
+    scheduler = PollScheduler(60, ActivityPolicy(idle_polls=2))
+    for key in ('busy', 'idle'):
+        scheduler.record_poll(key)
+    scheduler.record_activity('busy', Activity(3, 20))
+    assert scheduler.interval_of('busy') == 30
+    # Closed offices and unchanged states count as idle polls
+    scheduler.record_activity('idle', Activity(0, 0))
+    scheduler.record_activity('idle', None)
+    assert scheduler.interval_of('idle') == 120
+    scheduler.record_activity('idle', Activity(2, 1))
+    scheduler.record_activity('idle', Activity(2, 1))
+    assert scheduler.interval_of('idle') == 60
+    scheduler.record_activity('idle', Activity(2, 1))
+    scheduler.record_activity('idle', None)
+    assert scheduler.interval_of('idle') == 240
+    # The busy key is the first one due
+    assert 29 < scheduler.seconds_until_due() <= 30
+    # The displayed key is rescheduled at the base interval
+    scheduler.displayed = 'idle'
+    assert scheduler.interval_of('idle') == 60
+    scheduler.displayed = 'busy'
+    assert scheduler.interval_of('idle') == 240
+    # An office closed for weeks keeps the maximal interval
+    scheduler = PollScheduler(60.0, ActivityPolicy())
+    scheduler.record_poll('closed')
+    for _ in range(2000):
+        scheduler.record_activity('closed', None)
+    assert scheduler.interval_of('closed') == 900
+    # Without a policy, all the keys share the interval
+    scheduler = PollScheduler(60)
+    scheduler.record_poll('idle')
+    scheduler.record_activity('idle', None)
+    assert scheduler.interval_of('idle') == 60
+
+#
+# Testing the SingleFlight class
+#
+
+def test_single_flight_shares_result():
+    '''
+    Test if callers joining a call in progress get its result without
+    calling the function themselves.
+    '''
+    single_flight = SingleFlight()
+    calls = []
+    results = []
+
+    def function():
+        calls.append(None)
+        time.sleep(0.2)
+        return len(calls)
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do('a', function)))
+        for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [1, 1, 1, 1]
+    assert single_flight.deduplicated == 3
+    # A landed flight is forgotten
+    assert single_flight.do('a', function) == 2
+
+def test_single_flight_shares_exception():
+    '''
+    Test if the exception raised by the call is raised to every caller
+    and the flight is landed anyway.
+    '''
+    single_flight = SingleFlight()
+    flight, leading = single_flight.join('a')
+    assert leading
+    other_flight, leading = single_flight.join('a')
+    assert other_flight is flight and not leading
+    single_flight.land('a', exception=ValueError('Failure'))
+    with pytest.raises(ValueError):
+        flight.wait()
+    with pytest.raises(ZeroDivisionError):
+        single_flight.do('a', lambda: 1 / 0)
+    _, leading = single_flight.join('a')
+    assert leading
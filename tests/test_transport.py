@@ -0,0 +1,134 @@
+'''
+Tests applying to transport.py file.
+'''
+import time
+import pytest
+from urllib.error import HTTPError
+from api import HTTPConnectionPool, WSStoreAPI, APIConnectionError
+from transport import normalize_url, Transport, RecordingTransport, ReplayTransport
+
+#
+# Testing the normalize_url function
+#
+
+def test_normalize_url():
+    '''
+    Test if API key is removed and parameters are sorted.
+    '''
+    assert normalize_url('http://a/json?id=1&apikey=secret') == 'http://a/json?id=1'
+    assert normalize_url('http://a/json?b=2&a=1') == normalize_url('http://a/json?a=1&b=2')
+    assert normalize_url('http://a/html') == 'http://a/html'
+
+
+#
+# Testing the Transport class
+#
+
+def test_transport_requires_request():
+    '''
+    Test if a transport not implementing request cannot be created.
+    '''
+    class StreamingTransport(Transport):
+        def stream(self, url, timeout=5, chunk_size=16384):
+            yield b''
+    with pytest.raises(TypeError):
+        StreamingTransport()
+
+
+#
+# Testing the RecordingTransport and ReplayTransport classes
+#
+
+def test_record_and_replay(stand_in_server, fake_apikey, tmp_path):
+    '''
+    Test if responses recorded from a live server are replayed without
+    contacting it.
+    '''
+    recorder = RecordingTransport(HTTPConnectionPool(), str(tmp_path))
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/json', recorder)
+    office_list = api.get_office_list()
+    matters = api.get_matters_with_samples(office_list[0]['key'])
+    request_count = len(stand_in_server.requests)
+    assert (tmp_path / 'manifest.jsonl').read_text().count('\n') == 2
+    assert 'test' not in (tmp_path / 'manifest.jsonl').read_text()
+    replayer = ReplayTransport.load(str(tmp_path), latency=0)
+    api = WSStoreAPI(stand_in_server.url + '/html', stand_in_server.url + '/json', replayer)
+    assert api.get_office_list() == office_list
+    assert api.get_matters_with_samples(office_list[0]['key']) == matters
+    assert len(stand_in_server.requests) == request_count
+    assert sum(replayer.request_counts.values()) == 2
+
+def test_record_interrupted_stream(tmp_path):
+    '''
+    Test if streamed responses are recorded only when received entirely.
+    '''
+    class FailingTransport(Transport):
+        def request(self, url, timeout=5):
+            return b'{"complete": true}'
+
+        def stream(self, url, timeout=5, chunk_size=16384):
+            yield b'{"partial'
+            if url.endswith('reset'):
+                raise OSError('connection reset')
+            yield b'": true}'
+
+    recorder = RecordingTransport(FailingTransport(), str(tmp_path))
+    with pytest.raises(OSError):
+        list(recorder.stream('http://a/reset'))
+    chunks = recorder.stream('http://a/closed')
+    next(chunks)
+    chunks.close()
+    assert not (tmp_path / 'manifest.jsonl').exists()
+    assert b''.join(recorder.stream('http://a/whole')) == b'{"partial": true}'
+    replayer = ReplayTransport.load(str(tmp_path), latency=0)
+    assert replayer.request('http://a/whole') == b'{"partial": true}'
+    for url in ('http://a/reset', 'http://a/closed'):
+        with pytest.raises(HTTPError) as exc_info:
+            replayer.request(url)
+        assert exc_info.value.code == 404
+
+def test_replay_sequence():
+    '''
+    Test if responses are served in order, repeating the last one.
+    '''
+    replayer = ReplayTransport()
+    replayer.add_response('http://a/json?id=1', b'first')
+    replayer.add_response('http://a/json?id=1', b'second')
+    assert replayer.request('http://a/json?id=1&apikey=x') == b'first'
+    assert replayer.request('http://a/json?id=1') == b'second'
+    assert replayer.request('http://a/json?id=1') == b'second'
+    replayer.reset()
+    assert b''.join(replayer.stream('http://a/json?id=1', chunk_size=2)) == b'first'
+    with pytest.raises(HTTPError) as exc_info:
+        replayer.request('http://a/json?id=2')
+    assert exc_info.value.code == 404
+
+def test_replay_latency():
+    '''
+    Test if responses are delayed and latencies above timeout result
+    in socket-level timeouts.
+    '''
+    replayer = ReplayTransport(latency=0.05)
+    replayer.add_response('http://a/html', b'body', latency=10)
+    start = time.monotonic()
+    replayer.request('http://a/html')
+    assert time.monotonic() - start >= 0.05
+    replayer.latency = lambda url: 0.2
+    with pytest.raises(TimeoutError):
+        replayer.request('http://a/html', timeout=0.01)
+    replayer.latency = None
+    with pytest.raises(OSError):
+        replayer.request('http://a/html', timeout=0.01)
+
+def test_replay_connection_errors(fake_apikey):
+    '''
+    Test if replayed errors are retried and reported by the API.
+    '''
+    replayer = ReplayTransport(latency=0)
+    replayer.add_response('http://a/json?id=office', b'', status=503)
+    api = WSStoreAPI('http://a/html', 'http://a/json', replayer)
+    api.connection_retry_policy.initial_wait = 0
+    api.connection_retry_policy.attempts = 2
+    with pytest.raises(APIConnectionError):
+        api.get_matters_with_samples('office')
+    assert replayer.request_counts == {'http://a/json?id=office': 2}
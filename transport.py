@@ -0,0 +1,341 @@
+'''
+File containing transports: the means of fetching raw API responses.
+
+Live HTTP transport (HTTPConnectionPool) resides in api.py. Transports
+defined here record the responses to disk and replay recorded (or
+synthetic) ones without network access, at controllable latency.
+
+Classes:
+Transport
+    RecordingTransport
+    ReplayTransport
+'''
+from abc import ABC, abstractmethod
+from urllib.error import HTTPError
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from email.message import Message
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Union, Dict, List, Iterator, Callable, Any
+
+
+# Type of replay latency: fixed time in seconds, function of request URL
+# or None (latency noted by the recorder)
+Latency = Union[None, float, Callable[[str], float]]
+
+
+def normalize_url(url: str) -> str:
+    '''
+    Convert URL to a form identifying recorded responses: API key is removed
+    and the remaining query parameters are sorted.
+
+    :param url: Request URL
+    :returns: Normalized URL
+    '''
+    parts = urlsplit(url)
+    parameters = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name != 'apikey')
+    return urlunsplit((
+        parts.scheme, parts.netloc, parts.path, urlencode(parameters), ''))
+
+
+class Transport(ABC):
+    '''
+    Interface of objects fetching resources for API classes.
+
+    Subclasses have to implement self.request; the default self.stream
+    yields parts of the whole response fetched by self.request.
+    '''
+    @abstractmethod
+    def request(self, url: str, timeout: float = 5) -> bytes:
+        '''
+        Fetch a resource using HTTP GET method.
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :param timeout: Socket timeout in seconds
+        :returns: Body of the response
+        :raises:
+            :class:`HTTPError`: Error status code received
+            :class:`OSError`: Socket-level errors (including timeouts)
+            :class:`HTTPException`: Malformed response
+        '''
+
+    def stream(
+            self, url: str, timeout: float = 5,
+            chunk_size: int = 16384) -> Iterator[bytes]:
+        '''
+        Fetch a resource using HTTP GET method, yielding parts of its body.
+
+        Exceptions are the same as in case of self.request.
+
+        :param url: Absolute HTTP(S) URL of the resource
+        :param timeout: Socket timeout in seconds
+        :param chunk_size: Maximal size of a single yielded part
+        :returns: Generator of the response body's parts
+        '''
+        body = self.request(url, timeout)
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    def clear(self) -> None:
+        '''
+        Release resources held by the transport (e.g. idle connections).
+        '''
+
+
+class RecordingTransport(Transport):
+    '''
+    Transport passing requests to another one and saving raw responses
+    in a directory, which can be loaded by ReplayTransport.
+
+    Each response is saved in a separate file. The manifest.jsonl file lists
+    them in order of arrival, along with their normalized URLs (without API
+    key), latencies and error status codes.
+
+    :param transport: Transport actually fetching the responses
+    :param directory: Path of the recording's directory (created if needed)
+    :ivar _transport: Wrapped transport provided in constructor
+    :ivar _directory: Directory path provided in constructor
+    :ivar _count: Count of saved responses
+    :ivar _lock: Lock guarding access to the manifest
+    '''
+    def __init__(self, transport: Transport, directory: str) -> None:
+        self._transport: Transport = transport
+        self._directory: str = directory
+        os.makedirs(directory, exist_ok=True)
+        self._count: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    #
+    # Private methods used internally
+    #
+
+    def _save(self, url: str, body: bytes, elapsed: float, status: int = 200) -> None:
+        '''
+        Save a response and note it in the manifest.
+        (internal function)
+
+        :param url: Request URL
+        :param body: Body of the response
+        :param elapsed: Time in seconds it took to fetch the response
+        :param status: HTTP status code of the response
+        '''
+        url = normalize_url(url)
+        with self._lock:
+            self._count += 1
+            url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+            filename = f'{self._count:06}-{url_hash}.bin'
+            with open(os.path.join(self._directory, filename), 'wb') as body_file:
+                body_file.write(body)
+            entry = {'url': url, 'file': filename, 'latency': elapsed, 'status': status}
+            with open(os.path.join(self._directory, 'manifest.jsonl'), 'a',
+                      encoding='utf-8') as manifest:
+                manifest.write(json.dumps(entry) + '\n')
+
+    #
+    # Public methods
+    #
+
+    def request(self, url: str, timeout: float = 5) -> bytes:
+        '''
+        Fetch a resource using the wrapped transport and save the response
+        (see Transport.request).
+        '''
+        start = time.monotonic()
+        try:
+            body = self._transport.request(url, timeout)
+        except HTTPError as exc:
+            self._save(url, b'', time.monotonic() - start, exc.code)
+            raise
+        self._save(url, body, time.monotonic() - start)
+        return body
+
+    def stream(
+            self, url: str, timeout: float = 5,
+            chunk_size: int = 16384) -> Iterator[bytes]:
+        '''
+        Fetch a resource using the wrapped transport, yielding parts of its
+        body, and save the response once it's received entirely
+        (see Transport.stream).
+
+        Responses interrupted by connection errors or by closing
+        the generator aren't saved, so they aren't replayed as complete ones.
+        '''
+        start = time.monotonic()
+        chunks: List[bytes] = []
+        try:
+            for chunk in self._transport.stream(url, timeout, chunk_size):
+                chunks.append(chunk)
+                yield chunk
+        except HTTPError as exc:
+            self._save(url, b'', time.monotonic() - start, exc.code)
+            raise
+        else:
+            self._save(url, b''.join(chunks), time.monotonic() - start)
+
+    def clear(self) -> None:
+        '''
+        Release resources held by the wrapped transport.
+        '''
+        self._transport.clear()
+
+    #
+    # Properties
+    #
+
+    @property
+    def directory(self) -> str:
+        '''
+        Path of the recording's directory.
+        '''
+        return self._directory
+
+
+class ReplayTransport(Transport):
+    '''
+    Thread-safe transport serving recorded or synthetic responses without
+    network access.
+
+    Responses are identified by normalized URLs (see normalize_url). Every
+    URL may have a sequence of responses, served one after another;
+    the last one is repeated once the sequence is exhausted. Requests for
+    unknown URLs fail with 404 status code.
+
+    :param latency: Time in seconds each response is delayed by, a function
+        of request URL returning such time (e.g. drawing it at random)
+        or None to use the latencies noted by the recorder
+    :ivar latency: Latency provided in constructor (may be changed at will)
+    :ivar _responses: Sequences of (body, status, recorded latency) triples
+        by normalized URL
+    :ivar _served: Counts of served responses by normalized URL
+    :ivar _lock: Lock guarding access to the responses
+    '''
+    def __init__(self, latency: Latency = None) -> None:
+        self.latency: Latency = latency
+        self._responses: Dict[str, List[Any]] = {}
+        self._served: Dict[str, int] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: str, latency: Latency = None) -> 'ReplayTransport':
+        '''
+        Create a transport replaying a recording made by RecordingTransport.
+
+        :param directory: Path of the recording's directory
+        :param latency: Latency of the responses (see the class description)
+        :returns: Replaying transport
+        '''
+        transport = cls(latency)
+        with open(os.path.join(directory, 'manifest.jsonl'), encoding='utf-8') as manifest:
+            for line in manifest:
+                entry = json.loads(line)
+                with open(os.path.join(directory, entry['file']), 'rb') as body_file:
+                    body = body_file.read()
+                transport.add_response(
+                    entry['url'], body, entry['status'], entry['latency'])
+        return transport
+
+    #
+    # Private methods used internally
+    #
+
+    def _next_response(self, url: str) -> Any:
+        '''
+        Pick the response to a request and note it as served.
+        (internal function)
+
+        :param url: Request URL
+        :returns: (body, status, recorded latency) triple or None if there
+            is no response for the URL
+        '''
+        url = normalize_url(url)
+        with self._lock:
+            responses = self._responses.get(url)
+            served = self._served.get(url, 0)
+            self._served[url] = served + 1
+            if not responses:
+                return None
+            return responses[min(served, len(responses) - 1)]
+
+    def _wait(self, url: str, recorded_latency: float, timeout: float) -> None:
+        '''
+        Delay a response, imitating network latency.
+        (internal function)
+
+        :param url: Request URL
+        :param recorded_latency: Latency noted by the recorder
+        :param timeout: Socket timeout in seconds
+        :raises: :class:`TimeoutError`: Latency exceeding the timeout
+        '''
+        if self.latency is None:
+            delay = recorded_latency
+        elif callable(self.latency):
+            delay = self.latency(url)
+        else:
+            delay = self.latency
+        if delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('timed out')
+        if delay > 0:
+            time.sleep(delay)
+
+    #
+    # Public methods
+    #
+
+    def add_response(
+            self, url: str, body: bytes, status: int = 200,
+            latency: float = 0.0) -> None:
+        '''
+        Append a response to the sequence served for given URL.
+
+        :param url: Request URL (normalized automatically)
+        :param body: Body of the response
+        :param status: HTTP status code (codes from 400 up result in HTTPError)
+        :param latency: Latency used when self.latency is None
+        '''
+        with self._lock:
+            self._responses.setdefault(normalize_url(url), []).append(
+                (body, status, latency))
+
+    def request(self, url: str, timeout: float = 5) -> bytes:
+        '''
+        Serve the next response for given URL (see Transport.request).
+        '''
+        response = self._next_response(url)
+        body, status, recorded_latency = response if response else (b'', 404, 0.0)
+        self._wait(url, recorded_latency, timeout)
+        if status >= 400:
+            raise HTTPError(url, status, 'Replayed error', Message(), None)
+        return body
+
+    def reset(self) -> None:
+        '''
+        Start serving every sequence of responses from the beginning.
+        '''
+        with self._lock:
+            self._served.clear()
+
+    #
+    # Properties
+    #
+
+    @property
+    def urls(self) -> List[str]:
+        '''
+        Normalized URLs having responses to serve.
+        '''
+        with self._lock:
+            return sorted(self._responses)
+
+    @property
+    def request_counts(self) -> Dict[str, int]:
+        '''
+        Counts of served requests by normalized URL.
+        '''
+        with self._lock:
+            return dict(self._served)